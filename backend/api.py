@@ -1,9 +1,12 @@
 """
 FastAPI Routes — REST API + WebSocket endpoints.
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import asyncio
+import json
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pathlib import Path
 
 # MUST load config BEFORE any other backend imports
@@ -11,10 +14,15 @@ from backend.config import config
 if not config.is_loaded:
     config.load()
 
+from backend import runtime
 from backend.core.emulator import emulator_manager
+from backend.core.device_watcher import device_watcher
 from backend.tasks.task_queue import task_queue
 from backend.storage.database import database
+from backend.storage.db_writer import db_writer
 from backend.websocket import ws_manager
+from backend.state_sync import state_sync, device_view
+from backend.http_cache import cached_json
 from backend.models.scan_result import TaskType
 
 import os
@@ -44,66 +52,37 @@ async def index():
 # ──────────────────────────────────────────────
 
 @app.get("/api/devices")
-async def get_devices():
+async def get_devices(request: Request):
     """List all registered emulators with status and latest DB data."""
-    from backend.storage.database import database
-    devices = emulator_manager.get_all()
-    
-    # Fetch latest data from database
-    db_data = await database.get_all_emulator_data()
-    serial_to_data = {row["serial"]: row for row in db_data}
-    
-    result = []
-    for d in devices:
-        d_dict = d.to_dict()
-        if d.serial in serial_to_data:
-            # Inject full_scan db data shape for the UI mapped in device-card.js
-            row_data = dict(serial_to_data[d.serial])
-            # Map flat resource columns to a nested 'resources' dict as expected by UI
-            row_data["resources"] = {
-                "gold": row_data.get("gold", 0),
-                "wood": row_data.get("wood", 0),
-                "ore": row_data.get("ore", 0),
-                "mana": row_data.get("mana", 0)
-            }
-            d_dict["data"] = row_data
-            d_dict["task_type"] = "full_scan"
-        result.append(d_dict)
-        
-    return result
+    async def build():
+        devices = emulator_manager.get_all()
+        db_data = await database.get_all_emulator_data()
+        serial_to_data = {row["serial"]: row for row in db_data}
+        return [device_view(d.to_dict(), serial_to_data.get(d.serial)) for d in devices]
+    return await cached_json(request, ("db", "devices"), build)
 
 
 @app.post("/api/devices/refresh")
 async def refresh_devices():
     """Re-discover ADB devices and load latest DB data."""
     from backend.storage.database import database
-    devices = emulator_manager.discover()
+    if device_watcher.is_connected:
+        # Registry is already kept current by adb track-devices
+        devices = emulator_manager.get_all()
+    else:
+        devices = await asyncio.to_thread(emulator_manager.discover)
     
     db_data = await database.get_all_emulator_data()
     serial_to_data = {row["serial"]: row for row in db_data}
-    
-    result = []
-    for d in devices:
-        d_dict = d.to_dict()
-        if d.serial in serial_to_data:
-            row_data = dict(serial_to_data[d.serial])
-            row_data["resources"] = {
-                "gold": row_data.get("gold", 0),
-                "wood": row_data.get("wood", 0),
-                "ore": row_data.get("ore", 0),
-                "mana": row_data.get("mana", 0)
-            }
-            d_dict["data"] = row_data
-            d_dict["task_type"] = "full_scan"  
-        result.append(d_dict)
-        
+    result = [device_view(d.to_dict(), serial_to_data.get(d.serial)) for d in devices]
+
     return {"count": len(devices), "devices": result}
 
 
 @app.get("/api/devices/health")
 async def device_health():
-    """Health check all emulators."""
-    summary = emulator_manager.health_check()
+    """Health check all emulators (pings run off the event loop)."""
+    summary = await asyncio.to_thread(emulator_manager.health_check)
     return summary
 
 
@@ -112,7 +91,7 @@ async def device_health():
 # ──────────────────────────────────────────────
 
 @app.post("/api/tasks/run")
-async def run_task(serial: str, task_type: str):
+async def run_task(serial: str, task_type: str, priority: int = 0):
     """Submit a task for a single device."""
     try:
         tt = TaskType(task_type)
@@ -122,7 +101,6 @@ async def run_task(serial: str, task_type: str):
     if tt == TaskType.FULL_SCAN:
         # Route to the dedicated full scan orchestrator
         from backend.core import full_scan
-        from backend.core import ldplayer_manager
         from backend.websocket import ws_manager
         
         # Derive LDPlayer index from adb serial (emulator-5556 -> index 1)
@@ -132,7 +110,7 @@ async def run_task(serial: str, task_type: str):
         except Exception:
             return {"status": "error", "msg": "Cannot determine emulator index from serial"}
             
-        all_emus = ldplayer_manager.list_all_instances()
+        all_emus = await _ldplayer_instances()
         name_map = {e["index"]: e["name"] for e in all_emus}
         name = name_map.get(idx, f"Emulator-{idx}")
         
@@ -142,13 +120,13 @@ async def run_task(serial: str, task_type: str):
         else:
             return {"status": "error", "msg": result.get("error")}
 
-    task_id = task_queue.submit_task(serial, tt)
+    task_id = task_queue.submit_task(serial, tt, priority=priority)
     # task_queue now handles DB persistence internally
     return {"status": "accepted", "task_id": task_id}
 
 
 @app.post("/api/tasks/run-all")
-async def run_all_tasks(task_type: str):
+async def run_all_tasks(task_type: str, priority: int = 0):
     """Submit a task for all online devices."""
     try:
         tt = TaskType(task_type)
@@ -163,7 +141,7 @@ async def run_all_tasks(task_type: str):
 
     task_ids = []
     for emu in online:
-        tid = task_queue.submit_task(emu.serial, tt)
+        tid = task_queue.submit_task(emu.serial, tt, priority=priority)
         task_ids.append({"serial": emu.serial, "task_id": tid})
 
     return {"status": "accepted", "count": len(task_ids), "tasks": task_ids}
@@ -171,10 +149,16 @@ async def run_all_tasks(task_type: str):
 
 @app.get("/api/tasks/queue")
 async def get_queue():
-    """Get current task queue state."""
+    """Get current task queue state (running + queued with positions)."""
     return task_queue.get_queue()
 
 
+@app.post("/api/tasks/cancel")
+async def cancel_task(task_id: str):
+    """Cancel a queued task or stop a running one at its next step."""
+    return task_queue.cancel_task(task_id)
+
+
 @app.get("/api/tasks/history")
 async def get_history(limit: int = 50):
     """Get task execution history (in-memory + DB fallback)."""
@@ -189,10 +173,37 @@ async def get_history(limit: int = 50):
 # Report Endpoints
 # ──────────────────────────────────────────────
 
+HISTORY_PAGE_MAX = 500
+
+
+def _next_cursor(limit: int):
+    """X-Next-Cursor header for a page: id to pass as ?cursor= for the next one."""
+    def headers(rows: list) -> dict:
+        if len(rows) < limit:
+            return {}
+        return {"X-Next-Cursor": str(rows[-1]["id"])}
+    return headers
+
+
 @app.get("/api/reports/history")
-async def get_reports(limit: int = 50, serial: str = None):
-    """Get scan result history from database."""
-    return await database.get_scan_history(limit=limit, serial=serial)
+async def get_reports(request: Request, limit: int = 50, serial: str = None,
+                      cursor: int = None, status: str = None, scan_type: str = None,
+                      game_id: str = None, since: str = None, until: str = None):
+    """Get scan result history from database (newest first, paginated by cursor)."""
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    return await cached_json(request, ("db",), lambda: database.get_scan_history(
+        limit=limit, serial=serial, before_id=cursor, status=status,
+        scan_type=scan_type, game_id=game_id, since=since, until=until,
+    ), extra_headers=_next_cursor(limit))
+
+
+@app.get("/api/reports/{snapshot_id}/raw-text")
+async def get_report_raw_text(snapshot_id: int):
+    """Raw OCR text of one scan snapshot (archived texts are decompressed)."""
+    text = await database.get_raw_ocr_text(snapshot_id)
+    if text is None:
+        return {"error": "Snapshot not found", "snapshot_id": snapshot_id}
+    return {"snapshot_id": snapshot_id, "text": text}
 
 
 @app.get("/api/reports/latest/{serial}")
@@ -201,6 +212,31 @@ async def get_latest_report(serial: str):
     return await database.get_latest_report(serial)
 
 
+# ──────────────────────────────────────────────
+# Maintenance
+# ──────────────────────────────────────────────
+
+@app.get("/api/maintenance/retention")
+async def get_retention_status():
+    """Result of the last retention pass (None before the first one)."""
+    from backend.storage.retention import retention
+    return {"enabled": config.retention_enabled, "last_result": retention.last_result}
+
+
+@app.post("/api/maintenance/retention")
+async def run_retention():
+    """Run a retention pass now (downsample, archive OCR text, prune, vacuum)."""
+    from backend.storage.retention import retention
+    return await asyncio.to_thread(retention.run_once)
+
+
+@app.get("/api/metrics/stages")
+async def get_stage_metrics(reset: bool = False):
+    """Latency percentiles per pipeline stage (navigation, capture, OCR, DB)."""
+    from backend.metrics import stage_metrics
+    return stage_metrics.snapshot(reset=reset)
+
+
 # ──────────────────────────────────────────────
 # Config Endpoints
 # ──────────────────────────────────────────────
@@ -219,13 +255,27 @@ async def get_config():
 async def websocket_endpoint(ws: WebSocket):
     await ws_manager.connect(ws)
     try:
+        # Full state first; state_delta messages (seq + 1, ...) follow
+        await state_sync.send_snapshot(ws)
         while True:
             # Keep connection alive, handle client messages if needed
             data = await ws.receive_text()
             # Echo back for ping/pong
             if data == "ping":
-                await ws.send_text('{"event":"pong"}')
+                ws_manager.send_to(ws, "pong", {})
+            elif data == "resync":
+                # Client missed a delta (seq gap): send the full state again
+                await state_sync.send_snapshot(ws)
+            elif data.startswith("{"):
+                try:
+                    msg = json.loads(data)
+                except ValueError:
+                    continue
+                if msg.get("action") == "subscribe":
+                    ws_manager.subscribe(ws, msg.get("families"), msg.get("serials"))
     except WebSocketDisconnect:
+        pass
+    finally:
         ws_manager.disconnect(ws)
 
 
@@ -236,23 +286,62 @@ async def websocket_endpoint(ws: WebSocket):
 @app.get("/api/emulators/all")
 async def list_all_emulators():
     """List ALL LDPlayer instances (online + offline)."""
+    return await _ldplayer_instances()
+
+
+async def _ldplayer_instances() -> list[dict]:
+    """Cached LDPlayer instances; only the very first load waits (off the loop)."""
     from backend.core import ldplayer_manager
-    return ldplayer_manager.list_all_instances()
+    registry = ldplayer_manager.instance_registry
+    if not registry.loaded:
+        return await asyncio.to_thread(registry.refresh)
+    return registry.get()
 
 
 @app.post("/api/emulators/launch")
 async def launch_emulator(index: int):
     """Start an emulator by index."""
     from backend.core import ldplayer_manager
-    ldplayer_manager.launch_instance(index)
+    await asyncio.to_thread(ldplayer_manager.launch_instance, index)
     return {"status": "ok", "msg": f"Launch command sent for index {index}"}
 
 
+@app.post("/api/emulators/launch-bulk")
+async def launch_emulators_bulk(indices: str, wait_lobby: bool = None):
+    """Launch many emulators with load-aware staggering.
+
+    Args:
+        indices: comma-separated emulator indices, e.g. "1,2,3"
+        wait_lobby: also wait for the game lobby before reporting ready
+    """
+    from backend.core.launch_scheduler import launch_scheduler
+
+    index_list = [int(i.strip()) for i in indices.split(",") if i.strip().isdigit()]
+    if not index_list:
+        return {"success": False, "error": "No valid indices provided"}
+    result = launch_scheduler.launch_many(index_list, wait_lobby=wait_lobby)
+    return {"success": True, **result}
+
+
+@app.get("/api/emulators/launch-status")
+async def launch_status():
+    """Progress of bulk launches."""
+    from backend.core.launch_scheduler import launch_scheduler
+    return launch_scheduler.get_status()
+
+
+@app.post("/api/emulators/launch-cancel")
+async def launch_cancel():
+    """Cancel bulk launches that have not started booting yet."""
+    from backend.core.launch_scheduler import launch_scheduler
+    return {"success": True, "cancelled": launch_scheduler.cancel()}
+
+
 @app.post("/api/emulators/quit")
 async def quit_emulator(index: int):
     """Stop an emulator by index."""
     from backend.core import ldplayer_manager
-    ldplayer_manager.quit_instance(index)
+    await asyncio.to_thread(ldplayer_manager.quit_instance, index)
     return {"status": "ok", "msg": f"Quit command sent for index {index}"}
 
 
@@ -271,7 +360,7 @@ async def list_macros():
 async def macro_info(index: int, filename: str):
     """Get detailed info about a macro script."""
     from backend.core import ldplayer_manager
-    return ldplayer_manager.get_operation_info(index, filename)
+    return await asyncio.to_thread(ldplayer_manager.get_operation_info, index, filename)
 
 
 @app.post("/api/macros/run")
@@ -285,13 +374,52 @@ async def run_macro(index: int, filename: str):
     if not os.path.exists(filepath):
         return {"success": False, "error": f"Record file not found: {filename}"}
 
-    result = macro_replay.start_replay(
-        index, filepath, filename,
+    # First run of a file parses it (cached afterwards) — keep that off the loop
+    result = await asyncio.to_thread(
+        macro_replay.start_replay, index, filepath, filename,
         ws_callback=ws_manager.broadcast_sync,
     )
     return result
 
 
+@app.post("/api/macros/run-group")
+async def run_macro_group(indices: str, filename: str):
+    """Execute one macro on many emulators in lockstep.
+
+    Args:
+        indices: comma-separated emulator indices, e.g. "1,2,3"
+    """
+    from backend.core import ldplayer_manager
+    from backend.core import macro_replay
+    import os
+
+    index_list = [int(i.strip()) for i in indices.split(",") if i.strip().isdigit()]
+    if not index_list:
+        return {"success": False, "error": "No valid indices provided"}
+    filepath = os.path.join(ldplayer_manager._get_operations_dir(), filename)
+    if not os.path.exists(filepath):
+        return {"success": False, "error": f"Record file not found: {filename}"}
+
+    return await asyncio.to_thread(
+        macro_replay.start_group_replay, index_list, filepath, filename,
+        ws_callback=ws_manager.broadcast_sync,
+    )
+
+
+@app.post("/api/macros/stop-group")
+async def stop_macro_group(group_id: str):
+    """Stop a group replay on all of its emulators."""
+    from backend.core import macro_replay
+    return macro_replay.stop_group_replay(group_id)
+
+
+@app.get("/api/macros/groups")
+async def macro_groups(group_id: str = None):
+    """Get status of group replays."""
+    from backend.core import macro_replay
+    return macro_replay.get_group_status(group_id)
+
+
 @app.post("/api/macros/stop")
 async def stop_macro(index: int, filename: str):
     """Stop a running macro replay."""
@@ -318,14 +446,13 @@ async def start_full_scan(indices: str):
         indices: comma-separated emulator indices, e.g. "1,2,3"
     """
     from backend.core import full_scan
-    from backend.core import ldplayer_manager
 
     index_list = [int(i.strip()) for i in indices.split(",") if i.strip().isdigit()]
     if not index_list:
         return {"success": False, "error": "No valid indices provided"}
 
     # Get emulator names
-    all_emus = ldplayer_manager.list_all_instances()
+    all_emus = await _ldplayer_instances()
     name_map = {e["index"]: e["name"] for e in all_emus}
 
     results = []
@@ -358,15 +485,29 @@ async def stop_scan(index: int):
 # ──────────────────────────────────────────────
 
 @app.get("/api/macro-runs/history")
-async def get_macro_runs_history(emulator_index: int = None, limit: int = 50):
-    """Get macro execution history from database."""
-    return await database.get_macro_runs(emulator_index=emulator_index, limit=limit)
+async def get_macro_runs_history(request: Request, emulator_index: int = None,
+                                 limit: int = 50, cursor: int = None,
+                                 status: str = None, filename: str = None,
+                                 since: str = None, until: str = None):
+    """Get macro execution history from database (newest first, paginated by cursor)."""
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    return await cached_json(request, ("db",), lambda: database.get_macro_runs(
+        emulator_index=emulator_index, limit=limit, before_id=cursor,
+        status=status, filename=filename, since=since, until=until,
+    ), extra_headers=_next_cursor(limit))
 
 
 @app.get("/api/task-runs/history")
-async def get_task_runs_history(emulator_index: int = None, limit: int = 50):
-    """Get task execution history from database."""
-    return await database.get_task_runs(emulator_index=emulator_index, limit=limit)
+async def get_task_runs_history(request: Request, emulator_index: int = None,
+                                limit: int = 50, cursor: int = None,
+                                status: str = None, task_type: str = None,
+                                since: str = None, until: str = None):
+    """Get task execution history from database (newest first, paginated by cursor)."""
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    return await cached_json(request, ("db",), lambda: database.get_task_runs(
+        emulator_index=emulator_index, limit=limit, before_id=cursor,
+        status=status, task_type=task_type, since=since, until=until,
+    ), extra_headers=_next_cursor(limit))
 
 
 # ──────────────────────────────────────────────
@@ -374,9 +515,9 @@ async def get_task_runs_history(emulator_index: int = None, limit: int = 50):
 # ──────────────────────────────────────────────
 
 @app.get("/api/emulators/data")
-async def get_all_emulator_data():
+async def get_all_emulator_data(request: Request):
     """Get latest scan data for all emulators."""
-    return await database.get_all_emulator_data()
+    return await cached_json(request, ("db",), database.get_all_emulator_data)
 
 
 @app.get("/api/emulators/{index}/data")
@@ -398,9 +539,77 @@ async def get_emulator_history(index: int, limit: int = 20):
 # ──────────────────────────────────────────────
 
 @app.get("/api/accounts")
-async def get_accounts():
+async def get_accounts(request: Request):
     """Get all accounts with emulator + latest scan data."""
-    return await database.get_all_accounts()
+    return await cached_json(request, ("db",), database.get_all_accounts)
+
+
+@app.get("/api/accounts/export")
+async def export_accounts(format: str = "csv"):
+    """Stream all accounts as CSV or JSONL (re-importable via /api/accounts/import)."""
+    from datetime import date
+    from backend.storage import account_io
+    if format not in account_io.FORMATS:
+        return {"error": f"format must be one of {', '.join(account_io.FORMATS)}"}
+    media = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"accounts-{date.today():%Y%m%d}.{format}"
+    return StreamingResponse(
+        account_io.encode(database.iter_accounts_export(), format),
+        media_type=f"{media}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.post("/api/accounts/import")
+async def import_accounts(request: Request, format: str = None,
+                          dry_run: bool = False, snapshots: bool = True):
+    """Bulk create/update accounts from a CSV or JSONL request body.
+
+    The body is spooled while it streams in, parsed line by line and written
+    in one transaction. Bad rows are reported in "errors" (with their line
+    number) and skipped; all other rows are imported. dry_run only validates.
+    snapshots: seed new accounts with a manual lord_name/power snapshot
+    (existing accounts are never given one, so re-importing an export is safe).
+    """
+    import tempfile
+    from backend.storage import account_io
+    try:
+        fmt = account_io.detect_format(format, request.headers.get("content-type", ""))
+    except ValueError as e:
+        return {"error": str(e)}
+
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            rows, errors = await asyncio.to_thread(account_io.parse, spool, fmt)
+        except ValueError as e:
+            return {"error": str(e)}
+
+    total = len(rows) + errors.total
+    result = {"created": 0, "updated": 0, "snapshots": 0, "errors": []}
+    if not dry_run:
+        try:
+            result = await database.import_accounts(rows, snapshots=snapshots)
+        except Exception as e:
+            return {"error": f"Import failed, nothing was written: {e}"}
+    for err in result["errors"]:
+        errors.add(err["line"], err["error"], err["game_id"])
+    errors.sort(key=lambda err: err["line"])
+
+    return {
+        "status": "ok",
+        "format": fmt,
+        "dry_run": dry_run,
+        "rows": total,
+        "valid": len(rows) - len(result["errors"]),
+        "created": result["created"],
+        "updated": result["updated"],
+        "snapshots": result["snapshots"],
+        "error_count": errors.total,
+        "errors": errors,
+    }
 
 
 @app.post("/api/accounts")
@@ -446,6 +655,17 @@ async def get_account(game_id: str):
     return {"error": "Account not found", "game_id": game_id}
 
 
+@app.get("/api/accounts/{game_id}/trend")
+async def get_account_trend(request: Request, game_id: str, period: str = "day",
+                            since: str = None, until: str = None, limit: int = 400):
+    """Power / level / resource trend for one account (hourly or daily buckets)."""
+    if period not in ("hour", "day"):
+        return {"error": "period must be 'hour' or 'day'"}
+    limit = max(1, min(limit, 5000))
+    return await cached_json(request, ("db",), lambda: database.get_account_trend(
+        game_id, period=period, since=since, until=until, limit=limit))
+
+
 @app.put("/api/accounts/{game_id}")
 async def update_account(game_id: str, body: dict):
     """Update account fields (note, login_method, email, provider, alliance, lord_name)."""
@@ -511,14 +731,42 @@ async def dismiss_pending(pending_id: int):
 @app.on_event("startup")
 async def startup():
     """Initialize on startup."""
+    # Capture the server loop so worker threads can hand work back to it
+    runtime.set_loop(asyncio.get_running_loop())
+
     # Wire up WebSocket callback to task queue
     task_queue.set_ws_callback(ws_manager.broadcast_sync)
+    device_watcher.set_ws_callback(ws_manager.broadcast_sync)
+    from backend.core.launch_scheduler import launch_scheduler
+    launch_scheduler.set_ws_callback(ws_manager.broadcast_sync)
+    ws_manager.add_listener(state_sync.on_event)
 
     # Init database
     database.init_sync()
+    db_writer.start()
 
-    # Discover devices
-    emulator_manager.discover()
+    # Warm the LDPlayer instance cache in the background
+    from backend.core import ldplayer_manager
+    ldplayer_manager.instance_registry.refresh_async()
+
+    # Discover devices (event-driven; one-off scan only if adb can't be tracked)
+    device_watcher.start()
+    if not await asyncio.to_thread(device_watcher.wait_ready, 3.0):
+        emulator_manager.discover()
+    state_sync.start()
+    from backend.storage.retention import retention
+    retention.start()
     print(f"[API] Started on port {config.server_port}")
     print(f"[API] Devices found: {len(emulator_manager.get_all())}")
 
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background services and flush pending write-behind intents."""
+    from backend.core import adb_shell
+    from backend.storage.retention import retention
+    retention.stop()
+    state_sync.stop()
+    device_watcher.stop()
+    adb_shell.close_all()
+    db_writer.stop()
@@ -24,8 +24,12 @@ class AppConfig:
         return cls._instance
 
     def load(self, config_path: str = None):
-        """Load configuration from YAML file."""
-        path = Path(config_path) if config_path else CONFIG_PATH
+        """Load configuration from YAML file.
+
+        Without an explicit path, $COD_CONFIG (if set) wins over config.yaml,
+        e.g. to run against the emulator farm simulator (see sim/).
+        """
+        path = Path(config_path or os.environ.get("COD_CONFIG") or CONFIG_PATH)
         if not path.exists():
             raise FileNotFoundError(f"Config file not found: {path}")
 
@@ -33,6 +37,9 @@ class AppConfig:
             data = yaml.safe_load(f)
 
         self.adb_path = data.get("adb_path", r"C:\LDPlayer\LDPlayer9\adb.exe")
+        # ldconsole.exe next to adb.exe unless configured
+        self.ldconsole_path = data.get("ldconsole_path") or os.path.join(
+            os.path.dirname(self.adb_path), "ldconsole.exe")
         self.tesseract_path = data.get(
             "tesseract_path", r"C:\Program Files\Tesseract-OCR\tesseract.exe"
         )
@@ -42,6 +49,35 @@ class AppConfig:
         self.debug_screenshots = data.get("debug_screenshots", True)
         self.db_path = data.get("db_path", "data/cod_manager.db")
         self.server_port = data.get("server_port", 8000)
+        self.task_workers = int(data.get("task_workers", 4))
+        self.device_wait_timeout = float(data.get("device_wait_timeout", 300))
+        self.task_batch_max = int(data.get("task_batch_max", 8))
+        self.frame_max_age = float(data.get("frame_max_age", 2.0))
+        self.ping_timeout = float(data.get("ping_timeout", 3.0))
+        self.adb_server_host = data.get("adb_server_host", "127.0.0.1")
+        self.adb_server_port = int(data.get("adb_server_port", 5037))
+        self.health_cache_ttl = float(data.get("health_cache_ttl", 5.0))
+        self.instance_cache_ttl = float(data.get("instance_cache_ttl", 3.0))
+        self.launch_max_concurrent = int(data.get("launch_max_concurrent", 4))
+        self.launch_stagger = float(data.get("launch_stagger", 5.0))
+        self.launch_cpu_limit = float(data.get("launch_cpu_limit", 85.0))
+        self.launch_mem_limit = float(data.get("launch_mem_limit", 85.0))
+        self.launch_boot_timeout = float(data.get("launch_boot_timeout", 180))
+        self.launch_wait_lobby = data.get("launch_wait_lobby", False)
+        self.macro_cache_size = int(data.get("macro_cache_size", 32))
+        self.macro_touch_backend = data.get("macro_touch_backend", "auto")  # auto | sendevent | input
+        self.state_sync_interval = float(data.get("state_sync_interval", 5.0))
+        self.ws_queue_size = int(data.get("ws_queue_size", 256))
+        self.ws_coalesce_window = float(data.get("ws_coalesce_window", 0.5))
+        self.retention_enabled = data.get("retention_enabled", True)
+        self.retention_interval_hours = float(data.get("retention_interval_hours", 6))
+        self.retention_keep_last = int(data.get("retention_keep_last", 20))
+        self.retention_ocr_codec = data.get("retention_ocr_codec", "zlib")  # zlib | zstd
+        self.retention_capture_days = float(data.get("retention_capture_days", 3))
+        self.ocr_api_url = data.get("ocr_api_url", "https://ocrapi.cloud/api/v1").rstrip("/")
+        self.api_keys_file = data.get("api_keys_file", "api_keys.txt")
+        # Multiplier on fixed UI waits (cancel.sleep); < 1 only for the simulator
+        self.wait_scale = float(data.get("wait_scale", 1.0))
 
         # Resolve relative db_path to absolute
         if not os.path.isabs(self.db_path):
@@ -68,12 +104,40 @@ class AppConfig:
         """Serialize config for API response."""
         return {
             "adb_path": self.adb_path,
+            "ldconsole_path": self.ldconsole_path,
             "tesseract_path": self.tesseract_path,
             "resolution": self.resolution,
             "coordinate_map": self.coordinate_map,
             "work_dir": self.work_dir,
             "debug_screenshots": self.debug_screenshots,
             "server_port": self.server_port,
+            "task_workers": self.task_workers,
+            "device_wait_timeout": self.device_wait_timeout,
+            "task_batch_max": self.task_batch_max,
+            "frame_max_age": self.frame_max_age,
+            "ping_timeout": self.ping_timeout,
+            "adb_server_host": self.adb_server_host,
+            "adb_server_port": self.adb_server_port,
+            "health_cache_ttl": self.health_cache_ttl,
+            "instance_cache_ttl": self.instance_cache_ttl,
+            "launch_max_concurrent": self.launch_max_concurrent,
+            "launch_stagger": self.launch_stagger,
+            "launch_cpu_limit": self.launch_cpu_limit,
+            "launch_mem_limit": self.launch_mem_limit,
+            "launch_boot_timeout": self.launch_boot_timeout,
+            "launch_wait_lobby": self.launch_wait_lobby,
+            "macro_cache_size": self.macro_cache_size,
+            "macro_touch_backend": self.macro_touch_backend,
+            "state_sync_interval": self.state_sync_interval,
+            "ws_queue_size": self.ws_queue_size,
+            "ws_coalesce_window": self.ws_coalesce_window,
+            "retention_enabled": self.retention_enabled,
+            "retention_interval_hours": self.retention_interval_hours,
+            "retention_keep_last": self.retention_keep_last,
+            "retention_ocr_codec": self.retention_ocr_codec,
+            "retention_capture_days": self.retention_capture_days,
+            "ocr_api_url": self.ocr_api_url,
+            "wait_scale": self.wait_scale,
         }
 
 
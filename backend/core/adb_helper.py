@@ -2,28 +2,56 @@
 ADB Helper — Low-level ADB command wrapper.
 Extracted and enhanced from cod_app_sync.py.
 """
+import os
 import subprocess
+import threading
 import time
 from backend.config import config
+from backend.core.cancel import CancelToken, check, sleep
 
 
-def _run_adb(cmd_list: list[str], serial: str = None) -> str:
-    """Execute an ADB command and return stdout."""
+# Per-serial time.monotonic() of the last input sent (tap/swipe/key).
+# Screenshots taken before this point no longer show the current screen.
+_last_input: dict[str, float] = {}
+_input_lock = threading.Lock()
+
+
+def mark_input(serial: str):
+    """Record that an input event was just sent to a device."""
+    with _input_lock:
+        _last_input[serial] = time.monotonic()
+
+
+def last_input_at(serial: str) -> float:
+    """time.monotonic() of the last input sent to a device (0 if none)."""
+    return _last_input.get(serial, 0.0)
+
+
+def hidden_startupinfo():
+    """STARTUPINFO that keeps adb from flashing a console window (None off Windows)."""
+    if os.name != "nt":
+        return None
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+
+def _run_adb(cmd_list: list[str], serial: str = None, timeout: float = 30) -> str:
+    """Execute an ADB command and return stdout ("" on timeout/error)."""
     try:
         base = [config.adb_path]
         if serial:
             base += ["-s", serial]
         base += cmd_list
 
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo = hidden_startupinfo()
 
         result = subprocess.run(
             base,
             capture_output=True,
             text=True,
             startupinfo=startupinfo,
-            timeout=30,
+            timeout=timeout,
         )
         return result.stdout.strip()
     except subprocess.TimeoutExpired:
@@ -44,18 +72,66 @@ def list_devices() -> list[str]:
     return sorted(serials)
 
 
-def ping_device(serial: str) -> bool:
+def start_server():
+    """Start the local adb server if it is not running."""
+    _run_adb(["start-server"])
+
+
+def ping_device(serial: str, timeout: float = 30) -> bool:
     """Check if a device is responsive via ADB shell echo."""
     try:
-        result = _run_adb(["shell", "echo", "ping"], serial=serial)
+        result = _run_adb(["shell", "echo", "ping"], serial=serial, timeout=timeout)
         return "ping" in result
     except Exception:
         return False
 
 
+def getprop(serial: str, name: str, timeout: float = 30) -> str:
+    """Read an Android system property ("" if unavailable)."""
+    return _run_adb(["shell", "getprop", name], serial=serial, timeout=timeout)
+
+
+def display_info(serial: str, timeout: float = 10) -> dict | None:
+    """Probe screen size, density and rotation in one shell round trip.
+
+    Returns {"width", "height", "dpi", "orientation"} in the current
+    rotation (orientation 0-3 as reported by SurfaceOrientation), or
+    None if the size could not be read. An override size (`wm size WxH`)
+    wins over the physical one.
+    """
+    output = _run_adb(
+        ["shell", "wm size; wm density; dumpsys input | grep -m 1 SurfaceOrientation"],
+        serial=serial, timeout=timeout,
+    )
+    size = dpi = None
+    orientation = 0
+    for line in output.splitlines():
+        key, _, value = line.partition(":")
+        key, value = key.strip().lower(), value.strip()
+        try:
+            if key.endswith("size") and "x" in value:
+                if size is None or key.startswith("override"):
+                    w, h = value.split("x")
+                    size = (int(w), int(h))
+            elif key.endswith("density"):
+                if dpi is None or key.startswith("override"):
+                    dpi = int(value)
+            elif key == "surfaceorientation":
+                orientation = int(value)
+        except ValueError:
+            continue
+    if size is None:
+        return None
+    w, h = size
+    if orientation % 2:
+        w, h = h, w  # wm size reports the natural (unrotated) size
+    return {"width": w, "height": h, "dpi": dpi or 0, "orientation": orientation}
+
+
 def tap(serial: str, x: int, y: int):
     """Send tap event to device."""
     _run_adb(["shell", "input", "tap", str(x), str(y)], serial=serial)
+    mark_input(serial)
 
 
 def swipe(serial: str, x1: int, y1: int, x2: int, y2: int, duration: int = 300):
@@ -64,18 +140,45 @@ def swipe(serial: str, x1: int, y1: int, x2: int, y2: int, duration: int = 300):
         ["shell", "input", "swipe", str(x1), str(y1), str(x2), str(y2), str(duration)],
         serial=serial,
     )
+    mark_input(serial)
 
 
 def press_back(serial: str):
     """Send BACK key event."""
     _run_adb(["shell", "input", "keyevent", "4"], serial=serial)
+    mark_input(serial)
 
 
-def press_back_n(serial: str, count: int = 1, delay: float = 1.5):
-    """Send BACK key event multiple times with delay."""
+def press_back_n(serial: str, count: int = 1, delay: float = 1.5,
+                 cancel: CancelToken = None):
+    """Send BACK key event multiple times with delay (interruptible via `cancel`)."""
     for _ in range(count):
+        check(cancel)
         press_back(serial)
-        time.sleep(delay)
+        sleep(delay, cancel)
+
+
+def screencap_bytes(serial: str, timeout: float = 15) -> bytes | None:
+    """Capture a PNG screenshot straight to memory via exec-out (no /sdcard file)."""
+    try:
+        startupinfo = hidden_startupinfo()
+
+        result = subprocess.run(
+            [config.adb_path, "-s", serial, "exec-out", "screencap", "-p"],
+            capture_output=True,
+            startupinfo=startupinfo,
+            timeout=timeout,
+        )
+        if result.returncode == 0 and result.stdout:
+            return result.stdout
+        print(f"[ADB] Screencap returned code {result.returncode} for {serial}")
+        return None
+    except subprocess.TimeoutExpired:
+        print(f"[ADB] Screencap timeout on {serial}")
+        return None
+    except Exception as e:
+        print(f"[ADB] Screencap failed for {serial}: {e}")
+        return None
 
 
 def screencap(serial: str, local_path: str) -> bool:
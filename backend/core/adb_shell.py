@@ -0,0 +1,164 @@
+"""
+ADB Shell — Long-lived `adb shell` sessions for streaming commands.
+
+Every `adb shell <cmd>` call spawns a host process and a device shell.
+An AdbShell keeps one `adb -s <serial> shell` open and writes commands to
+its stdin instead, so sending a command costs a pipe write.
+
+Each command is followed by `echo <ACK_PREFIX><seq>`; a reader thread
+matches the echoes and calls the command's `on_ack(t)` callback with the
+time.monotonic() at which the device finished it. Callers use that to
+measure per-device lag.
+"""
+import subprocess
+import threading
+import time
+from typing import Callable
+
+from backend.config import config
+from backend.core.adb_helper import hidden_startupinfo
+
+
+ACK_PREFIX = "__ack__"
+
+
+class AdbShell:
+    """One persistent `adb shell` session for a device."""
+
+    def __init__(self, serial: str):
+        self.serial = serial
+        self._proc: subprocess.Popen | None = None
+        self._reader: threading.Thread | None = None
+        self._seq = 0
+        self._pending: dict[int, Callable | None] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def open(self):
+        """Start the shell process (no-op if already running)."""
+        if self.alive:
+            return
+        startupinfo = hidden_startupinfo()
+        self._proc = subprocess.Popen(
+            [config.adb_path, "-s", self.serial, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            startupinfo=startupinfo,
+        )
+        self._reader = threading.Thread(
+            target=self._read_loop, name=f"adb-shell-{self.serial}", daemon=True
+        )
+        self._reader.start()
+
+    def send(self, command: str, on_ack: Callable[[float], None] = None) -> int:
+        """Queue a command on the device shell without waiting for it.
+
+        Returns the command's sequence number. Raises BrokenPipeError if
+        the shell has died.
+        """
+        if not self.alive:
+            raise BrokenPipeError(f"adb shell for {self.serial} is not running")
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._pending[seq] = on_ack
+            try:
+                self._proc.stdin.write(f"{command}; echo {ACK_PREFIX}{seq}\n")
+                self._proc.stdin.flush()
+            except (OSError, ValueError) as e:
+                self._pending.pop(seq, None)
+                raise BrokenPipeError(str(e))
+        return seq
+
+    @property
+    def pending(self) -> int:
+        """Commands sent but not yet acknowledged by the device."""
+        return len(self._pending)
+
+    def drain(self, timeout: float = 10) -> bool:
+        """Wait until every sent command was acknowledged."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending and self.alive:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+            return not self._pending
+
+    def close(self):
+        """Terminate the shell; unacknowledged commands are dropped."""
+        proc = self._proc
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        with self._idle:
+            self._pending.clear()
+            self._idle.notify_all()
+
+    def _read_loop(self):
+        proc = self._proc
+        for line in proc.stdout:
+            line = line.strip()
+            if not line.startswith(ACK_PREFIX):
+                continue
+            now = time.monotonic()
+            try:
+                seq = int(line[len(ACK_PREFIX):])
+            except ValueError:
+                continue
+            with self._idle:
+                callback = self._pending.pop(seq, None)
+                if not self._pending:
+                    self._idle.notify_all()
+            if callback:
+                try:
+                    callback(now)
+                except Exception:
+                    pass
+        # EOF: shell exited, wake anyone draining
+        with self._idle:
+            self._idle.notify_all()
+
+
+# ──────────────────────────────────────────────
+# Shared sessions
+# ──────────────────────────────────────────────
+
+_shells: dict[str, AdbShell] = {}
+_shells_lock = threading.Lock()
+
+
+def get_shell(serial: str) -> AdbShell:
+    """Return the open shell for a device, (re)starting it if needed."""
+    with _shells_lock:
+        shell = _shells.get(serial)
+        if shell is None:
+            shell = AdbShell(serial)
+            _shells[serial] = shell
+        if not shell.alive:
+            shell.open()
+        return shell
+
+
+def close_all():
+    """Close every shared shell (server shutdown)."""
+    with _shells_lock:
+        shells = list(_shells.values())
+        _shells.clear()
+    for shell in shells:
+        shell.close()
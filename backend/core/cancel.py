@@ -0,0 +1,70 @@
+"""
+Cancel — Cooperative cancellation tokens for long-running device work.
+
+A CancelToken wraps a threading.Event. Workers wait on the token instead of
+calling time.sleep(), so cancel() wakes them immediately, and check() /
+sleep() raise Cancelled to unwind out of nested helpers (navigation,
+capture, OCR polling) without each one testing a flag.
+
+Helpers accept `cancel: CancelToken | None`; None means "not cancellable"
+and falls back to a plain sleep.
+"""
+import threading
+import time
+
+from backend.config import config
+
+
+class Cancelled(Exception):
+    """The operation's CancelToken was cancelled."""
+
+
+class CancelToken:
+    """One-shot cancellation flag shared between a worker and its controller."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = ""
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "Cancelled by user"):
+        """Request cancellation and wake every waiter."""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def wait(self, seconds: float) -> bool:
+        """Wait up to `seconds`; True if cancelled (returns early)."""
+        return self._event.wait(max(0.0, seconds))
+
+    def check(self):
+        """Raise Cancelled if cancellation was requested."""
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def sleep(self, seconds: float):
+        """Interruptible sleep; raises Cancelled when woken by cancel()."""
+        if self._event.wait(max(0.0, seconds)):
+            raise Cancelled(self.reason)
+
+
+def sleep(seconds: float, cancel: CancelToken | None = None):
+    """time.sleep() that raises Cancelled as soon as `cancel` is cancelled.
+
+    These are fixed UI waits (screen transitions, polling), so they are
+    scaled by config.wait_scale; the simulator benchmark shrinks them.
+    """
+    seconds *= config.wait_scale
+    if cancel is None:
+        time.sleep(seconds)
+    else:
+        cancel.sleep(seconds)
+
+
+def check(cancel: CancelToken | None = None):
+    """Raise Cancelled if `cancel` was cancelled (no-op for None)."""
+    if cancel is not None:
+        cancel.check()
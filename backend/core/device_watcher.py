@@ -0,0 +1,174 @@
+"""
+Device Watcher — Event-driven device discovery via adb track-devices.
+
+Keeps one socket open to the adb server (`host:track-devices`). The server
+pushes the full device list whenever it changes; each update is applied
+to emulator_manager incrementally and `device_online` / `device_offline`
+events are emitted, so nothing has to poll `adb devices`.
+
+Wire protocol (adb SERVICES.TXT):
+    request:  4-hex-digit length + "host:track-devices"
+    reply:    "OKAY", then frames of 4-hex-digit length + payload,
+              payload = lines of "<serial>\\t<state>\\n"
+"""
+import socket
+import threading
+from typing import Callable
+
+from backend.config import config
+from backend.core import adb_helper
+from backend.core.emulator import emulator_manager
+
+
+RECONNECT_DELAY = 2.0    # Seconds between reconnect attempts
+CONNECT_TIMEOUT = 3.0    # Seconds to reach the adb server
+
+
+class AdbProtocolError(Exception):
+    """The adb server refused or garbled a request."""
+
+
+def _read_exact(sock: socket.socket, n: int) -> bytes:
+    """Read exactly n bytes or raise ConnectionError on EOF."""
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("adb server closed the connection")
+        buf += chunk
+    return buf
+
+
+def _read_frame(sock: socket.socket) -> str:
+    """Read one length-prefixed frame."""
+    length = int(_read_exact(sock, 4), 16)
+    return _read_exact(sock, length).decode("utf-8", errors="replace") if length else ""
+
+
+def parse_device_list(payload: str) -> dict[str, str]:
+    """Parse a track-devices payload into {serial: state}."""
+    devices = {}
+    for line in payload.splitlines():
+        parts = line.split("\t")
+        if len(parts) >= 2 and parts[0]:
+            devices[parts[0]] = parts[1].strip()
+    return devices
+
+
+class DeviceWatcher:
+    """Background thread following the adb server's device list."""
+
+    def __init__(self):
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._ready = threading.Event()     # Set after the first device list
+        self._sock: socket.socket | None = None
+        self._ws_callback: Callable | None = None
+        self._states: dict[str, str] = {}   # serial -> last adb state
+
+    def set_ws_callback(self, callback: Callable):
+        """Set WebSocket broadcast callback for device events."""
+        self._ws_callback = callback
+
+    def _emit(self, event: str, data: dict):
+        if self._ws_callback:
+            try:
+                self._ws_callback(event, data)
+            except Exception:
+                pass
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_connected(self) -> bool:
+        """True while the registry is being kept current by the adb server."""
+        return self._ready.is_set() and self._sock is not None
+
+    def start(self):
+        """Start the watcher thread (idempotent)."""
+        if self.is_running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="device-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the watcher and close the socket."""
+        self._stop.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def wait_ready(self, timeout: float = 2.0) -> bool:
+        """Block until the first device list was applied."""
+        return self._ready.wait(timeout)
+
+    # ── Watcher thread ──
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection(
+            (config.adb_server_host, config.adb_server_port),
+            timeout=CONNECT_TIMEOUT,
+        )
+        request = b"host:track-devices"
+        sock.sendall(b"%04x" % len(request) + request)
+        status = _read_exact(sock, 4)
+        if status != b"OKAY":
+            message = _read_frame(sock) if status == b"FAIL" else status.decode()
+            sock.close()
+            raise AdbProtocolError(f"track-devices refused: {message}")
+        sock.settimeout(None)  # Updates arrive only when something changes
+        return sock
+
+    def _run(self):
+        server_started = False
+        while not self._stop.is_set():
+            try:
+                self._sock = self._connect()
+                print("[DeviceWatcher] Tracking devices via adb server")
+                while not self._stop.is_set():
+                    self._apply(parse_device_list(_read_frame(self._sock)))
+                    self._ready.set()
+            except (OSError, ConnectionError, AdbProtocolError, ValueError) as e:
+                if self._stop.is_set():
+                    break
+                if not server_started and isinstance(e, ConnectionRefusedError):
+                    # No adb server yet — start one, then reconnect
+                    adb_helper.start_server()
+                    server_started = True
+                    continue
+                print(f"[DeviceWatcher] Disconnected: {e}")
+            finally:
+                self._ready.clear()
+                if self._sock is not None:
+                    try:
+                        self._sock.close()
+                    except OSError:
+                        pass
+                    self._sock = None
+            self._stop.wait(RECONNECT_DELAY)
+
+    def _apply(self, devices: dict[str, str]):
+        """Apply one device list update and emit transition events."""
+        for serial, state in devices.items():
+            if self._states.get(serial) != state:
+                print(f"[DeviceWatcher] {serial}: {state}")
+        self._states = devices
+
+        online = [s for s, state in devices.items() if state == "device"]
+        came_online, went_offline = emulator_manager.sync_devices(online)
+        for emu in came_online:
+            self._emit("device_online", emu.to_dict())
+        for emu in went_offline:
+            self._emit("device_offline", emu.to_dict())
+
+
+# Global singleton
+device_watcher = DeviceWatcher()
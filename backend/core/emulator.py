@@ -5,8 +5,12 @@ Enhanced emulator management with status tracking, locking, and health checks.
 import os
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
 from backend.core import adb_helper
 from backend.config import config
+from backend.storage.data_version import data_version
 
 
 class EmulatorStatus:
@@ -19,6 +23,14 @@ class EmulatorStatus:
 class Emulator:
     """Represents a single emulator instance with state management."""
 
+    # Fields serialized by to_dict(); changing one invalidates cached payloads
+    _VERSIONED = frozenset({"status", "current_task", "error_msg", "last_activity", "display"})
+
+    def __setattr__(self, name, value):
+        if name in self._VERSIONED and getattr(self, name, None) != value:
+            data_version.bump("devices")
+        object.__setattr__(self, name, value)
+
     def __init__(self, serial: str):
         self.serial = serial
         self.status = EmulatorStatus.ONLINE
@@ -32,15 +44,29 @@ class Emulator:
         os.makedirs(self.temp_dir, exist_ok=True)
         self.screenshot_path = os.path.join(self.temp_dir, f"screen_{serial}.png")
 
-    def acquire(self, task_name: str = "unknown") -> bool:
-        """Try to lock the emulator for a task."""
-        if self.lock.acquire(blocking=False):
+        # Last captured frame (BGR) kept in memory for reuse
+        self.frame: np.ndarray | None = None
+        self.frame_at = 0.0  # time.monotonic() when the capture started
+
+        # Screen metadata (width/height/dpi/orientation), see display_info()
+        self.display: dict | None = None
+
+    def acquire(self, task_name: str = "unknown", timeout: float = 0) -> bool:
+        """Try to lock the emulator for a task, waiting up to `timeout` seconds."""
+        locked = (self.lock.acquire(timeout=timeout) if timeout > 0
+                  else self.lock.acquire(blocking=False))
+        if locked:
             self.status = EmulatorStatus.BUSY
             self.last_activity = time.time()
             self.current_task = task_name
             return True
         return False
 
+    def touch(self):
+        """Mark progress of the running job, so check_timeout() measures
+        time since its last step instead of since acquire()."""
+        self.last_activity = time.time()
+
     def release(self):
         """Unlock the emulator after task completion."""
         self.status = EmulatorStatus.ONLINE
@@ -50,9 +76,9 @@ class Emulator:
         except RuntimeError:
             pass  # Already released
 
-    def ping(self) -> bool:
+    def ping(self, timeout: float = 30) -> bool:
         """Check if device is responsive."""
-        alive = adb_helper.ping_device(self.serial)
+        alive = adb_helper.ping_device(self.serial, timeout=timeout)
         if not alive:
             self.status = EmulatorStatus.OFFLINE
         elif self.status == EmulatorStatus.OFFLINE:
@@ -60,7 +86,7 @@ class Emulator:
         return alive
 
     def check_timeout(self, max_seconds: int = 120) -> bool:
-        """Check if a running task has exceeded its timeout."""
+        """Check if a running task made no progress (touch()) for max_seconds."""
         if self.status != EmulatorStatus.BUSY:
             return False
         elapsed = time.time() - self.last_activity
@@ -82,6 +108,99 @@ class Emulator:
         self.error_msg = "Screenshot capture failed"
         return None
 
+    # ── In-memory frames ──
+
+    def frame_age(self) -> float | None:
+        """Seconds since the last frame was captured (None if no frame)."""
+        if self.frame is None:
+            return None
+        return time.monotonic() - self.frame_at
+
+    def frame_is_fresh(self, max_age: float = None) -> bool:
+        """True if the last frame still shows the current screen.
+
+        A frame is fresh when it is younger than `max_age` (default
+        config.frame_max_age) and no input was sent to the device since
+        it was taken.
+        """
+        if max_age is None:
+            max_age = config.frame_max_age
+        age = self.frame_age()
+        if age is None or age > max_age:
+            return False
+        return adb_helper.last_input_at(self.serial) < self.frame_at
+
+    def invalidate_frame(self):
+        """Drop the cached frame (e.g. after an out-of-band screen change)."""
+        self.frame = None
+        self.frame_at = 0.0
+
+    def capture_frame(self, max_age: float = None) -> np.ndarray | None:
+        """Return the current screen as a BGR array, captured to memory.
+
+        Reuses the last frame while frame_is_fresh(max_age); pass
+        max_age=0 to force a new capture.
+        """
+        if self.frame_is_fresh(max_age):
+            return self.frame
+
+        started = time.monotonic()
+        data = adb_helper.screencap_bytes(self.serial)
+        img = None
+        if data:
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            self.error_msg = "Screenshot capture failed"
+            return None
+
+        if config.debug_screenshots:
+            # Keep the on-disk copy for debugging (raw PNG, no re-encode)
+            try:
+                with open(self.screenshot_path, "wb") as f:
+                    f.write(data)
+            except OSError:
+                pass
+
+        self.frame = img
+        self.frame_at = started
+        return img
+
+    # ── Display metadata ──
+
+    def display_info(self, refresh: bool = False) -> dict | None:
+        """Screen width/height/dpi/orientation, cached on the emulator.
+
+        Read from the cached `ldconsole list2` snapshot while the instance
+        is listed there (no device round trip), otherwise probed once via
+        adb. The cached value only changes when its source reports a
+        different one; refresh=True forces a new adb probe.
+        """
+        from backend.core import ldplayer_manager
+
+        info = None
+        if not refresh:
+            index = ldplayer_manager.index_for_serial(self.serial)
+            entry = (ldplayer_manager.instance_registry.find(index)
+                     if index is not None else None)
+            if entry and entry["running"]:
+                info = {"width": entry["width"], "height": entry["height"],
+                        "dpi": entry["dpi"], "orientation": 0,
+                        "source": "ldconsole"}
+            elif self.display is not None:
+                return self.display
+
+        if info is None:
+            info = adb_helper.display_info(self.serial)
+            if info is None:
+                return self.display
+            info["source"] = "adb"
+
+        if info != self.display:
+            print(f"[Emulator] {self.serial} display: {info['width']}x{info['height']} "
+                  f"@{info['dpi']}dpi, rotation {info['orientation']} ({info['source']})")
+            self.display = info
+        return self.display
+
     def to_dict(self) -> dict:
         """Serialize emulator state for API response."""
         return {
@@ -90,9 +209,13 @@ class Emulator:
             "current_task": self.current_task,
             "error_msg": self.error_msg,
             "last_activity": self.last_activity,
+            "display": self.display,
         }
 
 
+HEALTH_WORKERS = 16  # Max parallel pings per health check
+
+
 class EmulatorManager:
     """Registry and lifecycle manager for all emulators."""
 
@@ -100,6 +223,11 @@ class EmulatorManager:
         self._instances: dict[str, Emulator] = {}
         self._lock = threading.Lock()
 
+        # Last health summary, reused for config.health_cache_ttl seconds
+        self._health: dict | None = None
+        self._health_at = 0.0
+        self._health_lock = threading.Lock()
+
     def get(self, serial: str) -> Emulator:
         """Get or create an emulator instance."""
         with self._lock:
@@ -118,37 +246,85 @@ class EmulatorManager:
     def discover(self) -> list[Emulator]:
         """Refresh device list from ADB and update registry."""
         serials = adb_helper.list_devices()
+        self.sync_devices(serials)
+        return [self.get(serial) for serial in serials]
+
+    def sync_devices(self, serials: list[str]) -> tuple[list[Emulator], list[Emulator]]:
+        """Apply a full list of connected serials to the registry.
+
+        Returns (came_online, went_offline). Busy emulators are never
+        marked OFFLINE; their running task will fail on its own.
+        """
+        connected = set(serials)
+        came_online, went_offline = [], []
 
         # Mark missing devices as OFFLINE
         with self._lock:
             for serial, emu in self._instances.items():
-                if serial not in serials and emu.status != EmulatorStatus.BUSY:
+                if serial not in connected and emu.status not in (
+                        EmulatorStatus.BUSY, EmulatorStatus.OFFLINE):
                     emu.status = EmulatorStatus.OFFLINE
+                    emu.invalidate_frame()
+                    emu.display = None  # May boot with other settings
+                    went_offline.append(emu)
 
         # Register new devices
-        result = []
-        for serial in serials:
+        for serial in sorted(connected):
+            is_new = serial not in self._instances
             emu = self.get(serial)
-            if emu.status == EmulatorStatus.OFFLINE:
+            if is_new or emu.status == EmulatorStatus.OFFLINE:
                 emu.status = EmulatorStatus.ONLINE
-            result.append(emu)
+                came_online.append(emu)
+
+        if came_online or went_offline:
+            self._health = None  # Cached health summary is out of date
+        if went_offline:
+            from backend.core import touch_injector
+            for emu in went_offline:
+                touch_injector.forget(emu.serial)  # Re-probe after a restart
+        return came_online, went_offline
 
-        return result
+    def health_check(self, max_age: float = None) -> dict:
+        """Ping all registered emulators, return health summary.
 
-    def health_check(self) -> dict:
-        """Ping all registered emulators, return health summary."""
+        Pings run in parallel with a short per-device timeout, so a check
+        takes about one ping regardless of farm size. A summary younger
+        than `max_age` (default config.health_cache_ttl) is returned as is;
+        concurrent callers wait for the in-flight check instead of
+        starting their own.
+        """
+        if max_age is None:
+            max_age = config.health_cache_ttl
+        with self._health_lock:
+            if (self._health is not None
+                    and time.monotonic() - self._health_at <= max_age):
+                return dict(self._health)
+            summary = self._run_health_check()
+            self._health = summary
+            self._health_at = time.monotonic()
+            return dict(summary)
+
+    def _run_health_check(self) -> dict:
         summary = {"total": 0, "online": 0, "busy": 0, "offline": 0, "error": 0}
-        for emu in self._instances.values():
+        to_ping = []
+        for emu in list(self._instances.values()):
             summary["total"] += 1
             emu.check_timeout()  # Auto-detect stuck tasks
             if emu.status == EmulatorStatus.BUSY:
                 summary["busy"] += 1
             elif emu.status == EmulatorStatus.ERROR:
                 summary["error"] += 1
-            elif emu.ping():
-                summary["online"] += 1
             else:
-                summary["offline"] += 1
+                to_ping.append(emu)
+
+        if to_ping:
+            timeout = config.ping_timeout
+            with ThreadPoolExecutor(
+                max_workers=min(len(to_ping), HEALTH_WORKERS),
+                thread_name_prefix="health",
+            ) as pool:
+                for alive in pool.map(lambda e: e.ping(timeout=timeout), to_ping):
+                    summary["online" if alive else "offline"] += 1
         return summary
 
 
@@ -2,27 +2,36 @@
 Full Scan Pipeline — Orchestrator for capture -> PDF -> OCR -> parse -> save.
 
 Runs the complete scan pipeline for one or more emulators in background threads.
-Broadcasts WebSocket progress events at each step.
+Broadcasts WebSocket progress events at each step. stop_scan() cancels the
+scan's CancelToken, which interrupts whichever wait the worker is in
+(navigation, capture, OCR polling) instead of letting it run to the end.
 """
 import time
 import threading
 import os
 from backend.config import config
+from backend.core.cancel import CancelToken, Cancelled
 from backend.core.macro_replay import _get_adb_serial
+from backend.metrics import stage_metrics, stage_timer
 
 # Track scan state
 _running_scans = {}
+_scan_tokens: dict[str, CancelToken] = {}   # key -> token of the running scan
 _lock = threading.Lock()
 
+LOBBY_STATES = ["IN-GAME LOBBY (IN_CITY)", "IN-GAME LOBBY (OUT_CITY)"]
+
 WORK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
                          "data", "scan_captures")
 
 
 def _scan_worker(emulator_index: int, emulator_name: str,
-                  ws_callback=None):
+                  ws_callback=None, cancel: CancelToken = None):
     """Background thread: runs full scan pipeline for one emulator."""
     serial = _get_adb_serial(emulator_index)
     key = f"scan-{emulator_index}"
+    cancel = cancel or CancelToken()
+    detector = None
 
     try:
         start_time = time.time()
@@ -61,19 +70,19 @@ def _scan_worker(emulator_index: int, emulator_name: str,
         detector = GameStateDetector(app_config.adb_path, templates_dir)
 
         game_id = ""
+        id_started = time.perf_counter()
         try:
             # Wait for lobby state (game must be loaded)
             lobby_state = core_actions.wait_for_state(
-                serial, detector,
-                ["IN-GAME LOBBY (IN_CITY)", "IN-GAME LOBBY (OUT_CITY)"],
-                timeout_sec=30,
+                serial, detector, LOBBY_STATES,
+                timeout_sec=30, cancel=cancel,
             )
 
             if lobby_state:
                 # Navigate to profile menu
-                if core_actions.go_to_profile(serial, detector):
+                if core_actions.go_to_profile(serial, detector, cancel=cancel):
                     # Extract player ID via clipboard
-                    player_id = core_actions.extract_player_id(serial, detector)
+                    player_id = core_actions.extract_player_id(serial, detector, cancel=cancel)
                     if player_id:
                         game_id = player_id
                         _broadcast("id_extracted", f"Game ID: {game_id}")
@@ -81,14 +90,17 @@ def _scan_worker(emulator_index: int, emulator_name: str,
                         _broadcast("id_skipped", "Copy ID failed, continuing scan...")
 
                     # Back to lobby before screenshot capture
-                    core_actions.back_to_lobby(serial, detector)
+                    core_actions.back_to_lobby(serial, detector, cancel=cancel)
                 else:
                     _broadcast("id_skipped", "Could not reach profile menu, continuing scan...")
             else:
                 _broadcast("id_skipped", "Game not in lobby state, continuing scan...")
+        except Cancelled:
+            raise
         except Exception as e:
             print(f"[FullScan] Game ID extraction error: {e}")
             _broadcast("id_skipped", f"ID extraction error: {e}")
+        stage_metrics.record("full_scan.id", time.perf_counter() - id_started)
 
         # ── Step 1: Capture Screenshots ──
         _broadcast("capturing", "Navigating and capturing screenshots...")
@@ -97,7 +109,8 @@ def _scan_worker(emulator_index: int, emulator_name: str,
         def progress_cb(phase, step, total):
             _broadcast(f"capturing ({step}/{total})", f"Phase: {phase}")
 
-        pdf_path = run_full_capture(serial, WORK_DIR, progress_callback=progress_cb)
+        pdf_path = run_full_capture(serial, WORK_DIR, progress_callback=progress_cb,
+                                    cancel=cancel)
 
         if not pdf_path:
             raise RuntimeError("Screenshot capture failed - no PDF created")
@@ -106,7 +119,8 @@ def _scan_worker(emulator_index: int, emulator_name: str,
         _broadcast("ocr_processing", "Uploading PDF to OCR API...")
         from backend.core.ocr_client import run_ocr
 
-        ocr_result = run_ocr(pdf_path)
+        with stage_timer("full_scan.ocr"):
+            ocr_result = run_ocr(pdf_path, cancel=cancel)
 
         if not ocr_result["success"]:
             raise RuntimeError(f"OCR failed: {ocr_result['error']}")
@@ -116,49 +130,47 @@ def _scan_worker(emulator_index: int, emulator_name: str,
         parsed_data = ocr_result["parsed"]
         raw_text = ocr_result["text"]
 
-        # ── Step 3: Save to Database ──
+        # ── Step 3: Save to Database ── (last point to cancel: nothing written yet)
+        cancel.check()
         _broadcast("saving", "Saving to database...")
-        import asyncio
+        from backend import runtime
         from backend.storage.database import database
+        from backend.storage.db_writer import db_writer
 
         elapsed_ms = int((time.time() - start_time) * 1000)
-
-        # Run async save in event loop
-        async def _save():
-            snap_id = await database.save_scan_snapshot(
-                emulator_index=emulator_index,
-                serial=serial,
-                emulator_name=emulator_name,
-                parsed_data=parsed_data,
-                scan_status="completed",
-                scan_duration_ms=elapsed_ms,
-                raw_ocr_text=raw_text,
+        db_started = time.perf_counter()
+
+        # Snapshot goes through the write-behind queue (acked: we need its id)
+        snap_id = db_writer.write(
+            "save_scan_snapshot",
+            emulator_index=emulator_index,
+            serial=serial,
+            emulator_name=emulator_name,
+            parsed_data=parsed_data,
+            scan_status="completed",
+            scan_duration_ms=elapsed_ms,
+            raw_ocr_text=raw_text,
+            game_id=game_id,
+        )
+
+        # Auto-link account if we have a game_id
+        async def _link():
+            emu_id = await database.get_emulator_id(emu_index=emulator_index)
+            if not emu_id:
+                return None
+            lord_name = parsed_data.get("lord_name", "")
+            return await database.auto_link_account(
+                emulator_id=emu_id,
                 game_id=game_id,
+                lord_name=lord_name,
+                snapshot_id=snap_id,
             )
 
-            # Auto-link account if we have a game_id
-            link_result = None
-            if game_id:
-                emu_id = await database.get_emulator_id(emu_index=emulator_index)
-                if emu_id:
-                    lord_name = parsed_data.get("lord_name", "")
-                    link_result = await database.auto_link_account(
-                        emulator_id=emu_id,
-                        game_id=game_id,
-                        lord_name=lord_name,
-                        snapshot_id=snap_id,
-                    )
-            return snap_id, link_result
-
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                future = asyncio.run_coroutine_threadsafe(_save(), loop)
-                snap_id, link_result = future.result(timeout=10)
-            else:
-                snap_id, link_result = loop.run_until_complete(_save())
-        except RuntimeError:
-            snap_id, link_result = asyncio.run(_save())
+        link_result = None
+        if game_id:
+            link_result = runtime.run(_link(), timeout=10)
+        stage_metrics.record("full_scan.db", time.perf_counter() - db_started)
+        stage_metrics.record("full_scan.total", time.time() - start_time)
 
         # ── Done ──
         with _lock:
@@ -186,6 +198,25 @@ def _scan_worker(emulator_index: int, emulator_name: str,
 
         print(f"[FullScan] Completed #{emulator_index} ({emulator_name}) in {elapsed_ms}ms | Game ID: {game_id or 'N/A'}")
 
+    except Cancelled as e:
+        print(f"[FullScan] Cancelled #{emulator_index} ({emulator_name})")
+        if detector is not None:
+            _return_to_lobby(serial, detector)
+        with _lock:
+            _running_scans[key] = {
+                "status": "cancelled",
+                "emulator_index": emulator_index,
+                "serial": serial,
+                "step": "cancelled",
+                "error": str(e),
+            }
+
+        if ws_callback:
+            ws_callback("scan_cancelled", {
+                "emulator_index": emulator_index,
+                "serial": serial,
+            })
+
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -206,6 +237,29 @@ def _scan_worker(emulator_index: int, emulator_name: str,
                 "error": str(e),
             })
 
+    finally:
+        with _lock:
+            if _scan_tokens.get(key) is cancel:
+                del _scan_tokens[key]
+
+
+def _return_to_lobby(serial: str, detector):
+    """Back out of whatever screen a cancelled scan stopped on.
+
+    Runs without the (already cancelled) token; the scan's token is still
+    registered meanwhile, so no new scan starts on this emulator mid-way.
+    """
+    from backend.core.workflow import core_actions
+
+    try:
+        for _ in range(3):  # Sub-screens (resources, profile) need several backs
+            if detector.check_state(serial) in LOBBY_STATES:
+                return
+            if core_actions.back_to_lobby(serial, detector):
+                return
+    except Exception as e:
+        print(f"[FullScan] Back to lobby failed on {serial}: {e}")
+
 
 def start_full_scan(emulator_index: int, emulator_name: str = "",
                      ws_callback=None) -> dict:
@@ -213,13 +267,14 @@ def start_full_scan(emulator_index: int, emulator_name: str = "",
     key = f"scan-{emulator_index}"
 
     with _lock:
-        existing = _running_scans.get(key)
-        if existing and existing.get("status") == "running":
+        if key in _scan_tokens:
             return {"success": False, "error": f"Scan already running on #{emulator_index}"}
+        cancel = CancelToken()
+        _scan_tokens[key] = cancel
 
     thread = threading.Thread(
         target=_scan_worker,
-        args=(emulator_index, emulator_name, ws_callback),
+        args=(emulator_index, emulator_name, ws_callback, cancel),
         daemon=True,
     )
     thread.start()
@@ -232,11 +287,14 @@ def start_full_scan(emulator_index: int, emulator_name: str = "",
 
 
 def stop_scan(emulator_index: int) -> dict:
-    """Stop a running scan."""
+    """Stop a running scan; its worker unwinds at the next wait or step."""
     key = f"scan-{emulator_index}"
     with _lock:
-        if key in _running_scans:
-            del _running_scans[key]
+        cancel = _scan_tokens.get(key)
+        if cancel is not None:
+            cancel.cancel()
+            if key in _running_scans:
+                _running_scans[key]["step"] = "cancelling"
             return {"success": True}
     return {"success": False, "error": "Scan not running"}
 
@@ -0,0 +1,299 @@
+"""
+Launch Scheduler — Staggered bulk emulator launch with boot readiness.
+
+Booting many LDPlayer instances at once saturates disk and CPU and every
+boot slows down. The scheduler admits a new boot only when:
+    - fewer than `launch_max_concurrent` instances are still booting,
+    - at least `launch_stagger` seconds passed since the previous admission
+      (so load readings reflect the last boot), and
+    - host CPU and memory are below `launch_cpu_limit` / `launch_mem_limit`
+      (needs psutil; without it only the two rules above apply).
+When nothing is booting one instance is always admitted, so a busy host
+slows the ramp-up down but never stalls it.
+
+An instance counts as ready when adb sees it, `sys.boot_completed` is 1
+and — if requested — the game lobby template is on screen.
+Progress is reported over WebSocket as `launch_progress`, `launch_ready`,
+`launch_failed`, `launch_cancelled` and `launch_completed`.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+try:
+    import psutil
+except ImportError:  # Optional: admission then uses the fixed caps only
+    psutil = None
+
+from backend.config import config
+from backend.core import adb_helper, ldplayer_manager
+from backend.core.macro_replay import _get_adb_serial
+
+
+POLL_INTERVAL = 2.0      # Seconds between readiness probes of one instance
+LOBBY_STATES = ["IN-GAME LOBBY (IN_CITY)", "IN-GAME LOBBY (OUT_CITY)"]
+
+
+class LaunchState:
+    QUEUED = "queued"
+    LAUNCHING = "launching"      # ldconsole launch sent, waiting for adb
+    BOOTING = "booting"          # adb online, waiting for sys.boot_completed
+    LOADING = "loading"          # Android up, waiting for the game lobby
+    READY = "ready"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+_DONE = (LaunchState.READY, LaunchState.FAILED, LaunchState.CANCELLED)
+
+
+def host_load() -> dict | None:
+    """Current host CPU / memory usage in percent (None without psutil)."""
+    if psutil is None:
+        return None
+    return {
+        "cpu": psutil.cpu_percent(interval=None),
+        "mem": psutil.virtual_memory().percent,
+    }
+
+
+class LaunchScheduler:
+    """Admission-controlled bulk launcher (one scheduler thread + one per boot)."""
+
+    def __init__(self):
+        self._jobs: dict[int, dict] = {}     # index -> job status dict
+        self._queue: deque[int] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._in_flight = 0                  # Boots whose final event is not out yet
+        self._last_admit = 0.0
+        self._ws_callback: Callable | None = None
+        self._detector = None                # Lazy GameStateDetector
+
+    def set_ws_callback(self, callback: Callable):
+        """Set WebSocket broadcast callback for launch events."""
+        self._ws_callback = callback
+
+    def _emit(self, event: str, data: dict):
+        if self._ws_callback:
+            try:
+                self._ws_callback(event, data)
+            except Exception:
+                pass
+
+    # ──────────────────────────────────────────
+    # Public API
+    # ──────────────────────────────────────────
+
+    def launch_many(self, indices: list[int], wait_lobby: bool = None) -> dict:
+        """Queue instances for launch. Already queued/booting ones are skipped."""
+        if wait_lobby is None:
+            wait_lobby = config.launch_wait_lobby
+        accepted, skipped = [], []
+        with self._cond:
+            for index in dict.fromkeys(indices):
+                job = self._jobs.get(index)
+                if job and job["state"] not in _DONE:
+                    skipped.append(index)
+                    continue
+                self._jobs[index] = {
+                    "index": index,
+                    "serial": _get_adb_serial(index),
+                    "state": LaunchState.QUEUED,
+                    "detail": "Waiting for a boot slot",
+                    "wait_lobby": wait_lobby,
+                    "queued_at": time.time(),
+                    "started_at": None,
+                    "ready_at": None,
+                    "error": "",
+                }
+                self._queue.append(index)
+                accepted.append(index)
+            if accepted:
+                self._ensure_thread()
+                self._cond.notify_all()
+        return {"accepted": accepted, "skipped": skipped}
+
+    def cancel(self) -> int:
+        """Drop every queued (not yet admitted) launch. Returns count."""
+        with self._cond:
+            cancelled = list(self._queue)
+            self._queue.clear()
+            for index in cancelled:
+                self._set(index, LaunchState.CANCELLED, "Cancelled before launch")
+                # Sent under the lock so launch_completed cannot overtake it
+                self._emit("launch_cancelled", dict(self._jobs[index]))
+            self._cond.notify_all()
+        return len(cancelled)
+
+    def get_status(self) -> dict:
+        """Snapshot of all launch jobs plus admission info."""
+        with self._cond:
+            jobs = [dict(j) for j in self._jobs.values()]
+        summary = {}
+        for job in jobs:
+            summary[job["state"]] = summary.get(job["state"], 0) + 1
+        return {
+            "jobs": sorted(jobs, key=lambda j: j["index"]),
+            "summary": summary,
+            "max_concurrent": config.launch_max_concurrent,
+            "host_load": host_load(),
+        }
+
+    # ──────────────────────────────────────────
+    # Admission (scheduler thread)
+    # ──────────────────────────────────────────
+
+    def _ensure_thread(self):
+        """Start the scheduler thread if needed (caller holds _cond).
+
+        _run clears _thread under the lock before it exits, so a thread that
+        is still winding down is never mistaken for a live scheduler.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="launch-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def _set(self, index: int, state: str, detail: str = "", error: str = ""):
+        job = self._jobs[index]
+        job["state"] = state
+        job["detail"] = detail
+        if error:
+            job["error"] = error
+        if state == LaunchState.READY:
+            job["ready_at"] = time.time()
+
+    def _booting(self) -> int:
+        """Boot slots in use: a slot is held until launch_ready/failed went out."""
+        return self._in_flight
+
+    def _admit_delay(self) -> float:
+        """Seconds until the next boot may start (0 = now). Caller holds _cond."""
+        booting = self._booting()
+        if booting >= config.launch_max_concurrent:
+            return POLL_INTERVAL  # Woken early when a boot finishes
+        if booting == 0:
+            return 0.0            # Never stall: one boot always runs
+        wait = self._last_admit + config.launch_stagger - time.monotonic()
+        if wait > 0:
+            return wait
+        load = host_load()
+        if load and (load["cpu"] > config.launch_cpu_limit
+                     or load["mem"] > config.launch_mem_limit):
+            return POLL_INTERVAL
+        return 0.0
+
+    def _run(self):
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)  # Prime the CPU sampler
+        while True:
+            with self._cond:
+                while True:
+                    if not self._queue:
+                        if self._booting() == 0:
+                            self._finish_batch()
+                            self._thread = None
+                            return
+                        self._cond.wait()
+                        continue
+                    delay = self._admit_delay()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(timeout=delay)
+
+                index = self._queue.popleft()
+                self._last_admit = time.monotonic()
+                job = self._jobs[index]
+                job["started_at"] = time.time()
+                self._set(index, LaunchState.LAUNCHING, "Starting emulator...")
+                self._in_flight += 1
+            self._emit("launch_progress", dict(job))
+            threading.Thread(
+                target=self._boot, args=(index,),
+                name=f"launch-{index}", daemon=True,
+            ).start()
+
+    def _finish_batch(self):
+        """All queued launches are done (caller holds _cond)."""
+        summary = {}
+        for job in self._jobs.values():
+            summary[job["state"]] = summary.get(job["state"], 0) + 1
+        self._emit("launch_completed", summary)
+
+    # ──────────────────────────────────────────
+    # Boot + readiness (one thread per instance)
+    # ──────────────────────────────────────────
+
+    def _update(self, index: int, state: str, detail: str):
+        with self._cond:
+            self._set(index, state, detail)
+            job = dict(self._jobs[index])
+        self._emit("launch_progress", job)
+
+    def _boot(self, index: int):
+        job = self._jobs[index]
+        serial = job["serial"]
+        deadline = time.monotonic() + config.launch_boot_timeout
+        try:
+            running = {i["index"]: i["running"]
+                       for i in ldplayer_manager.instance_registry.refresh()}
+            if not running.get(index):
+                ldplayer_manager.launch_instance(index)
+
+            # 1. adb sees the device
+            while not adb_helper.ping_device(serial, timeout=config.ping_timeout):
+                self._wait(deadline, "adb did not come online")
+
+            # 2. Android finished booting
+            self._update(index, LaunchState.BOOTING, "Waiting for Android boot...")
+            while adb_helper.getprop(serial, "sys.boot_completed",
+                                     timeout=config.ping_timeout) != "1":
+                self._wait(deadline, "Android boot did not complete")
+
+            # 3. Optional: game lobby visible
+            if job["wait_lobby"]:
+                self._update(index, LaunchState.LOADING, "Waiting for game lobby...")
+                detector = self._get_detector()
+                while detector.check_state(serial) not in LOBBY_STATES:
+                    self._wait(deadline, "Game lobby not reached")
+
+            with self._cond:
+                self._set(index, LaunchState.READY, "Ready")
+                job_data = dict(job)
+            elapsed = job_data["ready_at"] - job_data["started_at"]
+            print(f"[Launch] #{index} ready in {elapsed:.1f}s")
+            self._emit("launch_ready", job_data)
+
+        except Exception as e:
+            with self._cond:
+                self._set(index, LaunchState.FAILED, "Launch failed", error=str(e))
+                job_data = dict(job)
+            print(f"[Launch] #{index} failed: {e}")
+            self._emit("launch_failed", job_data)
+
+        # Free the boot slot only after the event went out, so
+        # launch_completed is always the last event of a batch
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _wait(self, deadline: float, error: str):
+        """Sleep one poll interval, or raise once the boot timed out."""
+        if time.monotonic() > deadline:
+            raise TimeoutError(error)
+        time.sleep(POLL_INTERVAL)
+
+    def _get_detector(self):
+        if self._detector is None:
+            from backend.core.workflow.state_detector import GameStateDetector
+            templates_dir = os.path.join(os.path.dirname(__file__), "workflow", "templates")
+            self._detector = GameStateDetector(config.adb_path, templates_dir)
+        return self._detector
+
+
+# Global singleton
+launch_scheduler = LaunchScheduler()
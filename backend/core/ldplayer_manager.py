@@ -5,10 +5,12 @@ Provides full instance discovery, start/stop, and macro operations.
 import subprocess
 import json
 import os
+import threading
+import time
 from backend.config import config
 
 def _get_ldconsole_path():
-    return os.path.join(os.path.dirname(config.adb_path), "ldconsole.exe")
+    return config.ldconsole_path
 
 
 def _get_operations_dir():
@@ -59,6 +61,8 @@ def list_all_instances() -> list[dict]:
                 "running": running,
                 "pid": pid,
                 "resolution": f"{w}x{h}",
+                "width": w,
+                "height": h,
                 "dpi": dpi,
             })
         except (ValueError, IndexError):
@@ -67,9 +71,125 @@ def list_all_instances() -> list[dict]:
     return instances
 
 
+class InstanceRegistry:
+    """Cached `list2` snapshot, refreshed in the background.
+
+    get() never runs ldconsole on the caller's thread: a stale snapshot is
+    returned as is while one background refresh fetches a new one.
+    Launch/quit invalidate the snapshot so the next read triggers a refresh.
+    Each invalidate() bumps a generation; a list2 result fetched under an
+    older generation is kept but stays stale, and another fetch follows.
+    """
+
+    def __init__(self):
+        self._instances: list[dict] = []
+        self._fetched_at = 0.0      # time.monotonic() of the last refresh
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+        self._refreshing = False    # A background refresh is running
+        self._generation = 0        # Bumped by invalidate()
+
+    @property
+    def loaded(self) -> bool:
+        """True once at least one list2 result is cached."""
+        return self._loaded.is_set()
+
+    def get(self, max_age: float = None) -> list[dict]:
+        """Cached instance list; schedules a refresh if older than max_age."""
+        if max_age is None:
+            max_age = config.instance_cache_ttl
+        if time.monotonic() - self._fetched_at > max_age:
+            self.refresh_async()
+        return list(self._instances)
+
+    def refresh(self) -> list[dict]:
+        """Run ldconsole list2 now (blocking) and update the cache."""
+        with self._lock:
+            generation = self._generation
+        instances = list_all_instances()
+        with self._lock:
+            current = self._store(instances, generation)
+        if not current:
+            self.refresh_async()  # Invalidated while list2 ran
+        return list(instances)
+
+    def _store(self, instances: list[dict], generation: int) -> bool:
+        """Cache a list2 result (caller holds _lock). False if it is already stale."""
+        current = generation == self._generation
+        self._instances = instances
+        self._fetched_at = time.monotonic() if current else 0.0
+        self._loaded.set()
+        return current
+
+    def refresh_async(self):
+        """Start a background refresh unless one is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_safe, name="ldplayer-list",
+                         daemon=True).start()
+
+    def _refresh_safe(self):
+        # Fetch until a result is not outdated by an invalidate(). The check
+        # and clearing _refreshing share one lock, so an invalidate() that
+        # found a refresh running is always picked up by that refresh.
+        while True:
+            with self._lock:
+                generation = self._generation
+            try:
+                instances = list_all_instances()
+            except Exception as e:
+                print(f"[LDPlayer] Instance refresh failed: {e}")
+                with self._lock:
+                    self._refreshing = False
+                return
+            with self._lock:
+                if self._store(instances, generation):
+                    self._refreshing = False
+                    return
+
+    def invalidate(self):
+        """Mark the snapshot stale and fetch a new one in the background."""
+        with self._lock:
+            self._generation += 1
+            self._fetched_at = 0.0
+        self.refresh_async()
+
+    def name_map(self) -> dict[int, str]:
+        """Cached {index: name} mapping."""
+        return {e["index"]: e["name"] for e in self.get()}
+
+    def find(self, index: int) -> dict | None:
+        """Cached entry for one instance index (None if unknown)."""
+        for entry in self.get():
+            if entry["index"] == index:
+                return entry
+        return None
+
+
+# Global singleton
+instance_registry = InstanceRegistry()
+
+
+def index_for_serial(serial: str) -> int | None:
+    """Instance index of an `emulator-<port>` serial (inverse of 5554 + 2*index)."""
+    prefix = "emulator-"
+    if not serial.startswith(prefix):
+        return None
+    try:
+        port = int(serial[len(prefix):])
+    except ValueError:
+        return None
+    if port < 5554 or port % 2:
+        return None
+    return (port - 5554) // 2
+
+
 def launch_instance(index: int) -> bool:
     """Start an emulator by index."""
     output = _run(["launch", "--index", str(index)], timeout=30)
+    instance_registry.invalidate()
     # ldconsole launch doesn't return useful output, but doesn't error
     return True
 
@@ -77,6 +197,7 @@ def launch_instance(index: int) -> bool:
 def quit_instance(index: int) -> bool:
     """Stop an emulator by index."""
     _run(["quit", "--index", str(index)], timeout=15)
+    instance_registry.invalidate()
     return True
 
 
@@ -131,17 +252,17 @@ def list_record_files() -> list[dict]:
 
 def load_record_content(filename: str) -> str:
     """Load the JSON content of a .record file."""
+    from backend.core.macro_replay import macro_cache
     fpath = os.path.join(_get_operations_dir(), filename)
     if not os.path.exists(fpath):
         return ""
-    with open(fpath, "r", encoding="utf-8") as f:
-        return f.read()
+    return macro_cache.get(fpath).content
 
 
 def run_operation(index: int, filename: str) -> dict:
     """Execute a macro script on a specific emulator.
 
-    Reads the .record file, writes to a temp file, and uses shell redirect
+    Reads the .record file (via the macro cache), writes to a temp file, and uses shell redirect
     to pipe it as the --content argument (bypasses Windows CLI length limits).
     Also returns estimated duration from operateinfo.
     """
@@ -150,15 +271,17 @@ def run_operation(index: int, filename: str) -> dict:
     if not os.path.exists(fpath):
         return {"success": False, "error": f"Record file not found: {filename}"}
 
-    # Read the record content
-    with open(fpath, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    # Get duration info
-    info = get_operation_info(index, filename)
-    duration_ms = 0
-    if info and "info" in info:
-        duration_ms = info["info"].get("circleDuration", 0)
+    # Read the record content (shared parsed-macro cache)
+    from backend.core.macro_replay import macro_cache
+    entry = macro_cache.get(fpath)
+    content = entry.content
+
+    # Get duration info (from the record itself; ldconsole only as fallback)
+    duration_ms = entry.duration_ms
+    if not duration_ms:
+        info = get_operation_info(index, filename)
+        if info and "info" in info:
+            duration_ms = info["info"].get("circleDuration", 0)
 
     # Use a temp file to pass large JSON to ldconsole
     import tempfile
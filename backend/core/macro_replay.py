@@ -4,6 +4,20 @@ Macro Replay Engine — ADB-based playback of LDPlayer .record files.
 Parses the .record JSON format and replays touch operations via
 `adb shell input tap / swipe` commands with accurate timing.
 
+Records are compiled into a Timeline (compact arrays of gesture start
+offsets, actions and target pixel coordinates) and from that into a
+ReplayPlan: shell command lines at offsets from loop start. Commands are
+streamed over a persistent adb shell at absolute time.monotonic()
+deadlines, so adb latency never accumulates as drift; how late each
+command completed is reported as lateness statistics.
+
+Touch backends (config.macro_touch_backend):
+    input      `input tap / swipe` per gesture (single finger)
+    sendevent  raw kernel touch frames via touch_injector (multi-touch,
+               original timing); falls back to `input` if the device has
+               no usable touchscreen
+    auto       sendevent when available (default)
+
 Coordinate System:
     LDPlayer .record files store touch coordinates at 12x scale
     of the recording resolution. For example, on a 960x540 emulator:
@@ -15,12 +29,15 @@ Coordinate System:
 """
 import json
 import time
-import asyncio
 import threading
-import subprocess
 import os
+from array import array
+from collections import OrderedDict
 from datetime import datetime
 from backend.config import config
+from backend.core import adb_helper
+from backend.core.cancel import CancelToken
+from backend.storage.db_writer import db_writer
 
 
 # LDPlayer .record coordinates use a 20x scale of the recording resolution.
@@ -30,9 +47,32 @@ COORD_SCALE = 20
 
 # Track running macros: key = f"{serial}:{filename}", value = status dict
 _running_macros = {}
+_macro_tokens: dict[str, CancelToken] = {}   # key -> CancelToken of the live replay
+# serial -> replay driving it (single key or group id). One replay per device:
+# two would interleave their input events in the same adb shell.
+_device_owners: dict[str, str] = {}
 _lock = threading.Lock()
 
 
+def _claim_devices(serials: list[str], owner: str) -> str | None:
+    """Reserve serials for one replay (caller holds _lock).
+
+    Returns the first serial already in use, or None once all are claimed.
+    """
+    for serial in serials:
+        if serial in _device_owners:
+            return serial
+    for serial in serials:
+        _device_owners[serial] = owner
+    return None
+
+
+def _release_devices(owner: str):
+    """Free every serial held by a replay (caller holds _lock)."""
+    for serial in [s for s, o in _device_owners.items() if o == owner]:
+        del _device_owners[serial]
+
+
 def _get_adb_serial(index: int) -> str:
     """Convert LDPlayer instance index to ADB serial.
     LDPlayer assigns ADB ports as: 5554 + (index * 2).
@@ -42,46 +82,26 @@ def _get_adb_serial(index: int) -> str:
 
 
 def _get_target_resolution(serial: str) -> tuple:
-    """Get the target emulator's screen resolution via ADB."""
-    try:
-        result = subprocess.run(
-            [config.adb_path, "-s", serial, "shell", "wm", "size"],
-            capture_output=True, text=True, timeout=5, encoding="utf-8",
-        )
-        # Output: "Physical size: 960x540"
-        for line in result.stdout.strip().splitlines():
-            if "size:" in line.lower():
-                parts = line.split(":")[-1].strip().split("x")
-                return int(parts[0]), int(parts[1])
-    except Exception:
-        pass
+    """Target emulator's screen resolution (cached display metadata)."""
+    from backend.core.emulator import emulator_manager
+    info = emulator_manager.get(serial).display_info()
+    if info:
+        return info["width"], info["height"]
     return 960, 540  # fallback
 
 
-def _adb_tap(serial: str, x: int, y: int):
-    """Send a tap event via ADB."""
-    subprocess.run(
-        [config.adb_path, "-s", serial, "shell",
-         "input", "tap", str(x), str(y)],
-        capture_output=True, timeout=5,
-    )
-
+def parse_record(filepath: str) -> dict:
+    """Parse a .record file and return operations + metadata.
 
-def _adb_swipe(serial: str, x1: int, y1: int, x2: int, y2: int,
-               duration_ms: int = 200):
-    """Send a swipe event via ADB."""
-    subprocess.run(
-        [config.adb_path, "-s", serial, "shell",
-         "input", "swipe",
-         str(x1), str(y1), str(x2), str(y2), str(duration_ms)],
-        capture_output=True, timeout=10,
-    )
+    Uncached; replay paths go through macro_cache.get() instead.
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        return parse_record_content(f.read())
 
 
-def parse_record(filepath: str) -> dict:
-    """Parse a .record file and return operations + metadata."""
-    with open(filepath, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def parse_record_content(content: str) -> dict:
+    """Parse .record JSON text and return operations + metadata."""
+    data = json.loads(content)
 
     operations = data.get("operations", [])
     record_info = data.get("recordInfo", {})
@@ -116,34 +136,370 @@ def _convert_coord(record_x, record_y,
     return int(round(px_x)), int(round(px_y))
 
 
-def _run_db_async(coro):
-    """Run an async DB coroutine from a background thread."""
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=10)
-        else:
-            return loop.run_until_complete(coro)
-    except RuntimeError:
-        return asyncio.run(coro)
+# ──────────────────────────────────────────────
+# Compiled timelines
+# ──────────────────────────────────────────────
+
+ACTION_TAP = 0
+ACTION_SWIPE = 1
+SWIPE_THRESHOLD = 10     # Pixels of movement that turn a tap into a swipe
+MIN_SWIPE_MS = 50
+
+
+class Timeline:
+    """A .record compiled for one target resolution.
+
+    One entry per gesture, stored as parallel compact arrays:
+        at_ms           offset from loop start of the touch DOWN
+        action          ACTION_TAP / ACTION_SWIPE
+        x1, y1, x2, y2  target pixel coordinates (x2/y2 = x1/y1 for taps)
+        dur_ms          swipe duration (0 for taps)
+    Gestures are scheduled at their DOWN time: `input swipe` replays the
+    whole movement, so the next gesture still starts on schedule.
+    """
+    __slots__ = ("resolution", "period_ms",
+                 "at_ms", "action", "x1", "y1", "x2", "y2", "dur_ms")
+
+    def __init__(self, resolution: tuple):
+        self.resolution = resolution
+        self.period_ms = 0       # Length of one loop
+        self.at_ms = array("i")
+        self.action = array("b")
+        self.x1 = array("i")
+        self.y1 = array("i")
+        self.x2 = array("i")
+        self.y2 = array("i")
+        self.dur_ms = array("i")
+
+    def __len__(self) -> int:
+        return len(self.at_ms)
+
+    def append(self, at_ms: int, action: int, x1: int, y1: int,
+               x2: int, y2: int, dur_ms: int = 0):
+        self.at_ms.append(at_ms)
+        self.action.append(action)
+        self.x1.append(x1)
+        self.y1.append(y1)
+        self.x2.append(x2)
+        self.y2.append(y2)
+        self.dur_ms.append(dur_ms)
+
+
+def compile_timeline(record: dict, target_w: int, target_h: int) -> Timeline:
+    """Compile parsed .record operations into a Timeline for one resolution.
+
+    PutMultiTouch with state=1 is a touch DOWN; the matching state=0 is the
+    UP. Movement over SWIPE_THRESHOLD px between them makes a swipe,
+    otherwise a tap at the DOWN position. Empty point lists are release
+    markers and are skipped.
+    """
+    rec_w, rec_h = record["record_width"], record["record_height"]
+    timeline = Timeline((target_w, target_h))
+    down_pos = None
+    down_timing = 0
+    last_timing = 0
+
+    for op in record["operations"]:
+        if op.get("operationId") != "PutMultiTouch":
+            continue
+        timing = op.get("timing", 0)
+        last_timing = max(last_timing, timing)
+        points = op.get("points", [])
+        if not points:
+            continue
+
+        p = points[0]
+        state = p.get("state", 0)
+        ax, ay = _convert_coord(p["x"], p["y"], rec_w, rec_h, target_w, target_h)
+
+        if state == 1:
+            down_pos = (ax, ay)
+            down_timing = timing
+        elif state == 0 and down_pos is not None:
+            dx = abs(ax - down_pos[0])
+            dy = abs(ay - down_pos[1])
+            if dx > SWIPE_THRESHOLD or dy > SWIPE_THRESHOLD:
+                timeline.append(down_timing, ACTION_SWIPE, down_pos[0], down_pos[1],
+                                ax, ay, max(MIN_SWIPE_MS, timing - down_timing))
+            else:
+                timeline.append(down_timing, ACTION_TAP, down_pos[0], down_pos[1],
+                                down_pos[0], down_pos[1])
+            down_pos = None
+
+    timeline.period_ms = max(record["duration_ms"] or 0, last_timing)
+    return timeline
+
+
+class ReplayPlan:
+    """Shell command lines to send at offsets from loop start.
+
+    gesture_end marks commands that complete a gesture (last finger up);
+    progress is counted in gestures whatever the backend.
+    """
+    __slots__ = ("backend", "period_ms", "at_ms", "commands", "gesture_end",
+                 "release")
+
+    def __init__(self, backend: str, period_ms: int, release: str = ""):
+        self.backend = backend
+        self.period_ms = period_ms
+        self.release = release      # Lifts all fingers if stopped mid-gesture
+        self.at_ms = array("i")
+        self.commands: list[str] = []
+        self.gesture_end = array("b")
+
+    def __len__(self) -> int:
+        return len(self.at_ms)
+
+    @property
+    def gestures(self) -> int:
+        return sum(self.gesture_end)
+
+    def append(self, at_ms: int, command: str, ends_gesture: bool):
+        self.at_ms.append(at_ms)
+        self.commands.append(command)
+        self.gesture_end.append(1 if ends_gesture else 0)
+
+
+def _shell_command(timeline: Timeline, i: int) -> str:
+    """`input` command line for gesture i of a timeline."""
+    if timeline.action[i] == ACTION_SWIPE:
+        return (f"input swipe {timeline.x1[i]} {timeline.y1[i]} "
+                f"{timeline.x2[i]} {timeline.y2[i]} {timeline.dur_ms[i]}")
+    return f"input tap {timeline.x1[i]} {timeline.y1[i]}"
+
+
+def input_plan(timeline: Timeline) -> ReplayPlan:
+    """One `input tap/swipe` command per gesture."""
+    plan = ReplayPlan("input", timeline.period_ms)
+    for i in range(len(timeline)):
+        plan.append(timeline.at_ms[i], _shell_command(timeline, i), True)
+    return plan
+
+
+def compile_touch_frames(record: dict, target_w: int, target_h: int,
+                         device) -> ReplayPlan:
+    """Compile PutMultiTouch operations 1:1 into sendevent frames.
+
+    Every operation becomes one frame at its own timing. Points are
+    tracked by their recorded id: state=1 puts a finger down or moves it,
+    state=0 lifts it, an empty point list lifts all fingers.
+    """
+    rec_w, rec_h = record["record_width"], record["record_height"]
+    contacts: dict[int, tuple] = {}     # slot -> (tracking_id, x, y)
+    slot_of: dict[int, int] = {}        # recorded point id -> slot
+    next_tracking_id = 1
+    last_timing = 0
+    max_slots = device.slots or 10
+    plan = ReplayPlan("sendevent", 0, device.encode_release())
+
+    for op in record["operations"]:
+        if op.get("operationId") != "PutMultiTouch":
+            continue
+        timing = op.get("timing", 0)
+        last_timing = max(last_timing, timing)
+        was_touching = bool(contacts)
+        changes = []
+
+        points = op.get("points", [])
+        if not points:
+            for slot in sorted(contacts):
+                changes.append(("up", slot))
+            contacts.clear()
+            slot_of.clear()
+
+        for p in points:
+            pid = p.get("id", 0)
+            slot = slot_of.get(pid)
+            if p.get("state", 0) == 1:
+                x, y = _convert_coord(p["x"], p["y"], rec_w, rec_h, target_w, target_h)
+                if slot is None:
+                    free = [s for s in range(max_slots) if s not in contacts]
+                    if not free:
+                        continue  # More fingers than the device supports
+                    slot = free[0]
+                    slot_of[pid] = slot
+                    contacts[slot] = (next_tracking_id, x, y)
+                    next_tracking_id += 1
+                    changes.append(("down", slot))
+                elif contacts[slot][1:] != (x, y):
+                    contacts[slot] = (contacts[slot][0], x, y)
+                    changes.append(("move", slot))
+            elif slot is not None:
+                del contacts[slot]
+                del slot_of[pid]
+                changes.append(("up", slot))
+
+        if changes:
+            plan.append(timing,
+                        device.encode_frame(contacts, changes, was_touching,
+                                            target_w, target_h),
+                        was_touching and not contacts)
+
+    if contacts:
+        # Never leave a finger down at the end of a loop
+        plan.append(last_timing,
+                    device.encode_frame({}, [("up", s) for s in sorted(contacts)],
+                                        True, target_w, target_h),
+                    True)
+
+    plan.period_ms = max(record["duration_ms"] or 0, last_timing)
+    return plan
+
+
+def _touch_device(serial: str):
+    """Touchscreen to inject into, or None to use `input`."""
+    if config.macro_touch_backend == "input":
+        return None
+    from backend.core import touch_injector
+    return touch_injector.probe(serial)
+
+
+# ──────────────────────────────────────────────
+# Parsed macro cache
+# ──────────────────────────────────────────────
+
+class MacroEntry:
+    """A parsed .record plus everything derived from it.
+
+    Timelines and replay plans are compiled lazily, once per target
+    resolution (and touch device).
+    """
+    __slots__ = ("path", "mtime_ns", "size", "content", "record",
+                 "touch_count", "duration_ms", "_timelines", "_plans", "_lock")
+
+    def __init__(self, path: str, mtime_ns: int, size: int, content: str):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.content = content          # Raw JSON (for ldconsole operaterecord)
+        self.record = parse_record_content(content)
+        self.duration_ms = self.record["duration_ms"]
+        self._timelines: dict[tuple, Timeline] = {}
+        self._plans: dict[tuple, ReplayPlan] = {}
+        self._lock = threading.Lock()
+        self.touch_count = len(self.timeline(
+            self.record["record_width"], self.record["record_height"]
+        ))
+
+    def timeline(self, target_w: int, target_h: int) -> Timeline:
+        """Compiled timeline for a target resolution (cached)."""
+        key = (target_w, target_h)
+        with self._lock:
+            timeline = self._timelines.get(key)
+            if timeline is None:
+                timeline = compile_timeline(self.record, target_w, target_h)
+                self._timelines[key] = timeline
+            return timeline
+
+    def plan(self, target_w: int, target_h: int, device=None) -> ReplayPlan:
+        """Replay plan for a resolution; sendevent frames if `device` is given."""
+        key = (target_w, target_h, device.key if device else None)
+        with self._lock:
+            plan = self._plans.get(key)
+        if plan is None:
+            if device is not None:
+                plan = compile_touch_frames(self.record, target_w, target_h, device)
+            else:
+                plan = input_plan(self.timeline(target_w, target_h))
+            with self._lock:
+                self._plans[key] = plan
+        return plan
+
+
+class MacroCache:
+    """LRU cache of parsed .record files, keyed by path.
+
+    An entry is reused only while the file's mtime and size are unchanged,
+    so edited recordings are picked up on the next run.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, MacroEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filepath: str) -> MacroEntry:
+        """Return the parsed entry for a .record file (raises OSError if missing)."""
+        path = os.path.abspath(filepath)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse outside the lock; a concurrent miss on the same file just
+        # parses it twice and the last one wins
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        entry = MacroEntry(path, st.st_mtime_ns, st.st_size, content)
+
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            limit = self._max_entries or config.macro_cache_size
+            while len(self._entries) > limit:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, filepath: str = None):
+        """Drop one file's entry, or everything."""
+        with self._lock:
+            if filepath is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(filepath), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits,
+                    "misses": self.misses}
+
+
+# Global singleton
+macro_cache = MacroCache()
+
+
+def lateness_stats(samples: list[float]) -> dict:
+    """Summarize how late gestures fired relative to their deadlines (ms)."""
+    if not samples:
+        return {"count": 0, "mean_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 1),
+        "p95_ms": round(p95, 1),
+        "max_ms": round(ordered[-1], 1),
+    }
 
 
 def _replay_worker(serial: str, filepath: str, filename: str,
-                    emu_index: int = -1, ws_callback=None):
+                    emu_index: int = -1, ws_callback=None,
+                    cancel: CancelToken = None):
     """Background thread that replays a macro on one emulator.
 
-    Processes operations sequentially with proper timing:
-    1. PutMultiTouch with state=1 → touch DOWN (save position)
-    2. PutMultiTouch with empty points → release indicator
-    3. PutMultiTouch with state=0 → touch UP
-       - Compare with DOWN position: if movement > threshold → swipe, else → tap
+    The record is compiled once for the target resolution and touch
+    backend, then each loop streams its commands to the device's
+    persistent adb shell at absolute deadlines (loop start + offset)
+    instead of sleeping relative gaps, so adb latency does not add up.
+    A loop that overruns its period starts the next loop immediately.
+    Waits are on the CancelToken, so stop_replay() takes effect at once.
     """
+    from backend.core import adb_shell
+
     key = f"{serial}:{filename}"
-    db_run_id = None  # DB macro_runs.id
+    cancel = cancel or CancelToken()
+    db_run_id = None  # Future -> DB macro_runs.id
+    start_time = time.time()
 
     try:
-        record = parse_record(filepath)
-        ops = record["operations"]
+        entry = macro_cache.get(filepath)
+        record = entry.record
         loop_times = record["loop_times"]
         duration_ms = record["duration_ms"]
         rec_w = record["record_width"]
@@ -151,50 +507,33 @@ def _replay_worker(serial: str, filepath: str, filename: str,
 
         # Get target emulator's actual resolution
         tgt_w, tgt_h = _get_target_resolution(serial)
-        print(f"[MacroReplay] Record: {rec_w}x{rec_h} -> Target: {tgt_w}x{tgt_h}")
-
-        # Count actionable touch events
-        touch_count = 0
-        for op in ops:
-            if op.get("operationId") == "PutMultiTouch":
-                pts = op.get("points", [])
-                if len(pts) == 1 and pts[0].get("state") == 1:
-                    touch_count += 1
-
-        # ── Persist to DB ──
-        try:
-            from backend.storage.database import database
-            resolution = f"{rec_w}x{rec_h}"
-            macro_id = _run_db_async(
-                database.upsert_macro(
-                    filename=filename, resolution=resolution,
-                    duration_ms=duration_ms, file_path=filepath,
-                )
-            )
-            emu_id = _run_db_async(
-                database.upsert_emulator(emu_index, serial)
-            )
-            db_run_id = _run_db_async(
-                database.save_macro_run(
-                    macro_id=macro_id, emulator_id=emu_id,
-                    status="running", ops_total=touch_count,
-                )
-            )
-        except Exception as db_err:
-            print(f"[MacroReplay] DB save warning: {db_err}")
+        plan = entry.plan(tgt_w, tgt_h, _touch_device(serial))
+        touch_count = plan.gestures
+        print(f"[MacroReplay] Record: {rec_w}x{rec_h} -> Target: {tgt_w}x{tgt_h} "
+              f"({plan.backend}, {len(plan)} commands)")
+
+        shell = adb_shell.get_shell(serial)
+
+        # ── Persist to DB (write-behind, run id resolved by the writer) ──
+        db_run_id = db_writer.submit(
+            "start_macro_run",
+            filename=filename, serial=serial, emu_index=emu_index,
+            resolution=f"{rec_w}x{rec_h}", duration_ms=duration_ms,
+            file_path=filepath, ops_total=touch_count, status="running",
+        )
 
         with _lock:
             _running_macros[key] = {
                 "status": "running",
                 "filename": filename,
                 "serial": serial,
-                "start_time": time.time(),
+                "start_time": start_time,
                 "total_ops": touch_count,
                 "completed_ops": 0,
                 "current_loop": 1,
                 "total_loops": loop_times,
                 "duration_ms": duration_ms,
-                "db_run_id": db_run_id,
+                "backend": plan.backend,
             }
 
         if ws_callback:
@@ -205,116 +544,100 @@ def _replay_worker(serial: str, filepath: str, filename: str,
                 "duration_ms": duration_ms,
             })
 
-        last_ws_time = 0
+        def on_ack(t: float, deadline: float):
+            lateness.append((t - deadline) * 1000)
+            adb_helper.mark_input(serial)
+
+        lateness = []       # ms each command completed after its deadline
+        in_gesture = False
+        loop_start = time.monotonic()
+        completed = 0
         for loop in range(loop_times):
+            if cancel.cancelled:
+                break
             with _lock:
-                if key not in _running_macros:
-                    break
-                _running_macros[key]["current_loop"] = loop + 1
+                if key in _running_macros:
+                    _running_macros[key]["current_loop"] = loop + 1
 
-            prev_timing = 0
             completed = 0
-            down_pos = None  # Track touch-down position
-            down_timing = 0
-
-            for op in ops:
-                with _lock:
-                    if key not in _running_macros:
-                        break
-
-                if op.get("operationId") != "PutMultiTouch":
-                    continue
-
-                timing = op.get("timing", 0)
-                points = op.get("points", [])
-
-                # Wait for proper timing
-                delay = (timing - prev_timing) / 1000.0
-                if delay > 0.001:
-                    time.sleep(delay)
-                prev_timing = timing
-
-                if len(points) == 0:
-                    # Empty points = release event, skip
+            for i in range(len(plan)):
+                deadline = loop_start + plan.at_ms[i] / 1000.0
+                if cancel.wait(deadline - time.monotonic()):
+                    break
+                shell.send(plan.commands[i],
+                           on_ack=lambda t, d=deadline: on_ack(t, d))
+                if not plan.gesture_end[i]:
+                    in_gesture = True
                     continue
 
-                if len(points) >= 1:
-                    p = points[0]
-                    state = p.get("state", 0)
-                    ax, ay = _convert_coord(
-                        p["x"], p["y"],
-                        rec_w, rec_h, tgt_w, tgt_h,
-                    )
-
-                    if state == 1:
-                        # Touch DOWN — save position
-                        down_pos = (ax, ay)
-                        down_timing = timing
-
-                    elif state == 0 and down_pos is not None:
-                        # Touch UP — determine tap vs swipe
-                        dx = abs(ax - down_pos[0])
-                        dy = abs(ay - down_pos[1])
-                        dt = timing - down_timing
-
-                        if dx > 10 or dy > 10:
-                            # Significant movement → swipe
-                            swipe_dur = max(50, dt)
-                            _adb_swipe(serial,
-                                       down_pos[0], down_pos[1],
-                                       ax, ay, swipe_dur)
-                            print(f"[MacroReplay] swipe ({down_pos[0]},{down_pos[1]}) → ({ax},{ay}) {swipe_dur}ms")
-                        else:
-                            # Tap at down position
-                            _adb_tap(serial, down_pos[0], down_pos[1])
-                            print(f"[MacroReplay] tap ({down_pos[0]},{down_pos[1]})")
-
-                        completed += 1
-                        down_pos = None
-
-                        with _lock:
-                            if key in _running_macros:
-                                _running_macros[key]["completed_ops"] = completed
-
-                        if ws_callback:
-                            now = time.time()
-                            if completed == touch_count or (now - last_ws_time) >= 1.0:
-                                ws_callback("macro_progress", {
-                                    "serial": serial,
-                                    "filename": filename,
-                                    "completed": completed,
-                                    "total": touch_count,
-                                })
-                                last_ws_time = now
+                in_gesture = False
+                completed += 1
+                with _lock:
+                    if key in _running_macros:
+                        _running_macros[key]["completed_ops"] = completed
+
+                if ws_callback:
+                    # Throttled per emulator by the WebSocket EventBus
+                    ws_callback("macro_progress", {
+                        "serial": serial,
+                        "filename": filename,
+                        "completed": completed,
+                        "total": touch_count,
+                    })
+
+            # Next loop starts one period later, or now if this one overran
+            loop_start = max(loop_start + plan.period_ms / 1000.0,
+                             time.monotonic())
+
+        if in_gesture and plan.release:
+            shell.send(plan.release)  # Stopped with a finger down
+        shell.drain(timeout=2 if cancel.cancelled else 10)
+
+        stats = lateness_stats(lateness)
+        print(f"[MacroReplay] {filename} lateness: mean {stats['mean_ms']}ms, "
+              f"p95 {stats['p95_ms']}ms, max {stats['max_ms']}ms")
+        elapsed = time.time() - start_time
+
+        if cancel.cancelled:
+            print(f"[MacroReplay] {filename} stopped on {serial}")
+            if db_run_id is not None:
+                db_writer.submit(
+                    "update_macro_run",
+                    run_id=db_run_id, status="cancelled",
+                    ops_completed=completed,
+                    finished_at=datetime.now().isoformat(),
+                )
+            if ws_callback:
+                ws_callback("macro_stopped", {
+                    "serial": serial,
+                    "filename": filename,
+                    "completed": completed,
+                    "elapsed_ms": int(elapsed * 1000),
+                })
+            return
 
         # Done
-        elapsed = time.time() - _running_macros.get(key, {}).get(
-            "start_time", time.time()
-        )
         with _lock:
             if key in _running_macros:
                 _running_macros[key]["status"] = "completed"
                 _running_macros[key]["elapsed_ms"] = int(elapsed * 1000)
+                _running_macros[key]["lateness"] = stats
 
         # ── Update DB ──
-        if db_run_id:
-            try:
-                from backend.storage.database import database
-                _run_db_async(
-                    database.update_macro_run(
-                        run_id=db_run_id, status="completed",
-                        ops_completed=touch_count,
-                        finished_at=datetime.now().isoformat(),
-                    )
-                )
-            except Exception as db_err:
-                print(f"[MacroReplay] DB update warning: {db_err}")
+        if db_run_id is not None:
+            db_writer.submit(
+                "update_macro_run",
+                run_id=db_run_id, status="completed",
+                ops_completed=touch_count,
+                finished_at=datetime.now().isoformat(),
+            )
 
         if ws_callback:
             ws_callback("macro_completed", {
                 "serial": serial,
                 "filename": filename,
                 "elapsed_ms": int(elapsed * 1000),
+                "lateness": stats,
             })
 
     except Exception as e:
@@ -326,18 +649,13 @@ def _replay_worker(serial: str, filepath: str, filename: str,
                 _running_macros[key]["error"] = str(e)
 
         # ── Update DB on failure ──
-        if db_run_id:
-            try:
-                from backend.storage.database import database
-                _run_db_async(
-                    database.update_macro_run(
-                        run_id=db_run_id, status="failed",
-                        error=str(e),
-                        finished_at=datetime.now().isoformat(),
-                    )
-                )
-            except Exception:
-                pass
+        if db_run_id is not None:
+            db_writer.submit(
+                "update_macro_run",
+                run_id=db_run_id, status="failed",
+                error=str(e),
+                finished_at=datetime.now().isoformat(),
+            )
 
         if ws_callback:
             ws_callback("macro_failed", {
@@ -346,6 +664,12 @@ def _replay_worker(serial: str, filepath: str, filename: str,
                 "error": str(e),
             })
 
+    finally:
+        with _lock:
+            if _macro_tokens.get(key) is cancel:
+                del _macro_tokens[key]
+                _release_devices(key)
+
 
 def start_replay(index: int, filepath: str, filename: str,
                   ws_callback=None) -> dict:
@@ -353,24 +677,19 @@ def start_replay(index: int, filepath: str, filename: str,
     serial = _get_adb_serial(index)
     key = f"{serial}:{filename}"
 
+    entry = macro_cache.get(filepath)
+
     with _lock:
-        existing = _running_macros.get(key) 
-        if existing and existing.get("status") == "running":
+        if key in _macro_tokens:
             return {"success": False, "error": "Macro already running"}
-
-    record = parse_record(filepath)
-
-    # Count touch events
-    touch_count = 0
-    for op in record["operations"]:
-        if op.get("operationId") == "PutMultiTouch":
-            pts = op.get("points", [])
-            if len(pts) == 1 and pts[0].get("state") == 1:
-                touch_count += 1
+        if _claim_devices([serial], key):
+            return {"success": False, "error": f"Another macro is running on {serial}"}
+        cancel = CancelToken()
+        _macro_tokens[key] = cancel
 
     thread = threading.Thread(
         target=_replay_worker,
-        args=(serial, filepath, filename, index, ws_callback),
+        args=(serial, filepath, filename, index, ws_callback, cancel),
         daemon=True,
     )
     thread.start()
@@ -378,9 +697,9 @@ def start_replay(index: int, filepath: str, filename: str,
     return {
         "success": True,
         "serial": serial,
-        "total_ops": touch_count,
-        "duration_ms": record["duration_ms"],
-        "loop_times": record["loop_times"],
+        "total_ops": entry.touch_count,
+        "duration_ms": entry.duration_ms,
+        "loop_times": entry.record["loop_times"],
     }
 
 
@@ -390,8 +709,10 @@ def stop_replay(index: int, filename: str) -> dict:
     key = f"{serial}:{filename}"
 
     with _lock:
-        if key in _running_macros:
-            del _running_macros[key]
+        cancel = _macro_tokens.get(key)
+        if cancel is not None:
+            cancel.cancel()
+            _running_macros.pop(key, None)
             return {"success": True, "message": "Macro stopped"}
     return {"success": False, "error": "Macro not running"}
 
@@ -405,3 +726,286 @@ def get_status(index: int = None, filename: str = None) -> list:
             info = _running_macros.get(key)
             return [info] if info else []
         return list(_running_macros.values())
+
+
+# ──────────────────────────────────────────────
+# Group (broadcast) replay
+# ──────────────────────────────────────────────
+
+# Track group replays: key = group_id, value = status dict
+_running_groups = {}
+_group_tokens: dict[str, CancelToken] = {}
+FINISHED_GROUPS_KEPT = 20   # Finished groups still listed by get_group_status()
+
+
+def _finish_group(group_id: str, **fields):
+    """Mark a group finished and forget the oldest finished ones (caller holds _lock)."""
+    info = _running_groups.get(group_id)
+    if info is None:
+        return
+    info.update(fields, finished_at=time.time())
+    finished = [g for g, i in _running_groups.items() if "finished_at" in i]
+    for old in sorted(finished, key=lambda g: _running_groups[g]["finished_at"])[
+            :-FINISHED_GROUPS_KEPT]:
+        del _running_groups[old]
+
+
+def _group_worker(group_id: str, targets: list[dict], filepath: str,
+                  filename: str, ws_callback=None, cancel: CancelToken = None):
+    """Replay one macro on many emulators from shared deadlines.
+
+    Each target gets the plan for its resolution and touch backend. The
+    worker walks the union of all plans' offsets; at each deadline every
+    target's due commands are written to its persistent adb shell, and
+    the device's ack measures how far behind the deadline it ran them.
+    A target whose shell dies is dropped, the others continue.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.core import adb_shell
+
+    start_time = time.time()
+    cancel = cancel or CancelToken()
+    entry = macro_cache.get(filepath)
+    record = entry.record
+    loop_times = record["loop_times"]
+    active: list[dict] = []
+
+    def emit(event: str, data: dict):
+        if ws_callback:
+            ws_callback(event, data)
+
+    try:
+        # Probe devices in parallel; compile once per distinct (resolution, device)
+        def probe(target: dict):
+            serial = target["serial"]
+            return _get_target_resolution(serial), _touch_device(serial)
+
+        with ThreadPoolExecutor(max_workers=min(len(targets), 16)) as pool:
+            probes = list(pool.map(probe, targets))
+        for target, ((w, h), device) in zip(targets, probes):
+            target["plan"] = entry.plan(w, h, device)
+            target["lags"] = []
+            target["completed"] = 0
+            try:
+                target["shell"] = adb_shell.get_shell(target["serial"])
+            except OSError as e:
+                target["error"] = f"adb shell failed: {e}"
+                emit("macro_failed", {"serial": target["serial"],
+                                      "filename": filename, "error": target["error"]})
+                continue
+            target["db_run_id"] = db_writer.submit(
+                "start_macro_run",
+                filename=filename, serial=target["serial"], emu_index=target["index"],
+                resolution=f"{record['record_width']}x{record['record_height']}",
+                duration_ms=entry.duration_ms, file_path=filepath,
+                ops_total=entry.touch_count, status="running",
+            )
+            active.append(target)
+            emit("macro_started", {
+                "serial": target["serial"], "filename": filename,
+                "total_ops": entry.touch_count, "duration_ms": entry.duration_ms,
+                "group_id": group_id,
+            })
+
+        distinct = {id(t["plan"]) for t in active}
+        print(f"[MacroReplay] Group {group_id}: {len(active)} targets, "
+              f"{len(distinct)} plan(s)")
+
+        # Shared schedule: every distinct offset of any target's plan
+        offsets = sorted({at for t in active for at in t["plan"].at_ms})
+        period_ms = max((t["plan"].period_ms for t in active), default=0)
+
+        def dispatch(target: dict, at: int, deadline: float) -> bool:
+            """Send the target's commands due at `at`; False if its shell died."""
+            plan, lags, serial = target["plan"], target["lags"], target["serial"]
+
+            def on_ack(t: float):
+                lags.append((t - deadline) * 1000)
+                adb_helper.mark_input(serial)
+
+            while target["next"] < len(plan) and plan.at_ms[target["next"]] <= at:
+                i = target["next"]
+                try:
+                    target["shell"].send(plan.commands[i], on_ack=on_ack)
+                except BrokenPipeError as e:
+                    target["error"] = f"adb shell closed: {e}"
+                    return False
+                target["next"] += 1
+                target["in_gesture"] = not plan.gesture_end[i]
+                if plan.gesture_end[i]:
+                    target["completed"] += 1
+                    target["loop_completed"] += 1
+            return True
+
+        loop_start = time.monotonic()
+        for loop in range(loop_times if active else 0):
+            if cancel.cancelled:
+                break
+            with _lock:
+                if group_id in _running_groups:
+                    _running_groups[group_id]["current_loop"] = loop + 1
+            for target in active:
+                target["next"] = 0
+                target["loop_completed"] = 0
+                target["reported"] = 0
+
+            for at in offsets:
+                deadline = loop_start + at / 1000.0
+                if cancel.wait(deadline - time.monotonic()):
+                    break
+
+                for target in list(active):
+                    if not dispatch(target, at, deadline):
+                        active.remove(target)
+                        emit("macro_failed", {"serial": target["serial"],
+                                              "filename": filename, "error": target["error"]})
+
+                done = max((t["loop_completed"] for t in active), default=0)
+                with _lock:
+                    if group_id in _running_groups:
+                        _running_groups[group_id]["completed_ops"] = done
+                # Only targets that finished a gesture; the EventBus throttles
+                for target in active:
+                    if target["loop_completed"] != target["reported"]:
+                        target["reported"] = target["loop_completed"]
+                        emit("macro_progress", {
+                            "serial": target["serial"], "filename": filename,
+                            "completed": target["loop_completed"],
+                            "total": target["plan"].gestures,
+                            "group_id": group_id,
+                        })
+            else:
+                loop_start = max(loop_start + period_ms / 1000.0,
+                                 time.monotonic())
+                continue
+            break
+
+        cancelled = cancel.cancelled
+        for target in active:
+            if target.get("in_gesture") and target["plan"].release:
+                try:
+                    target["shell"].send(target["plan"].release)  # Finger still down
+                except BrokenPipeError:
+                    pass
+            target["shell"].drain(timeout=2 if cancelled else 10)
+
+        # ── Report per-target lag, persist and notify ──
+        elapsed_ms = int((time.time() - start_time) * 1000)
+        results = []
+        for target in targets:
+            ok = "error" not in target
+            stats = lateness_stats(target.get("lags", []))
+            status = "cancelled" if ok and cancelled else ("completed" if ok else "failed")
+            results.append({"index": target["index"], "serial": target["serial"],
+                            "status": status, "lag": stats,
+                            "error": target.get("error", "")})
+            if target.get("db_run_id") is not None:
+                db_writer.submit(
+                    "update_macro_run",
+                    run_id=target["db_run_id"], status=status,
+                    ops_completed=target["completed"], error=target.get("error", ""),
+                    finished_at=datetime.now().isoformat(),
+                )
+            if ok and not cancelled:
+                emit("macro_completed", {"serial": target["serial"], "filename": filename,
+                                         "elapsed_ms": elapsed_ms, "lateness": stats,
+                                         "group_id": group_id})
+            print(f"[MacroReplay] {target['serial']} lag: mean {stats['mean_ms']}ms, "
+                  f"p95 {stats['p95_ms']}ms, max {stats['max_ms']}ms")
+
+        with _lock:
+            _finish_group(group_id, status="completed", elapsed_ms=elapsed_ms,
+                          targets=results)
+        emit("macro_group_completed", {"group_id": group_id, "filename": filename,
+                                       "elapsed_ms": elapsed_ms, "cancelled": cancelled,
+                                       "targets": results})
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        with _lock:
+            _finish_group(group_id, status="error", error=str(e))
+        for target in targets:
+            if target.get("db_run_id") is not None:
+                db_writer.submit(
+                    "update_macro_run",
+                    run_id=target["db_run_id"], status="failed", error=str(e),
+                    finished_at=datetime.now().isoformat(),
+                )
+        emit("macro_group_completed", {"group_id": group_id, "filename": filename,
+                                       "error": str(e), "targets": []})
+
+    finally:
+        with _lock:
+            _group_tokens.pop(group_id, None)
+            _release_devices(group_id)
+
+
+def start_group_replay(indices: list[int], filepath: str, filename: str,
+                       ws_callback=None) -> dict:
+    """Replay one macro on many emulators in lockstep (one background thread).
+
+    Returns a group_id — the single handle for status and cancellation.
+    """
+    import uuid
+
+    indices = list(dict.fromkeys(indices))
+    if not indices:
+        return {"success": False, "error": "No target emulators"}
+    entry = macro_cache.get(filepath)
+
+    group_id = uuid.uuid4().hex[:8]
+    targets = [{"index": i, "serial": _get_adb_serial(i)} for i in indices]
+    cancel = CancelToken()
+    with _lock:
+        busy = _claim_devices([t["serial"] for t in targets], group_id)
+        if busy:
+            return {"success": False, "error": f"Another macro is running on {busy}"}
+        _group_tokens[group_id] = cancel
+        _running_groups[group_id] = {
+            "group_id": group_id,
+            "status": "running",
+            "filename": filename,
+            "serials": [t["serial"] for t in targets],
+            "start_time": time.time(),
+            "total_ops": entry.touch_count,
+            "completed_ops": 0,
+            "current_loop": 1,
+            "total_loops": entry.record["loop_times"],
+            "duration_ms": entry.duration_ms,
+        }
+
+    threading.Thread(
+        target=_group_worker,
+        args=(group_id, targets, filepath, filename, ws_callback, cancel),
+        name=f"macro-group-{group_id}", daemon=True,
+    ).start()
+
+    return {
+        "success": True,
+        "group_id": group_id,
+        "serials": [t["serial"] for t in targets],
+        "total_ops": entry.touch_count,
+        "duration_ms": entry.duration_ms,
+        "loop_times": entry.record["loop_times"],
+    }
+
+
+def stop_group_replay(group_id: str) -> dict:
+    """Stop a group replay on all of its targets."""
+    with _lock:
+        cancel = _group_tokens.get(group_id)
+        if cancel is not None:
+            cancel.cancel()
+            _running_groups.pop(group_id, None)
+            return {"success": True, "message": "Group stopped"}
+    return {"success": False, "error": "Group not running"}
+
+
+def get_group_status(group_id: str = None) -> list:
+    """Get status of group replays."""
+    with _lock:
+        if group_id:
+            info = _running_groups.get(group_id)
+            return [dict(info)] if info else []
+        return [dict(g) for g in _running_groups.values()]
@@ -4,29 +4,43 @@ Extracted from cod_app_sync.py, driven by coordinate map data.
 """
 import json
 import os
-import time
 from backend.core import adb_helper
+from backend.core.cancel import CancelToken, check, sleep
 from backend.config import config
 
 
 class GameNavigator:
     """Encapsulates tap/swipe sequences to reach each game screen."""
 
+    BACK_DELAY = 1.5  # Seconds per BACK press (matches adb_helper.press_back_n)
+
     def __init__(self):
         self._nav_data = {}
+        self._transitions = {}
         self._load_navigation()
 
     def _load_navigation(self):
-        """Load navigation sequences from coordinate map."""
+        """Load navigation sequences from coordinate map.
+
+        Optional "transitions" section: direct screen-to-screen routes that
+        skip the lobby, e.g. {"hall": {"market": {"steps": [...], "exit_backs": 1}}}
+        where exit_backs is the number of BACKs to leave the source first.
+        """
         map_path = config.get_coordinate_map_path()
         if os.path.exists(map_path):
             with open(map_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
                 self._nav_data = data.get("navigation", {})
+                self._transitions = data.get("transitions", {})
 
-    def _execute_steps(self, serial: str, steps: list):
-        """Execute a navigation sequence on a device."""
+    def _execute_steps(self, serial: str, steps: list, cancel: CancelToken = None):
+        """Execute a navigation sequence on a device.
+
+        Waits between steps are interruptible: a cancelled `cancel` token
+        raises Cancelled before the next input is sent.
+        """
         for step in steps:
+            check(cancel)
             action = step.get("action")
             wait = step.get("wait", 1.0)
 
@@ -35,17 +49,18 @@ class GameNavigator:
             elif action == "swipe":
                 repeat = step.get("repeat", 1)
                 for _ in range(repeat):
+                    check(cancel)
                     adb_helper.swipe(
                         serial,
                         step["x1"], step["y1"],
                         step["x2"], step["y2"],
                         step.get("duration", 300),
                     )
-                    time.sleep(wait)
+                    sleep(wait, cancel)
                 continue  # Skip the final sleep since swipe has its own
-            time.sleep(wait)
+            sleep(wait, cancel)
 
-    def navigate_to(self, serial: str, screen: str) -> bool:
+    def navigate_to(self, serial: str, screen: str, cancel: CancelToken = None) -> bool:
         """Navigate to a specific game screen.
 
         Args:
@@ -61,14 +76,80 @@ class GameNavigator:
             return False
 
         steps = nav.get("steps", [])
-        self._execute_steps(serial, steps)
+        self._execute_steps(serial, steps, cancel)
         return True
 
-    def go_back(self, serial: str, screen: str):
+    def go_back(self, serial: str, screen: str, cancel: CancelToken = None):
         """Exit from a screen using configured back count."""
         nav = self._nav_data.get(screen, {})
         backs = nav.get("exit_backs", 1)
-        adb_helper.press_back_n(serial, count=backs)
+        adb_helper.press_back_n(serial, count=backs, cancel=cancel)
+
+    # ──────────────────────────────────────────────
+    # Route planning (multi-screen sessions)
+    # ──────────────────────────────────────────────
+
+    def _steps_cost(self, steps: list) -> float:
+        """Estimated seconds spent executing a step sequence."""
+        total = 0.0
+        for step in steps:
+            total += step.get("wait", 1.0) * step.get("repeat", 1)
+        return total
+
+    def move_cost(self, from_screen: str | None, to_screen: str | None) -> float:
+        """Estimated seconds to get from one screen to another (None = lobby)."""
+        if from_screen == to_screen:
+            return 0.0
+        direct = self._transitions.get(from_screen or "", {}).get(to_screen or "")
+        if direct:
+            return (direct.get("exit_backs", 0) * self.BACK_DELAY
+                    + self._steps_cost(direct.get("steps", [])))
+        cost = 0.0
+        if from_screen:
+            cost += self._nav_data.get(from_screen, {}).get("exit_backs", 1) * self.BACK_DELAY
+        if to_screen:
+            cost += self._steps_cost(self._nav_data.get(to_screen, {}).get("steps", []))
+        return cost
+
+    def plan_route(self, screens: list[str]) -> list[str]:
+        """Order screens to minimize navigation time, starting and ending in the lobby.
+
+        Greedy nearest-neighbour over move_cost(); ties keep coordinate map order.
+        Without direct transitions every hop goes through the lobby, so the
+        saving comes from visiting each distinct screen only once.
+        """
+        order = list(self._nav_data.keys())
+        remaining = sorted(
+            set(screens),
+            key=lambda s: order.index(s) if s in order else len(order),
+        )
+        route = []
+        current = None
+        while remaining:
+            nxt = min(remaining, key=lambda s: self.move_cost(current, s))
+            route.append(nxt)
+            remaining.remove(nxt)
+            current = nxt
+        return route
+
+    def move(self, serial: str, from_screen: str | None, to_screen: str | None,
+             cancel: CancelToken = None) -> bool:
+        """Navigate between screens (None = lobby), using a direct transition if known."""
+        if from_screen == to_screen:
+            return True
+        direct = self._transitions.get(from_screen or "", {}).get(to_screen or "")
+        if direct:
+            backs = direct.get("exit_backs", 0)
+            if backs:
+                adb_helper.press_back_n(serial, count=backs, delay=self.BACK_DELAY,
+                                        cancel=cancel)
+            self._execute_steps(serial, direct.get("steps", []), cancel)
+            return True
+        if from_screen:
+            self.go_back(serial, from_screen, cancel)
+        if to_screen:
+            return self.navigate_to(serial, to_screen, cancel)
+        return True
 
     # Convenience methods
     def go_to_profile(self, serial: str):
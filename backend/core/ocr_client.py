@@ -2,17 +2,17 @@
 OCR API Client — ocrapi.cloud integration with key rotation.
 
 Pipeline: upload PDF -> poll job status -> download markdown result -> parse.
+The API base URL is config.ocr_api_url (the farm simulator serves a stub).
 """
 import os
 import re
-import time
 import itertools
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from backend.config import config
+from backend.core.cancel import CancelToken, Cancelled, check, sleep
 
-BASE_URL = "https://ocrapi.cloud/api/v1"
 POLL_INTERVAL = 3
 MAX_POLL_ATTEMPTS = 60
 
@@ -21,7 +21,7 @@ MAX_POLL_ATTEMPTS = 60
 
 def load_api_keys() -> list[str]:
     """Load API keys from config file (one per line, # = comment)."""
-    keys_file = getattr(config, "api_keys_file", "api_keys.txt")
+    keys_file = config.api_keys_file
     if not os.path.isabs(keys_file):
         keys_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), keys_file)
 
@@ -79,9 +79,9 @@ def build_session() -> requests.Session:
 # ── Core API Operations ──
 
 def submit_job(session: requests.Session, gateway: KeyGateway,
-               file_path: str) -> str | None:
+               file_path: str, cancel: CancelToken = None) -> str | None:
     """Upload file and create OCR job. Returns job_id."""
-    url = f"{BASE_URL}/jobs"
+    url = f"{config.ocr_api_url}/jobs"
     data = {
         "file_format": "pdf",
         "language": "en",
@@ -90,12 +90,13 @@ def submit_job(session: requests.Session, gateway: KeyGateway,
     }
 
     for _ in range(10):
+        check(cancel)
         with open(file_path, "rb") as fobj:
             resp = session.post(url, headers=gateway.auth_headers(),
                                 files={"file_upload": fobj}, data=data, timeout=60)
         if resp.status_code == 429:
             gateway.rotate()
-            time.sleep(1)
+            sleep(1, cancel)
             continue
         if resp.status_code not in (200, 201, 202):
             print(f"  [OCR] API Error {resp.status_code}: {resp.text}")
@@ -109,22 +110,26 @@ def submit_job(session: requests.Session, gateway: KeyGateway,
 
 
 def poll_job(session: requests.Session, gateway: KeyGateway,
-             job_id: str) -> dict | None:
-    """Poll until job completes. Returns job dict or None."""
-    url = f"{BASE_URL}/jobs/{job_id}"
+             job_id: str, cancel: CancelToken = None) -> dict | None:
+    """Poll until job completes. Returns job dict or None.
+
+    Raises Cancelled as soon as `cancel` is cancelled (between polls).
+    """
+    url = f"{config.ocr_api_url}/jobs/{job_id}"
 
     for attempt in range(1, MAX_POLL_ATTEMPTS + 1):
+        check(cancel)
         try:
             resp = session.get(url, headers=gateway.auth_headers(), timeout=30)
             if resp.status_code == 429:
                 gateway.rotate()
-                time.sleep(1)
+                sleep(1, cancel)
                 continue
             resp.raise_for_status()
             job = resp.json()
         except requests.RequestException as e:
             print(f"  [OCR] Poll error: {e}")
-            time.sleep(POLL_INTERVAL)
+            sleep(POLL_INTERVAL, cancel)
             continue
 
         status = job.get("status", "")
@@ -135,7 +140,7 @@ def poll_job(session: requests.Session, gateway: KeyGateway,
         if status in ("failed", "cancelled"):
             print(f"  [OCR] Job {status}: {job.get('error', 'unknown')}")
             return None
-        time.sleep(POLL_INTERVAL)
+        sleep(POLL_INTERVAL, cancel)
 
     print("  [OCR] Timeout waiting for job completion")
     return None
@@ -261,10 +266,11 @@ def parse_scan_markdown(md_text: str) -> dict:
 
 # ── High-level OCR Function ──
 
-def run_ocr(pdf_path: str) -> dict:
+def run_ocr(pdf_path: str, cancel: CancelToken = None) -> dict:
     """Run full OCR pipeline on a PDF file.
 
     Returns: {"success": bool, "text": str, "parsed": dict, "error": str}
+    Raises Cancelled if `cancel` is cancelled while submitting or polling.
     """
     keys = load_api_keys()
     if not keys:
@@ -276,13 +282,13 @@ def run_ocr(pdf_path: str) -> dict:
     try:
         # Submit
         print(f"[OCR] Submitting: {pdf_path}")
-        job_id = submit_job(session, gateway, pdf_path)
+        job_id = submit_job(session, gateway, pdf_path, cancel)
         if not job_id:
             return {"success": False, "error": "Failed to submit OCR job", "text": "", "parsed": {}}
 
         # Poll
         print(f"[OCR] Polling job {job_id}...")
-        completed = poll_job(session, gateway, job_id)
+        completed = poll_job(session, gateway, job_id, cancel)
         if not completed:
             return {"success": False, "error": "OCR job failed or timed out", "text": "", "parsed": {}}
 
@@ -292,6 +298,8 @@ def run_ocr(pdf_path: str) -> dict:
 
         return {"success": True, "text": text, "parsed": parsed, "error": ""}
 
+    except Cancelled:
+        raise
     except Exception as e:
         return {"success": False, "error": str(e), "text": "", "parsed": {}}
     finally:
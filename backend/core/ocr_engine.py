@@ -16,6 +16,7 @@ class OCREngine:
     def __init__(self):
         pytesseract.pytesseract.tesseract_cmd = config.tesseract_path
         self._regions = {}
+        self._scaled: dict[tuple, dict] = {}    # (w, h) -> regions in that resolution
         self._load_coordinate_map()
 
     def _load_coordinate_map(self):
@@ -32,36 +33,69 @@ class OCREngine:
     def regions(self) -> dict:
         return self._regions
 
-    def load_image(self, image_path: str) -> np.ndarray | None:
-        """Load and normalize image to configured resolution."""
-        if not os.path.exists(image_path):
-            return None
-        img = cv2.imread(image_path)
-        if img is None:
+    @property
+    def reference_size(self) -> tuple[int, int]:
+        """Resolution the coordinate map was made for (config.resolution)."""
+        w, h = config.resolution.split("x")
+        return int(w), int(h)
+
+    def regions_for(self, width: int, height: int) -> dict:
+        """Regions scaled to a screen resolution (computed once per resolution)."""
+        key = (width, height)
+        scaled = self._scaled.get(key)
+        if scaled is None:
+            ref_w, ref_h = self.reference_size
+            if key == (ref_w, ref_h):
+                scaled = self._regions
+            else:
+                fx, fy = width / ref_w, height / ref_h
+                scaled = {
+                    name: [round(x1 * fx), round(y1 * fy), round(x2 * fx), round(y2 * fy)]
+                    for name, (x1, y1, x2, y2) in self._regions.items()
+                }
+            self._scaled[key] = scaled
+        return scaled
+
+    def load_image(self, source: str | np.ndarray) -> np.ndarray | None:
+        """Load a screenshot for the scan methods.
+
+        `source` is a file path or an already decoded BGR array (e.g.
+        Emulator.capture_frame()), kept in its native resolution: regions
+        are scaled to the frame instead of resizing the whole frame, see
+        extract_roi().
+        """
+        if isinstance(source, np.ndarray):
+            img = source
+        else:
+            if not os.path.exists(source):
+                return None
+            img = cv2.imread(source)
+        if img is None or img.size == 0:
             return None
-
-        # Parse target resolution
-        res = config.resolution.split("x")
-        target_w, target_h = int(res[0]), int(res[1])
-
-        h, w = img.shape[:2]
-        if h != target_h or w != target_w:
-            img = cv2.resize(img, (target_w, target_h))
-
-        # Sharpen
-        kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
-        img = cv2.filter2D(img, -1, kernel)
         return img
 
     def extract_roi(self, img: np.ndarray, region_name: str) -> np.ndarray | None:
-        """Extract a region of interest (ROI) by name."""
+        """Extract a sharpened region of interest (ROI) by name.
+
+        Coordinates are scaled to the image's resolution, and the ROI is
+        resized back to its coordinate-map size so the OCR preprocessing
+        sees the same pixel sizes on every emulator.
+        """
         if region_name not in self._regions:
             return None
-        x1, y1, x2, y2 = self._regions[region_name]
+        h, w = img.shape[:2]
+        x1, y1, x2, y2 = self.regions_for(w, h)[region_name]
         roi = img[y1:y2, x1:x2]
         if roi.size == 0:
             return None
-        return roi
+
+        rx1, ry1, rx2, ry2 = self._regions[region_name]
+        if roi.shape[1] != rx2 - rx1 or roi.shape[0] != ry2 - ry1:
+            roi = cv2.resize(roi, (rx2 - rx1, ry2 - ry1))
+
+        # Sharpen (filter2D writes a new array, the frame is untouched)
+        kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+        return cv2.filter2D(roi, -1, kernel)
 
     def preprocess(self, roi: np.ndarray, scale: float = 2.0, invert: bool = True) -> np.ndarray:
         """Standard preprocessing: scale up, grayscale, threshold, border."""
@@ -6,10 +6,12 @@ crops relevant regions, and combines them into a single PDF.
 """
 import subprocess
 import os
-import time
 import cv2
 from PIL import Image
 from backend.config import config
+from backend.core.adb_helper import mark_input
+from backend.core.cancel import CancelToken, check, sleep
+from backend.metrics import stage_timer
 
 
 # Crop regions for each scan phase (x1, y1, x2, y2)
@@ -86,35 +88,40 @@ def _adb(serial: str, args: list):
 
 def _tap(serial: str, x: int, y: int):
     _adb(serial, ["shell", "input", "tap", str(x), str(y)])
+    mark_input(serial)
 
 
 def _swipe(serial: str, x1, y1, x2, y2, duration=300):
     _adb(serial, ["shell", "input", "swipe", str(x1), str(y1), str(x2), str(y2), str(duration)])
+    mark_input(serial)
 
 
 def _back(serial: str):
     _adb(serial, ["shell", "input", "keyevent", "4"])
+    mark_input(serial)
 
 
-def _navigate(serial: str, phase: str):
+def _navigate(serial: str, phase: str, cancel: CancelToken = None):
     """Execute the navigation sequence for a scan phase."""
     steps = NAVIGATION.get(phase, [])
     for step in steps:
+        check(cancel)
         action = step[0]
         if action == "tap":
             _tap(serial, step[1], step[2])
-            time.sleep(step[3])
+            sleep(step[3], cancel)
         elif action == "swipe":
             _swipe(serial, step[1], step[2], step[3], step[4], step[5])
-            time.sleep(step[6] if len(step) > 6 else 1.0)
+            sleep(step[6] if len(step) > 6 else 1.0, cancel)
 
 
-def _exit_phase(serial: str, phase: str):
+def _exit_phase(serial: str, phase: str, cancel: CancelToken = None):
     """Press BACK to exit current phase."""
     backs = EXIT_BACKS.get(phase, 1)
     for _ in range(backs):
+        check(cancel)
         _back(serial)
-        time.sleep(1.5)
+        sleep(1.5, cancel)
 
 
 def capture_screenshot(serial: str, save_path: str) -> bool:
@@ -191,13 +198,14 @@ def combine_to_pdf(image_paths: list[str], output_path: str) -> bool:
 
 
 def run_full_capture(serial: str, work_dir: str,
-                      progress_callback=None) -> str | None:
+                      progress_callback=None, cancel: CancelToken = None) -> str | None:
     """Run all 5 capture phases and combine into PDF.
 
     Args:
         serial: ADB device serial (e.g., "emulator-5556")
         work_dir: Directory to save screenshots and PDF
         progress_callback: optional fn(phase, step, total_steps)
+        cancel: optional CancelToken; raises Cancelled mid-phase once cancelled
 
     Returns: path to combined PDF, or None on failure
     """
@@ -218,13 +226,17 @@ def run_full_capture(serial: str, work_dir: str,
         print(f"[Capture] Phase {step}/{total}: {phase} on {serial}")
 
         # Navigate
-        _navigate(serial, phase)
+        check(cancel)
+        with stage_timer("full_scan.navigation"):
+            _navigate(serial, phase, cancel)
 
         # Screenshot
         screenshot_path = os.path.join(device_dir, f"{phase}_full.png")
-        if not capture_screenshot(serial, screenshot_path):
+        with stage_timer("full_scan.capture"):
+            captured = capture_screenshot(serial, screenshot_path)
+        if not captured:
             print(f"[Capture] Failed to capture {phase}")
-            _exit_phase(serial, phase)
+            _exit_phase(serial, phase, cancel)
             continue
 
         # Crop
@@ -232,8 +244,9 @@ def run_full_capture(serial: str, work_dir: str,
         all_crops.extend(crops)
 
         # Exit
-        _exit_phase(serial, phase)
-        time.sleep(2.0)
+        with stage_timer("full_scan.navigation"):
+            _exit_phase(serial, phase, cancel)
+            sleep(2.0, cancel)
 
     if not all_crops:
         print(f"[Capture] No images captured for {serial}")
@@ -251,7 +264,9 @@ def run_full_capture(serial: str, work_dir: str,
     ordered_crops = [p for p in expected_order if os.path.exists(p)]
 
     pdf_path = os.path.join(device_dir, "COMBINED_OCR.pdf")
-    if combine_to_pdf(ordered_crops, pdf_path):
+    with stage_timer("full_scan.pdf"):
+        combined = combine_to_pdf(ordered_crops, pdf_path)
+    if combined:
         return pdf_path
 
     return None
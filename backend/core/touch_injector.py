@@ -0,0 +1,167 @@
+"""
+Touch Injector — Low-level touch events via `sendevent`.
+
+`input tap/swipe` starts the Java input tool on the device for every
+gesture (hundreds of ms) and only knows single-finger gestures. Writing
+kernel input events with `sendevent` over a persistent shell replays
+.record touch frames 1:1, including multi-touch.
+
+The touchscreen is probed once per device with `getevent -pl`:
+    - its /dev/input/eventN path
+    - ABS_MT_POSITION_X / _Y ranges (screen pixels are scaled to these)
+    - whether it supports MT protocol B (ABS_MT_SLOT); otherwise the
+      older protocol A (SYN_MT_REPORT per contact) is used.
+"""
+import re
+import threading
+
+from backend.core import adb_helper
+
+
+# Linux input event types / codes
+EV_SYN, EV_KEY, EV_ABS = 0, 1, 3
+SYN_REPORT, SYN_MT_REPORT = 0, 2
+BTN_TOUCH = 0x14a
+ABS_MT_SLOT = 0x2f
+ABS_MT_POSITION_X = 0x35
+ABS_MT_POSITION_Y = 0x36
+ABS_MT_TRACKING_ID = 0x39
+NO_TRACKING_ID = -1  # Lift a contact; sendevent parses it with atoi/strtol, so
+                     # "-1" is -1 everywhere ("4294967295" clamps on 32-bit long)
+
+
+class TouchDevice:
+    """A probed touchscreen input device."""
+
+    def __init__(self, path: str, max_x: int, max_y: int,
+                 slots: int = 0):
+        self.path = path
+        self.max_x = max_x
+        self.max_y = max_y
+        self.slots = slots          # >0: MT protocol B with this many slots
+
+    @property
+    def key(self) -> tuple:
+        """Identity used to cache compiled frames."""
+        return (self.path, self.max_x, self.max_y, self.slots)
+
+    def scale(self, x: int, y: int, screen_w: int, screen_h: int) -> tuple[int, int]:
+        """Screen pixel -> device axis units."""
+        return (x * (self.max_x + 1) // screen_w,
+                y * (self.max_y + 1) // screen_h)
+
+    def _ev(self, ev_type: int, code: int, value: int) -> str:
+        return f"sendevent {self.path} {ev_type} {code} {value}"
+
+    def encode_frame(self, contacts: dict, changes: list, was_touching: bool,
+                     screen_w: int, screen_h: int) -> str:
+        """Encode one touch frame as a shell command line.
+
+        contacts:     {slot: (tracking_id, x, y)} after this frame (screen px)
+        changes:      [(kind, slot)] with kind in "down", "move", "up"
+        was_touching: any contact was down before this frame
+        """
+        events = []
+
+        if self.slots:
+            for kind, slot in changes:
+                events.append(self._ev(EV_ABS, ABS_MT_SLOT, slot))
+                if kind == "up":
+                    # Tracking id -1 releases the slot
+                    events.append(self._ev(EV_ABS, ABS_MT_TRACKING_ID, NO_TRACKING_ID))
+                    continue
+                tracking_id, x, y = contacts[slot]
+                dx, dy = self.scale(x, y, screen_w, screen_h)
+                if kind == "down":
+                    events.append(self._ev(EV_ABS, ABS_MT_TRACKING_ID, tracking_id))
+                events.append(self._ev(EV_ABS, ABS_MT_POSITION_X, dx))
+                events.append(self._ev(EV_ABS, ABS_MT_POSITION_Y, dy))
+        else:
+            # Protocol A: report every active contact each frame
+            for slot in sorted(contacts):
+                tracking_id, x, y = contacts[slot]
+                dx, dy = self.scale(x, y, screen_w, screen_h)
+                events.append(self._ev(EV_ABS, ABS_MT_TRACKING_ID, tracking_id))
+                events.append(self._ev(EV_ABS, ABS_MT_POSITION_X, dx))
+                events.append(self._ev(EV_ABS, ABS_MT_POSITION_Y, dy))
+                events.append(self._ev(EV_SYN, SYN_MT_REPORT, 0))
+            if not contacts:
+                events.append(self._ev(EV_SYN, SYN_MT_REPORT, 0))
+
+        if contacts and not was_touching:
+            events.append(self._ev(EV_KEY, BTN_TOUCH, 1))
+        elif was_touching and not contacts:
+            events.append(self._ev(EV_KEY, BTN_TOUCH, 0))
+        events.append(self._ev(EV_SYN, SYN_REPORT, 0))
+        return ";".join(events)
+
+    def encode_release(self) -> str:
+        """Lift every contact (used when a replay stops mid-gesture)."""
+        events = []
+        if self.slots:
+            for slot in range(self.slots):
+                events.append(self._ev(EV_ABS, ABS_MT_SLOT, slot))
+                # Tracking id -1 releases the slot
+                events.append(self._ev(EV_ABS, ABS_MT_TRACKING_ID, NO_TRACKING_ID))
+        else:
+            events.append(self._ev(EV_SYN, SYN_MT_REPORT, 0))
+        events.append(self._ev(EV_KEY, BTN_TOUCH, 0))
+        events.append(self._ev(EV_SYN, SYN_REPORT, 0))
+        return ";".join(events)
+
+
+# ──────────────────────────────────────────────
+# Probing
+# ──────────────────────────────────────────────
+
+_ABS_MAX = r"{}\s*:.*?max (\d+)"
+
+
+def parse_getevent(output: str) -> TouchDevice | None:
+    """Find the multi-touch screen in `getevent -pl` output."""
+    blocks = re.split(r"^add device \d+:\s*", output, flags=re.MULTILINE)
+    for block in blocks[1:]:
+        path = block.split()[0] if block.split() else ""
+        mx = re.search(_ABS_MAX.format("ABS_MT_POSITION_X"), block)
+        my = re.search(_ABS_MAX.format("ABS_MT_POSITION_Y"), block)
+        if not (path and mx and my):
+            continue
+        slot = re.search(_ABS_MAX.format("ABS_MT_SLOT"), block)
+        return TouchDevice(
+            path=path,
+            max_x=int(mx.group(1)),
+            max_y=int(my.group(1)),
+            slots=int(slot.group(1)) + 1 if slot else 0,
+        )
+    return None
+
+
+_devices: dict[str, TouchDevice | None] = {}
+_devices_lock = threading.Lock()
+
+
+def probe(serial: str) -> TouchDevice | None:
+    """Touchscreen of a device (probed once, None if not usable)."""
+    with _devices_lock:
+        if serial in _devices:
+            return _devices[serial]
+    output = adb_helper._run_adb(["shell", "getevent", "-pl"], serial=serial, timeout=5)
+    device = parse_getevent(output) if output else None
+    if device:
+        print(f"[Touch] {serial}: {device.path} "
+              f"{device.max_x + 1}x{device.max_y + 1} "
+              f"{'protocol B, %d slots' % device.slots if device.slots else 'protocol A'}")
+    else:
+        print(f"[Touch] {serial}: no multi-touch device, using `input`")
+    with _devices_lock:
+        _devices[serial] = device
+    return device
+
+
+def forget(serial: str = None):
+    """Drop cached probe results (e.g. after an emulator restart)."""
+    with _devices_lock:
+        if serial is None:
+            _devices.clear()
+        else:
+            _devices.pop(serial, None)
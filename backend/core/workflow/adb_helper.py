@@ -5,6 +5,7 @@ Copied from TEST/WORKFLOW/adb_helper.py with import paths adapted for app contex
 import subprocess
 import time
 from backend.config import config
+from backend.core.adb_helper import hidden_startupinfo, mark_input
 
 
 def _run_adb(cmd_list: list[str], serial: str = None) -> str:
@@ -15,8 +16,7 @@ def _run_adb(cmd_list: list[str], serial: str = None) -> str:
             base += ["-s", serial]
         base += cmd_list
 
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo = hidden_startupinfo()
 
         result = subprocess.run(
             base,
@@ -56,6 +56,7 @@ def ping_device(serial: str) -> bool:
 def tap(serial: str, x: int, y: int):
     """Send tap event to device."""
     _run_adb(["shell", "input", "tap", str(x), str(y)], serial=serial)
+    mark_input(serial)
 
 
 def swipe(serial: str, x1: int, y1: int, x2: int, y2: int, duration: int = 300):
@@ -64,11 +65,13 @@ def swipe(serial: str, x1: int, y1: int, x2: int, y2: int, duration: int = 300):
         ["shell", "input", "swipe", str(x1), str(y1), str(x2), str(y2), str(duration)],
         serial=serial,
     )
+    mark_input(serial)
 
 
 def press_back(serial: str):
     """Send BACK key event."""
     _run_adb(["shell", "input", "keyevent", "4"], serial=serial)
+    mark_input(serial)
 
 
 def press_back_n(serial: str, count: int = 1, delay: float = 1.5):
@@ -88,8 +91,7 @@ def screencap(serial: str, local_path: str) -> bool:
         # and avoid writing an intermediate file to /sdcard/
         cmd = [config.adb_path, "-s", serial, "exec-out", "screencap", "-p"]
         
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo = hidden_startupinfo()
         
         result = subprocess.run(
             cmd,
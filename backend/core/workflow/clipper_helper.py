@@ -4,12 +4,12 @@ Copied from TEST/WORKFLOW/clipper_helper.py (unchanged logic).
 """
 import subprocess
 import os
+from backend.core.adb_helper import hidden_startupinfo
 
 def get_clipper_data(adb_path: str, serial: str) -> str:
     """Fetch clipboard data safely using ADB Clipper broadcast logic."""
     cmd = [adb_path, "-s", serial, "shell", "am", "broadcast", "-a", "clipper.get"]
-    startupinfo = subprocess.STARTUPINFO()
-    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    startupinfo = hidden_startupinfo()
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, startupinfo=startupinfo, timeout=5)
         for line in result.stdout.strip().split('\n'):
@@ -25,8 +25,7 @@ def get_clipper_data(adb_path: str, serial: str) -> str:
 def is_app_foreground(adb_path: str, serial: str, package_name: str) -> bool:
     """Check if the target app is currently running in the foreground."""
     cmd = [adb_path, "-s", serial, "shell", "dumpsys", "window", "windows"]
-    startupinfo = subprocess.STARTUPINFO()
-    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    startupinfo = hidden_startupinfo()
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, startupinfo=startupinfo, timeout=5)
         for line in result.stdout.split('\n'):
@@ -41,6 +40,5 @@ def open_app(adb_path: str, serial: str, package_name: str):
     """Launch the application using monkeys intent."""
     print(f"[INFO] Launching app {package_name} on {serial}...")
     cmd = [adb_path, "-s", serial, "shell", "monkey", "-p", package_name, "-c", "android.intent.category.LAUNCHER", "1"]
-    startupinfo = subprocess.STARTUPINFO()
-    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    startupinfo = hidden_startupinfo()
     subprocess.run(cmd, startupinfo=startupinfo, capture_output=True)
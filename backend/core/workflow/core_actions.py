@@ -5,6 +5,7 @@ Copied from TEST/WORKFLOW/core_actions.py with import paths adapted for app cont
 import time
 
 from backend.config import config
+from backend.core.cancel import CancelToken, check, sleep
 from backend.core.workflow import adb_helper
 from backend.core.workflow import clipper_helper
 from backend.core.workflow.state_detector import GameStateDetector
@@ -19,12 +20,17 @@ def ensure_app_running(serial: str, package_name: str, adb_path: str = None) ->
         return False
     return True
 
-def wait_for_state(serial: str, detector: GameStateDetector, target_states: list, timeout_sec: int = 60) -> str:
-    """Blocks and loops until the emulator reaches one of the target_states."""
+def wait_for_state(serial: str, detector: GameStateDetector, target_states: list, timeout_sec: int = 60,
+                   cancel: CancelToken = None) -> str:
+    """Blocks and loops until the emulator reaches one of the target_states.
+
+    Raises Cancelled as soon as `cancel` is cancelled.
+    """
     start_time = time.time()
     print(f"[{serial}] Waiting for one of states: {target_states} (Timeout: {timeout_sec}s)")
     
     while True:
+        check(cancel)
         if time.time() - start_time > timeout_sec:
             print(f"[{serial}] [TIMEOUT] Failed to reach target state within {timeout_sec}s.")
             return None
@@ -38,22 +44,24 @@ def wait_for_state(serial: str, detector: GameStateDetector, target_states: list
             
         if current_state == "LOADING SCREEN":
             print(f"[{serial}] -> Game is loading. Waiting 3 seconds...")
-            time.sleep(3)
+            sleep(3, cancel)
         else:
-            time.sleep(2)
+            sleep(2, cancel)
 
-def go_to_profile(serial: str, detector: GameStateDetector) -> bool:
+def go_to_profile(serial: str, detector: GameStateDetector, cancel: CancelToken = None) -> bool:
     """
     Assumes we are at the main lobby (`IN_CITY` or `OUT_CITY`).
     Navigates to the Profile menu. Returning True on success.
     """
     print(f"[{serial}] Navigating to Profile...")
+    check(cancel)
     adb_helper.tap(serial, 25, 25)
     
-    state = wait_for_state(serial, detector, ["IN-GAME LOBBY (PROFILE MENU)"], timeout_sec=10)
+    state = wait_for_state(serial, detector, ["IN-GAME LOBBY (PROFILE MENU)"], timeout_sec=10, cancel=cancel)
     return state is not None
 
-def extract_player_id(serial: str, detector: GameStateDetector, adb_path: str = None) -> str:
+def extract_player_id(serial: str, detector: GameStateDetector, adb_path: str = None,
+                      cancel: CancelToken = None) -> str:
     """
     Assumes we are on the Profile Menu.
     Taps the copy button, intercepts the ADB Clipper intent, and returns the ID.
@@ -65,9 +73,10 @@ def extract_player_id(serial: str, detector: GameStateDetector, adb_path: str =
     
     max_retries = 3
     for attempt in range(max_retries):
+        check(cancel)
         adb_helper.tap(serial, 425, 200)
         print(f"  -> Waiting 2 seconds for clipboard sync (Attempt {attempt+1}/{max_retries})...")
-        time.sleep(2)
+        sleep(2, cancel)
         
         current_clip = clipper_helper.get_clipper_data(adb_path, serial)
         
@@ -83,13 +92,15 @@ def extract_player_id(serial: str, detector: GameStateDetector, adb_path: str =
     
     return None
 
-def back_to_lobby(serial: str, detector: GameStateDetector) -> bool:
+def back_to_lobby(serial: str, detector: GameStateDetector, cancel: CancelToken = None) -> bool:
     """
     Assumes we are on any Menu.
     Taps the back button, intercepts the ADB Clipper intent, and returns the ID.
     """
     print(f"[{serial}] Back to Lobby...")
+    check(cancel)
     adb_helper.press_back(serial)
     
-    state = wait_for_state(serial, detector, ["IN-GAME LOBBY (IN_CITY)", "IN-GAME LOBBY (OUT_CITY)"], timeout_sec=10)
+    state = wait_for_state(serial, detector, ["IN-GAME LOBBY (IN_CITY)", "IN-GAME LOBBY (OUT_CITY)"], timeout_sec=10,
+                           cancel=cancel)
     return state is not None
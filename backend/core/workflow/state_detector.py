@@ -7,6 +7,7 @@ import cv2
 import numpy as np
 import subprocess
 import time
+from backend.core.adb_helper import hidden_startupinfo
 
 class GameStateDetector:
     """
@@ -48,8 +49,7 @@ class GameStateDetector:
     def screencap_memory(self, serial: str) -> np.ndarray:
         """Captures screen directly to RAM, no disk IO. Faster and cleaner for Multi-Emulator."""
         cmd = [self.adb_path, "-s", serial, "exec-out", "screencap", "-p"]
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo = hidden_startupinfo()
         
         try:
             result = subprocess.run(cmd, capture_output=True, startupinfo=startupinfo, timeout=5)
@@ -0,0 +1,61 @@
+"""
+HTTP Cache — ETag / 304 responses backed by data-version counters.
+
+cached_json() serializes a payload once per data version and reuses the
+bytes until a write (or emulator state change) bumps the version. Clients
+that send the matching If-None-Match get an empty 304 instead.
+"""
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+from backend.storage.data_version import data_version
+
+CACHE_SIZE = 64     # Distinct (path, query) payloads kept in memory
+
+_BOOT = "%x" % int(time.time())    # Counters restart with the process
+_cache: OrderedDict = OrderedDict()     # key -> (version, body, extra headers)
+_lock = threading.Lock()
+
+
+def _etag(key: str, version: tuple) -> str:
+    return '"%s-%x-%s"' % (_BOOT, zlib.crc32(key.encode()), "-".join(map(str, version)))
+
+
+async def cached_json(request: Request, domains: tuple, build,
+                      extra_headers=None) -> Response:
+    """JSON response for `await build()`, cached per data version.
+
+    domains:       data_version domains the payload depends on, e.g. ("db",)
+    extra_headers: optional fn(payload) -> dict, cached with the body
+    """
+    key = str(request.url.path) + "?" + str(request.url.query)
+    version = data_version.get(*domains)   # read before building: never too new
+    etag = _etag(key, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    with _lock:
+        hit = _cache.get(key)
+        if hit and hit[0] == version:
+            _cache.move_to_end(key)
+            return Response(hit[1], media_type="application/json",
+                            headers={**headers, **hit[2]})
+
+    payload = await build()
+    body = json.dumps(payload, default=str, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+    extra = extra_headers(payload) if extra_headers else {}
+    headers.update(extra)
+    with _lock:
+        _cache[key] = (version, body, extra)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,97 @@
+"""
+Metrics — Per-stage latency samples for the scan and task pipelines.
+
+Pipelines time their stages with `with stage_timer("full_scan.ocr"):` (or
+stage_metrics.record() when a block is too long to wrap). Each stage keeps
+its last SAMPLE_LIMIT durations; snapshot() summarizes them in ms.
+
+Stages:
+    full_scan.id, .navigation, .capture, .pdf, .ocr, .db, .total
+    task.navigation, .capture, .ocr
+    db.<operation>      write-behind intent, enqueue -> commit
+    db.commit           one DBWriter batch transaction
+
+Served by GET /api/metrics/stages; the benchmark (sim/bench.py) reads
+them in-process.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+SAMPLE_LIMIT = 10_000       # Durations kept per stage (oldest dropped first)
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    """count / mean / p50 / p90 / p95 / p99 / max of durations in ms."""
+    if not samples_ms:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p90_ms": 0.0,
+                "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples_ms)
+    n = len(ordered)
+
+    def pct(q: float) -> float:
+        return round(ordered[min(n - 1, int(n * q))], 1)
+
+    return {
+        "count": n,
+        "mean_ms": round(sum(ordered) / n, 1),
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1], 1),
+    }
+
+
+class StageMetrics:
+    """Thread-safe rolling duration samples per stage."""
+
+    def __init__(self):
+        self._samples: dict[str, deque] = {}
+        self._errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=SAMPLE_LIMIT)
+            samples.append(seconds * 1000)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time the block; exceptions are counted as errors, not samples."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+            raise
+        self.record(stage, time.perf_counter() - start)
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """{stage: summary} (plus "errors" where a stage raised)."""
+        with self._lock:
+            samples = {stage: list(s) for stage, s in self._samples.items()}
+            errors = dict(self._errors)
+            if reset:
+                self._samples.clear()
+                self._errors.clear()
+        result = {}
+        for stage in sorted(set(samples) | set(errors)):
+            result[stage] = summarize(samples.get(stage, []))
+            if errors.get(stage):
+                result[stage]["errors"] = errors[stage]
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._errors.clear()
+
+
+# Global singleton
+stage_metrics = StageMetrics()
+stage_timer = stage_metrics.timer
@@ -31,6 +31,7 @@ class TaskStatus(str, Enum):
     SUCCESS = "SUCCESS"
     FAILED = "FAILED"
     TIMEOUT = "TIMEOUT"
+    CANCELLED = "CANCELLED"
 
 
 # ──────────────────────────────────────────────
@@ -104,6 +105,7 @@ class TaskQueueItem(BaseModel):
     task_id: str
     task_type: TaskType
     serial: str
+    priority: int = 0
     status: TaskStatus = TaskStatus.QUEUED
     progress_step: str = ""
     created_at: datetime = Field(default_factory=datetime.now)
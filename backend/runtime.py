@@ -0,0 +1,82 @@
+"""
+Runtime Bridge — Thread-to-event-loop handoff for worker threads.
+
+The uvicorn loop is captured once at startup (`set_loop`). Worker threads
+(task queue, macro replay, full scan) then hand coroutines and callbacks
+to it with `submit()` / `call_soon()` instead of creating a new loop per
+call or silently dropping work.
+
+Outside the server (scripts, tools) no loop is registered; the first
+`submit()` then starts a private background loop so callers behave the
+same either way.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_fallback_loop: asyncio.AbstractEventLoop | None = None
+_lock = threading.Lock()
+
+
+def set_loop(loop: asyncio.AbstractEventLoop):
+    """Register the application's main event loop (call from startup)."""
+    global _loop
+    _loop = loop
+
+
+def get_loop() -> asyncio.AbstractEventLoop | None:
+    """Return the registered main loop, or None if not running."""
+    if _loop is not None and not _loop.is_closed():
+        return _loop
+    return None
+
+
+def _target_loop() -> asyncio.AbstractEventLoop:
+    """Main loop if registered, otherwise a lazily started private loop."""
+    global _fallback_loop
+    loop = get_loop()
+    if loop is not None:
+        return loop
+    with _lock:
+        if _fallback_loop is None or _fallback_loop.is_closed():
+            _fallback_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_fallback_loop.run_forever,
+                name="runtime-loop", daemon=True,
+            ).start()
+        return _fallback_loop
+
+
+def in_loop_thread() -> bool:
+    """True if the caller is running on the registered main loop."""
+    try:
+        return asyncio.get_running_loop() is get_loop()
+    except RuntimeError:
+        return False
+
+
+def submit(coro: Coroutine) -> Future:
+    """Schedule a coroutine on the main loop from any thread.
+
+    Returns a concurrent.futures.Future; call `.result(timeout)` to wait.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _target_loop())
+
+
+def run(coro: Coroutine, timeout: float = 10) -> Any:
+    """Run a coroutine on the main loop and block for its result.
+
+    Must not be called from the loop thread itself (it would deadlock).
+    """
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("runtime.run() called from the event loop thread")
+    return submit(coro).result(timeout=timeout)
+
+
+def call_soon(fn: Callable, *args):
+    """Schedule a plain callback on the main loop from any thread."""
+    _target_loop().call_soon_threadsafe(fn, *args)
@@ -0,0 +1,205 @@
+"""
+State Sync — Versioned device/instance state pushed over /ws.
+
+Clients receive a `state_snapshot` on connect (or when they send "resync"),
+then `state_delta` messages carrying only the fields that changed. Every
+delta bumps `seq`; a client that sees a gap asks for a fresh snapshot, so
+the UI no longer has to poll /api/devices or /api/emulators/all.
+
+State is recomputed (debounced) when a task/scan/device event goes out,
+plus a slow periodic tick that catches anything not announced by an event.
+The DB is only re-read when an event means new scan data was saved.
+"""
+import asyncio
+import json
+
+from backend.config import config
+
+
+def device_view(device: dict, row: dict | None) -> dict:
+    """Device dict + latest scan row, in the shape device-card.js expects."""
+    view = dict(device)
+    if row:
+        data = dict(row)
+        # Map flat resource columns to a nested 'resources' dict as expected by UI
+        data["resources"] = {
+            "gold": data.get("gold", 0),
+            "wood": data.get("wood", 0),
+            "ore": data.get("ore", 0),
+            "mana": data.get("mana", 0),
+        }
+        view["data"] = data
+        view["task_type"] = "full_scan"
+    return view
+
+
+# Events that change device state (recompute soon)
+STATE_EVENTS = {
+    "device_online", "device_offline",
+    "task_started", "task_progress", "task_completed", "task_failed", "task_cancelled",
+    "scan_progress", "scan_completed", "scan_failed", "scan_cancelled",
+    "launch_ready", "launch_failed", "launch_cancelled", "launch_completed",
+}
+# Events after which the latest scan rows must be re-read
+DATA_EVENTS = {"task_completed", "scan_completed"}
+# Events that end a device's in-flight progress
+END_EVENTS = {
+    "task_completed", "task_failed", "task_cancelled",
+    "scan_completed", "scan_failed", "scan_cancelled",
+}
+
+# Events after which the LDPlayer instance list is likely stale
+INSTANCE_EVENTS = {"device_online", "device_offline", "launch_ready", "launch_completed"}
+
+DEBOUNCE = 0.2              # seconds; bursts of events collapse into one delta
+INSTANCE_MAX_AGE = 30.0     # list2 refresh period when no event invalidates it
+
+
+class StateSync:
+    """Keeps the last published state and turns changes into deltas."""
+
+    def __init__(self):
+        self.seq = 0
+        self._devices: dict[str, dict] = {}     # serial -> published view
+        self._instances: dict[str, dict] = {}   # str(index) -> published entry
+        self._rows: dict[str, dict] | None = None   # serial -> latest scan row
+        self._progress: dict[str, dict] = {}    # serial -> {step, detail}
+        self._reload = False
+        self._pending: asyncio.TimerHandle | None = None
+        self._lock = asyncio.Lock()
+        self._ticker: asyncio.Task | None = None
+
+    # ── Event hook (called on the loop by ws_manager.broadcast) ──
+
+    def on_event(self, event: str, data: dict):
+        if event not in STATE_EVENTS:
+            return
+        serial = (data or {}).get("serial")
+        if serial:
+            if event in END_EVENTS:
+                self._progress.pop(serial, None)
+            elif event in ("task_progress", "scan_progress"):
+                self._progress[serial] = {
+                    "step": data.get("step", ""),
+                    "detail": data.get("detail", ""),
+                }
+        if event in DATA_EVENTS:
+            self._reload = True
+        if event in INSTANCE_EVENTS:
+            from backend.core.ldplayer_manager import instance_registry
+            instance_registry.invalidate()  # picked up by the next tick
+        self._schedule()
+
+    def _schedule(self):
+        if self._pending is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._pending = loop.call_later(
+            DEBOUNCE, lambda: loop.create_task(self._flush()))
+
+    async def _flush(self):
+        self._pending = None
+        try:
+            await self.update()
+        except Exception as e:
+            print(f"[StateSync] Update failed: {e}")
+
+    # ── State ──
+
+    async def _collect(self, reload: bool) -> tuple[dict, dict]:
+        from backend.core.emulator import emulator_manager
+        from backend.core.ldplayer_manager import instance_registry
+        from backend.storage.database import database
+
+        if reload or self._rows is None:
+            rows = await database.get_all_emulator_data()
+            self._rows = {row["serial"]: row for row in rows}
+
+        devices = {}
+        for emu in emulator_manager.get_all():
+            view = device_view(emu.to_dict(), self._rows.get(emu.serial))
+            view["progress"] = self._progress.get(emu.serial)
+            devices[emu.serial] = json.loads(json.dumps(view, default=str))
+
+        instances = {}
+        if instance_registry.loaded:
+            for entry in instance_registry.get(max_age=INSTANCE_MAX_AGE):
+                instances[str(entry["index"])] = json.loads(json.dumps(entry, default=str))
+        return devices, instances
+
+    @staticmethod
+    def _diff(old: dict, new: dict) -> tuple[dict, list]:
+        changed, removed = {}, [key for key in old if key not in new]
+        for key, item in new.items():
+            before = old.get(key)
+            if before is None:
+                changed[key] = item
+                continue
+            fields = {f: v for f, v in item.items() if before.get(f) != v}
+            fields.update({f: None for f in before if f not in item})
+            if fields:
+                changed[key] = fields
+        return changed, removed
+
+    async def update(self, reload: bool = False):
+        """Recompute state and broadcast one delta if anything changed."""
+        from backend.websocket import ws_manager
+
+        async with self._lock:
+            reload = reload or self._reload
+            self._reload = False
+            devices, instances = await self._collect(reload)
+            dev_changed, dev_removed = self._diff(self._devices, devices)
+            inst_changed, inst_removed = self._diff(self._instances, instances)
+            self._devices, self._instances = devices, instances
+            if not (dev_changed or dev_removed or inst_changed or inst_removed):
+                return
+            self.seq += 1
+            delta = {"seq": self.seq}
+            if dev_changed:
+                delta["devices"] = dev_changed
+            if dev_removed:
+                delta["removed"] = dev_removed
+            if inst_changed:
+                delta["instances"] = inst_changed
+            if inst_removed:
+                delta["instances_removed"] = inst_removed
+        await ws_manager.broadcast("state_delta", delta)
+
+    async def snapshot(self) -> dict:
+        """Full current state tagged with the current seq."""
+        if self._rows is None:
+            await self.update()
+        return {
+            "seq": self.seq,
+            "devices": list(self._devices.values()),
+            "instances": list(self._instances.values()),
+        }
+
+    async def send_snapshot(self, ws):
+        """Queue the full state for one connection (ahead of later deltas)."""
+        from backend.websocket import ws_manager
+        ws_manager.send_to(ws, "state_snapshot", await self.snapshot())
+
+    # ── Periodic consistency tick ──
+
+    def start(self):
+        if self._ticker is None:
+            self._ticker = asyncio.get_running_loop().create_task(self._tick())
+
+    def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(max(1.0, config.state_sync_interval))
+            try:
+                await self.update()
+            except Exception as e:
+                print(f"[StateSync] Tick failed: {e}")
+
+
+# Global singleton
+state_sync = StateSync()
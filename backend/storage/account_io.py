@@ -0,0 +1,156 @@
+"""
+Account I/O — CSV / JSONL parsing and encoding for bulk account import/export.
+
+Both formats use the same columns as POST /api/accounts:
+    game_id (required), emu_index, lord_name, power, login_method,
+    email, provider, alliance, note
+Unknown columns / keys are ignored, so an export can be edited and
+imported back as-is.
+
+Parsing never raises on bad input: each bad row becomes an error entry
+{"line", "game_id", "error"} and the remaining rows are still imported.
+"""
+import csv
+import io
+import json
+
+FIELDS = ["game_id", "emu_index", "lord_name", "power", "login_method",
+          "email", "provider", "alliance", "note"]
+FORMATS = ("csv", "jsonl")
+MAX_ERRORS = 1000       # Row errors reported per import (the rest are counted)
+
+_TEXT_FIELDS = ("lord_name", "login_method", "email", "alliance", "note")
+
+
+def detect_format(fmt: str | None, content_type: str = "") -> str:
+    """Pick the import format from ?format= or the Content-Type header."""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return fmt
+    if "json" in content_type:
+        return "jsonl"
+    return "csv"
+
+
+def normalize(raw: dict) -> dict:
+    """Validate one input row; raises ValueError with a readable message."""
+    game_id = str(raw.get("game_id") or "").strip()
+    if not game_id:
+        raise ValueError("game_id is required")
+
+    emu_index = raw.get("emu_index")
+    if emu_index in (None, ""):
+        emu_index = None
+    else:
+        try:
+            emu_index = int(str(emu_index).strip())
+        except ValueError:
+            raise ValueError(f"emu_index must be an integer, got {emu_index!r}")
+        if emu_index < 0:
+            raise ValueError("emu_index must be >= 0")
+
+    power = raw.get("power")
+    try:
+        power = float(power) if power not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        raise ValueError(f"power must be a number, got {power!r}")
+
+    row = {"game_id": game_id, "emu_index": emu_index, "power": power,
+           "provider": str(raw.get("provider") or "").strip() or "Global"}
+    for field in _TEXT_FIELDS:
+        value = raw.get(field)
+        row[field] = "" if value is None else str(value).strip()
+    return row
+
+
+class ImportErrors(list):
+    """Row errors, capped at MAX_ERRORS entries (`total` counts all of them)."""
+
+    total = 0
+
+    def add(self, line: int, error: str, game_id: str = ""):
+        self.total += 1
+        if len(self) < MAX_ERRORS:
+            self.append({"line": line, "game_id": game_id, "error": error})
+
+
+def _csv_rows(text_io):
+    reader = csv.DictReader(text_io)
+    if not reader.fieldnames or "game_id" not in [f.strip() for f in reader.fieldnames]:
+        raise ValueError("CSV header must include a game_id column")
+    for raw in reader:
+        raw = {(k or "").strip(): v for k, v in raw.items()}
+        yield reader.line_num, raw
+
+
+def _jsonl_rows(text_io):
+    for line_no, line in enumerate(text_io, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            raw = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ValueError(f"invalid JSON: {e.msg}")
+            continue
+        if not isinstance(raw, dict):
+            yield line_no, ValueError("each line must be a JSON object")
+            continue
+        yield line_no, raw
+
+
+def parse(binary_io, fmt: str) -> tuple[list[dict], ImportErrors]:
+    """Read rows from a binary file object (read line by line).
+
+    Returns (valid rows, row errors). Each row carries its input line in
+    "line". A game_id repeated within the file is reported as an error
+    and only its first occurrence is imported.
+    """
+    text_io = io.TextIOWrapper(binary_io, encoding="utf-8-sig", newline="")
+    rows, errors, seen = [], ImportErrors(), {}
+    source = _csv_rows(text_io) if fmt == "csv" else _jsonl_rows(text_io)
+    try:
+        for line_no, raw in source:
+            if isinstance(raw, Exception):
+                errors.add(line_no, str(raw))
+                continue
+            try:
+                row = normalize(raw)
+            except ValueError as e:
+                errors.add(line_no, str(e), str(raw.get("game_id") or ""))
+                continue
+            first = seen.setdefault(row["game_id"], line_no)
+            if first != line_no:
+                errors.add(line_no, f"duplicate game_id (first on line {first})", row["game_id"])
+                continue
+            row["line"] = line_no
+            rows.append(row)
+    except (csv.Error, UnicodeDecodeError) as e:
+        errors.add(-1, f"unreadable input: {e}")
+    finally:
+        text_io.detach()
+    return rows, errors
+
+
+# ──────────────────────────────────────────────
+# Export encoding
+# ──────────────────────────────────────────────
+
+async def encode(rows, fmt: str):
+    """Async-iterate export lines (str) for rows from an async iterator."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=FIELDS, extrasaction="ignore",
+                                lineterminator="\n")
+        writer.writeheader()
+        yield buf.getvalue()
+        async for row in rows:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow(row)
+            yield buf.getvalue()
+    else:
+        async for row in rows:
+            yield json.dumps({f: row.get(f) for f in FIELDS}, ensure_ascii=False) + "\n"
@@ -0,0 +1,35 @@
+"""
+Data Version — Change counters for cacheable API payloads.
+
+Each domain has a monotonically increasing counter:
+    - "db":      bumped after every committed write (Database + DBWriter)
+    - "devices": bumped when an Emulator field shown by to_dict() changes
+
+Readers combine the counters a payload depends on into a version; an
+unchanged version means the previously serialized payload is still valid
+(see backend/http_cache.py).
+"""
+import threading
+
+
+class DataVersion:
+    """Thread-safe per-domain change counters."""
+
+    def __init__(self):
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, domain: str = "db") -> int:
+        with self._lock:
+            value = self._counters.get(domain, 0) + 1
+            self._counters[domain] = value
+            return value
+
+    def get(self, *domains: str) -> tuple:
+        """Current counters for the given domains (a hashable version)."""
+        with self._lock:
+            return tuple(self._counters.get(d, 0) for d in domains)
+
+
+# Global singleton
+data_version = DataVersion()
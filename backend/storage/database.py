@@ -9,6 +9,7 @@ import json
 import os
 from datetime import datetime
 from backend.config import config
+from backend.storage.data_version import data_version
 
 
 # ──────────────────────────────────────────────
@@ -128,6 +129,54 @@ CREATE TABLE IF NOT EXISTS pending_accounts (
     FOREIGN KEY (snapshot_id) REFERENCES scan_snapshots(id)
 );
 
+-- Archived raw OCR text (moved out of scan_snapshots by retention)
+CREATE TABLE IF NOT EXISTS scan_ocr_text (
+    snapshot_id     INTEGER PRIMARY KEY,
+    codec           TEXT NOT NULL,                  -- zlib | zstd
+    data            BLOB NOT NULL,
+    FOREIGN KEY (snapshot_id) REFERENCES scan_snapshots(id)
+);
+
+-- Per-account trend rollups, maintained on every completed snapshot.
+-- bucket: 'YYYY-MM-DD HH:00' (hourly) / 'YYYY-MM-DD' (daily), UTC like created_at.
+-- Value columns come from the newest snapshot (last_snapshot_id) in the bucket
+-- that had one; NULL = never read (OCR misses are stored as NULL, not 0).
+CREATE TABLE IF NOT EXISTS account_rollup_hourly (
+    game_id          TEXT NOT NULL,
+    bucket           TEXT NOT NULL,
+    samples          INTEGER DEFAULT 0,
+    power_min        INTEGER,
+    power_max        INTEGER,
+    power_last       INTEGER,
+    hall_level       INTEGER DEFAULT 0,
+    market_level     INTEGER DEFAULT 0,
+    pet_token        INTEGER DEFAULT 0,
+    gold             INTEGER DEFAULT 0,
+    wood             INTEGER DEFAULT 0,
+    ore              INTEGER DEFAULT 0,
+    mana             INTEGER DEFAULT 0,
+    last_snapshot_id INTEGER DEFAULT 0,
+    PRIMARY KEY (game_id, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS account_rollup_daily (
+    game_id          TEXT NOT NULL,
+    bucket           TEXT NOT NULL,
+    samples          INTEGER DEFAULT 0,
+    power_min        INTEGER,
+    power_max        INTEGER,
+    power_last       INTEGER,
+    hall_level       INTEGER DEFAULT 0,
+    market_level     INTEGER DEFAULT 0,
+    pet_token        INTEGER DEFAULT 0,
+    gold             INTEGER DEFAULT 0,
+    wood             INTEGER DEFAULT 0,
+    ore              INTEGER DEFAULT 0,
+    mana             INTEGER DEFAULT 0,
+    last_snapshot_id INTEGER DEFAULT 0,
+    PRIMARY KEY (game_id, bucket)
+) WITHOUT ROWID;
+
 -- Indexes
 CREATE INDEX IF NOT EXISTS idx_snap_emu_time ON scan_snapshots(emulator_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_res_snap ON scan_resources(snapshot_id);
@@ -137,6 +186,233 @@ CREATE INDEX IF NOT EXISTS idx_accounts_emu ON accounts(emulator_id);
 """
 
 
+# ──────────────────────────────────────────────
+# Shared write statements (async methods + write-behind queue)
+# ──────────────────────────────────────────────
+
+UPSERT_EMULATOR_SQL = """INSERT INTO emulators (emu_index, serial, name, resolution, status, last_seen_at)
+   VALUES (?, ?, ?, ?, ?, ?)
+   ON CONFLICT(emu_index) DO UPDATE SET
+     serial = excluded.serial,
+     name = CASE WHEN excluded.name != '' THEN excluded.name ELSE emulators.name END,
+     resolution = excluded.resolution,
+     status = excluded.status,
+     last_seen_at = excluded.last_seen_at"""
+
+INSERT_SNAPSHOT_SQL = """INSERT INTO scan_snapshots
+   (emulator_id, scan_type, lord_name, power, hall_level,
+    market_level, pet_token, scan_status, duration_ms, raw_ocr_text, game_id)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+INSERT_RESOURCE_SQL = """INSERT INTO scan_resources
+   (snapshot_id, resource_type, bag_value, total_value,
+    bag_raw, total_raw)
+   VALUES (?, ?, ?, ?, ?, ?)"""
+
+UPSERT_MACRO_SQL = """INSERT INTO macros (filename, display_name, resolution, duration_ms, file_path)
+   VALUES (?, ?, ?, ?, ?)
+   ON CONFLICT(filename) DO UPDATE SET
+     display_name = CASE WHEN excluded.display_name != '' THEN excluded.display_name ELSE macros.display_name END,
+     resolution = CASE WHEN excluded.resolution != '' THEN excluded.resolution ELSE macros.resolution END,
+     duration_ms = CASE WHEN excluded.duration_ms > 0 THEN excluded.duration_ms ELSE macros.duration_ms END,
+     file_path = CASE WHEN excluded.file_path != '' THEN excluded.file_path ELSE macros.file_path END"""
+
+UPSERT_ACCOUNT_SQL = """INSERT INTO accounts
+   (game_id, emulator_id, lord_name, login_method, email, provider, alliance, note, is_active, updated_at)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+   ON CONFLICT(game_id) DO UPDATE SET
+       emulator_id = COALESCE(excluded.emulator_id, accounts.emulator_id),
+       lord_name = CASE WHEN excluded.lord_name != '' THEN excluded.lord_name ELSE accounts.lord_name END,
+       login_method = CASE WHEN excluded.login_method != '' THEN excluded.login_method ELSE accounts.login_method END,
+       email = CASE WHEN excluded.email != '' THEN excluded.email ELSE accounts.email END,
+       provider = excluded.provider,
+       alliance = CASE WHEN excluded.alliance != '' THEN excluded.alliance ELSE accounts.alliance END,
+       note = CASE WHEN excluded.note != '' THEN excluded.note ELSE accounts.note END,
+       is_active = excluded.is_active,
+       updated_at = excluded.updated_at"""
+
+INSERT_MACRO_RUN_SQL = """INSERT INTO macro_runs
+   (macro_id, emulator_id, status, ops_total)
+   VALUES (?, ?, ?, ?)"""
+
+INSERT_TASK_RUN_SQL = """INSERT INTO task_runs (emulator_id, task_type, status)
+   VALUES (?, ?, ?)"""
+
+
+# period -> (rollup table, strftime bucket format)
+ROLLUP_PERIODS = {
+    "hour": ("account_rollup_hourly", "%Y-%m-%d %H:00"),
+    "day": ("account_rollup_daily", "%Y-%m-%d"),
+}
+
+
+def _rollup_sql(table: str, fmt: str, where: str) -> str:
+    """Fold the snapshots matched by `where` into one rollup table.
+
+    Only completed snapshots with a game_id count. Zero / missing values
+    (OCR misses) never overwrite a known one; otherwise level, token and
+    resource columns keep the value of the newest snapshot in the bucket.
+    """
+    def res(rtype):
+        return (f"NULLIF((SELECT total_value FROM scan_resources "
+                f"WHERE snapshot_id = s.id AND resource_type = '{rtype}'), 0)")
+
+    def newest(col):
+        return (f"{col} = CASE WHEN excluded.last_snapshot_id >= last_snapshot_id "
+                f"THEN COALESCE(excluded.{col}, {col}) ELSE {col} END")
+
+    return f"""
+        INSERT INTO {table}
+            (game_id, bucket, samples, power_min, power_max, power_last,
+             hall_level, market_level, pet_token, gold, wood, ore, mana,
+             last_snapshot_id)
+        SELECT s.game_id, strftime('{fmt}', s.created_at), 1,
+               NULLIF(s.power, 0), NULLIF(s.power, 0), NULLIF(s.power, 0),
+               NULLIF(s.hall_level, 0), NULLIF(s.market_level, 0), NULLIF(s.pet_token, 0),
+               {res("gold")}, {res("wood")}, {res("ore")}, {res("mana")}, s.id
+        FROM scan_snapshots s
+        WHERE {where} AND s.game_id != '' AND s.scan_status = 'completed'
+        ORDER BY s.id
+        ON CONFLICT(game_id, bucket) DO UPDATE SET
+            samples = samples + 1,
+            power_min = MIN(COALESCE(power_min, excluded.power_min),
+                            COALESCE(excluded.power_min, power_min)),
+            power_max = MAX(COALESCE(power_max, excluded.power_max),
+                            COALESCE(excluded.power_max, power_max)),
+            {newest("power_last")}, {newest("hall_level")}, {newest("market_level")}, {newest("pet_token")},
+            {newest("gold")}, {newest("wood")}, {newest("ore")}, {newest("mana")},
+            last_snapshot_id = MAX(last_snapshot_id, excluded.last_snapshot_id)
+    """
+
+
+# Run after a snapshot + its resources are inserted (param: snapshot id)
+ROLLUP_SNAPSHOT_SQL = [_rollup_sql(table, fmt, "s.id = ?")
+                       for table, fmt in ROLLUP_PERIODS.values()]
+
+
+# Run after a batch of snapshots is inserted (param: highest id before it)
+ROLLUP_AFTER_SQL = [_rollup_sql(table, fmt, "s.id > ?")
+                    for table, fmt in ROLLUP_PERIODS.values()]
+
+
+def _backfill_rollups(conn: sqlite3.Connection):
+    """Build rollups from existing snapshots once (when the tables are new)."""
+    if conn.execute("SELECT 1 FROM account_rollup_daily LIMIT 1").fetchone():
+        return
+    if not conn.execute("SELECT 1 FROM scan_snapshots WHERE game_id != '' LIMIT 1").fetchone():
+        return
+    for table, fmt in ROLLUP_PERIODS.values():
+        conn.execute(_rollup_sql(table, fmt, "1"))
+    conn.commit()
+    count = conn.execute("SELECT COUNT(*) FROM account_rollup_daily").fetchone()[0]
+    print(f"[DB Migration] Backfilled account rollups ({count} daily buckets)")
+
+
+def snapshot_params(emu_id: int, parsed_data: dict, scan_type: str,
+                    scan_status: str, scan_duration_ms: int,
+                    raw_ocr_text: str, game_id: str) -> tuple:
+    """Build INSERT_SNAPSHOT_SQL parameters from parsed scan data."""
+    return (
+        emu_id,
+        scan_type,
+        parsed_data.get("lord_name", ""),
+        parsed_data.get("power", 0),
+        parsed_data.get("hall_level", 0),
+        parsed_data.get("market_level", 0),
+        parsed_data.get("pet_token", 0),
+        scan_status,
+        scan_duration_ms,
+        raw_ocr_text,
+        game_id,
+    )
+
+
+def resource_rows(snap_id: int, resources: dict) -> list[tuple]:
+    """Build INSERT_RESOURCE_SQL rows for a snapshot's resources.
+
+    Accepts both the OCR engine shape ({"bag", "total", ...} per type)
+    and the OCR API shape (a single int per type). Empty values are skipped.
+    """
+    rows = []
+    for res_type in ("gold", "wood", "ore", "mana"):
+        res_data = resources.get(res_type, {})
+        if isinstance(res_data, dict):
+            bag = res_data.get("bag", 0) or 0
+            total = res_data.get("total", 0) or 0
+            bag_raw = res_data.get("bag_raw", "")
+            total_raw = res_data.get("total_raw", "")
+        elif isinstance(res_data, (int, float)):
+            bag = int(res_data)
+            total = int(res_data)
+            bag_raw = ""
+            total_raw = ""
+        else:
+            continue
+
+        if bag > 0 or total > 0:
+            rows.append((snap_id, res_type, bag, total, bag_raw, total_raw))
+    return rows
+
+
+def update_clause(**fields) -> tuple[str, list]:
+    """Build a "col = ?, ..." SET clause from the non-None keyword fields."""
+    updates = []
+    params = []
+    for col, value in fields.items():
+        if value is not None:
+            updates.append(f"{col} = ?")
+            params.append(value)
+    return ", ".join(updates), params
+
+
+def history_where(table: str, alias: str, time_col: str,
+                  before_id: int = None, since: str = None, until: str = None,
+                  **equals) -> tuple[str, list]:
+    """WHERE clause for keyset-paginated history (newest first, by id).
+
+    before_id:    return rows with id < before_id (the previous page's last id)
+    since/until:  time range on `time_col`, turned into id bounds with one
+                  index probe each (ids and insert timestamps grow together),
+                  so the page query itself stays an id-ordered range scan
+    equals:       "column" -> value filters; None / "" are skipped
+    """
+    clauses, params = [], []
+    for col, value in equals.items():
+        if value is not None and value != "":
+            clauses.append(f"{col} = ?")
+            params.append(value)
+    if before_id:
+        clauses.append(f"{alias}.id < ?")
+        params.append(before_id)
+    if since:
+        clauses.append(f"{alias}.id >= COALESCE((SELECT id FROM {table} WHERE {time_col} >= ? "
+                       f"ORDER BY {time_col} LIMIT 1), 1 << 62)")
+        params.append(since.replace("T", " "))
+    if until:
+        clauses.append(f"{alias}.id <= COALESCE((SELECT id FROM {table} WHERE {time_col} <= ? "
+                       f"ORDER BY {time_col} DESC LIMIT 1), 0)")
+        params.append(until.replace("T", " "))
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+# Keyset pagination support: (filter, id) pairs + time lookups for ranges
+HISTORY_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_snap_emu_id ON scan_snapshots(emulator_id, id);
+CREATE INDEX IF NOT EXISTS idx_snap_status_id ON scan_snapshots(scan_status, id);
+CREATE INDEX IF NOT EXISTS idx_snap_type_id ON scan_snapshots(scan_type, id);
+CREATE INDEX IF NOT EXISTS idx_snap_game_id_id ON scan_snapshots(game_id, id);
+CREATE INDEX IF NOT EXISTS idx_snap_time ON scan_snapshots(created_at);
+CREATE INDEX IF NOT EXISTS idx_taskrun_emu_id ON task_runs(emulator_id, id);
+CREATE INDEX IF NOT EXISTS idx_taskrun_status_id ON task_runs(status, id);
+CREATE INDEX IF NOT EXISTS idx_taskrun_type_id ON task_runs(task_type, id);
+CREATE INDEX IF NOT EXISTS idx_taskrun_time ON task_runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_macrorun_emu_id ON macro_runs(emulator_id, id);
+CREATE INDEX IF NOT EXISTS idx_macrorun_status_id ON macro_runs(status, id);
+CREATE INDEX IF NOT EXISTS idx_macrorun_macro_id ON macro_runs(macro_id, id);
+CREATE INDEX IF NOT EXISTS idx_macrorun_time ON macro_runs(started_at);
+"""
+
+
 # ──────────────────────────────────────────────
 # Migration: v1 → v2
 # ──────────────────────────────────────────────
@@ -386,6 +662,11 @@ class Database:
         # Migrate accounts schema (add game_id etc.)
         _migrate_accounts_schema(conn)
 
+        # History indexes (after migrations: some use scan_snapshots.game_id)
+        conn.executescript(HISTORY_INDEXES_SQL)
+
+        _backfill_rollups(conn)
+
         conn.close()
         self._initialized = True
         print(f"[DB] Initialized at {self.db_path}")
@@ -393,6 +674,11 @@ class Database:
     def _get_conn(self):
         return aiosqlite.connect(self.db_path)
 
+    async def _commit(self, db):
+        """Commit and mark cached API payloads as stale."""
+        await db.commit()
+        data_version.bump("db")
+
     # ──────────────────────────────────────────
     # Emulators
     # ──────────────────────────────────────────
@@ -405,18 +691,11 @@ class Database:
         async with self._get_conn() as db:
             await db.execute("PRAGMA foreign_keys = ON")
             await db.execute(
-                """INSERT INTO emulators (emu_index, serial, name, resolution, status, last_seen_at)
-                   VALUES (?, ?, ?, ?, ?, ?)
-                   ON CONFLICT(emu_index) DO UPDATE SET
-                     serial = excluded.serial,
-                     name = CASE WHEN excluded.name != '' THEN excluded.name ELSE emulators.name END,
-                     resolution = excluded.resolution,
-                     status = excluded.status,
-                     last_seen_at = excluded.last_seen_at""",
+                UPSERT_EMULATOR_SQL,
                 (emu_index, serial, name, resolution, status,
                  datetime.now().isoformat()),
             )
-            await db.commit()
+            await self._commit(db)
 
             cursor = await db.execute(
                 "SELECT id FROM emulators WHERE emu_index = ?", (emu_index,)
@@ -457,7 +736,7 @@ class Database:
                 "UPDATE emulators SET status = ?, last_seen_at = ? WHERE emu_index = ?",
                 (status, datetime.now().isoformat(), emu_index),
             )
-            await db.commit()
+            await self._commit(db)
 
     # ──────────────────────────────────────────
     # Scan Snapshots
@@ -484,54 +763,23 @@ class Database:
 
             # Insert snapshot
             cursor = await db.execute(
-                """INSERT INTO scan_snapshots
-                   (emulator_id, scan_type, lord_name, power, hall_level,
-                    market_level, pet_token, scan_status, duration_ms, raw_ocr_text, game_id)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    emu_id,
-                    scan_type,
-                    parsed_data.get("lord_name", ""),
-                    parsed_data.get("power", 0),
-                    parsed_data.get("hall_level", 0),
-                    parsed_data.get("market_level", 0),
-                    parsed_data.get("pet_token", 0),
-                    scan_status,
-                    scan_duration_ms,
-                    raw_ocr_text,
-                    game_id,
-                ),
+                INSERT_SNAPSHOT_SQL,
+                snapshot_params(emu_id, parsed_data, scan_type, scan_status,
+                                scan_duration_ms, raw_ocr_text, game_id),
             )
 
             snap_id = cursor.lastrowid
 
             # Insert resources
-            resources = parsed_data.get("resources", {})
-            for res_type in ("gold", "wood", "ore", "mana"):
-                res_data = resources.get(res_type, {})
-                if isinstance(res_data, dict):
-                    bag = res_data.get("bag", 0) or 0
-                    total = res_data.get("total", 0) or 0
-                    bag_raw = res_data.get("bag_raw", "")
-                    total_raw = res_data.get("total_raw", "")
-                elif isinstance(res_data, (int, float)):
-                    bag = int(res_data)
-                    total = int(res_data)
-                    bag_raw = ""
-                    total_raw = ""
-                else:
-                    continue
+            await db.executemany(
+                INSERT_RESOURCE_SQL,
+                resource_rows(snap_id, parsed_data.get("resources", {})),
+            )
 
-                if bag > 0 or total > 0:
-                    await db.execute(
-                        """INSERT INTO scan_resources
-                           (snapshot_id, resource_type, bag_value, total_value,
-                            bag_raw, total_raw)
-                           VALUES (?, ?, ?, ?, ?, ?)""",
-                        (snap_id, res_type, bag, total, bag_raw, total_raw),
-                    )
+            for sql in ROLLUP_SNAPSHOT_SQL:
+                await db.execute(sql, (snap_id,))
 
-            await db.commit()
+            await self._commit(db)
             return snap_id
 
     async def get_emulator_data(self, serial: str = None,
@@ -671,7 +919,7 @@ class Database:
                 (emu_id, task_type, status,
                  json.dumps(data, default=str), duration_ms),
             )
-            await db.commit()
+            await self._commit(db)
 
     async def save_task_log(self, task_id, serial, task_type, status,
                              error=None, duration_ms=0):
@@ -687,61 +935,75 @@ class Database:
                    VALUES (?, ?, ?, ?, ?)""",
                 (emu_id, task_type, status, error or "", duration_ms),
             )
-            await db.commit()
-
-    async def get_scan_history(self, limit=50, serial=None) -> list[dict]:
-        """Get scan snapshot history (replaces old scan_results query)."""
+            await self._commit(db)
+
+    async def get_scan_history(self, limit=50, serial=None, before_id: int = None,
+                               status: str = None, scan_type: str = None,
+                               game_id: str = None, since: str = None,
+                               until: str = None) -> list[dict]:
+        """Get scan snapshot history, newest first (keyset-paginated on id)."""
+        where, params = history_where(
+            "scan_snapshots", "s", "created_at", before_id=before_id, since=since, until=until,
+            **{"e.serial": serial, "s.scan_status": status,
+               "s.scan_type": scan_type, "s.game_id": game_id},
+        )
         async with self._get_conn() as db:
             db.row_factory = aiosqlite.Row
-            if serial:
-                cursor = await db.execute(
-                    """SELECT s.*, e.serial, e.name as emulator_name
-                       FROM scan_snapshots s
-                       JOIN emulators e ON s.emulator_id = e.id
-                       WHERE e.serial = ?
-                       ORDER BY s.created_at DESC LIMIT ?""",
-                    (serial, limit),
-                )
-            else:
-                cursor = await db.execute(
-                    """SELECT s.*, e.serial, e.name as emulator_name
-                       FROM scan_snapshots s
-                       JOIN emulators e ON s.emulator_id = e.id
-                       ORDER BY s.created_at DESC LIMIT ?""",
-                    (limit,),
-                )
-            rows = await cursor.fetchall()
+            cursor = await db.execute(
+                f"""SELECT s.*, e.serial, e.name as emulator_name
+                    FROM scan_snapshots s
+                    JOIN emulators e ON s.emulator_id = e.id
+                    {where}
+                    ORDER BY s.id DESC LIMIT ?""",
+                (*params, limit),
+            )
+            rows = [dict(row) for row in await cursor.fetchall()]
 
-            results = []
-            for row in rows:
-                d = dict(row)
-                # Attach resources
-                snap_id = d["id"]
+            # Resources for the whole page in one query
+            res_by_snap = {}
+            if rows:
+                ids = [d["id"] for d in rows]
                 res_cursor = await db.execute(
-                    "SELECT * FROM scan_resources WHERE snapshot_id = ?",
-                    (snap_id,),
+                    f"SELECT * FROM scan_resources WHERE snapshot_id IN "
+                    f"({','.join('?' * len(ids))})",
+                    ids,
                 )
-                res_data = {}
                 for res in await res_cursor.fetchall():
                     res_dict = dict(res)
-                    rtype = res_dict["resource_type"]
-                    res_data[rtype] = {
+                    res_by_snap.setdefault(res_dict["snapshot_id"], {})[res_dict["resource_type"]] = {
                         "bag": res_dict.get("bag_value", 0),
                         "total": res_dict.get("total_value", 0),
                     }
 
+            for d in rows:
                 d["data"] = {
                     "lord_name": d.get("lord_name", ""),
                     "power": d.get("power", 0),
                     "hall_level": d.get("hall_level", 0),
                     "market_level": d.get("market_level", 0),
                     "pet_token": d.get("pet_token", 0),
-                    "resources": res_data,
+                    "resources": res_by_snap.get(d["id"], {}),
                 }
                 d["validation_errors"] = []
-                results.append(d)
 
-            return results
+            return rows
+
+    async def get_raw_ocr_text(self, snapshot_id: int) -> str | None:
+        """Raw OCR text of a snapshot, inline or from the compressed archive."""
+        from backend.storage.retention import decompress_text
+        async with self._get_conn() as db:
+            cursor = await db.execute(
+                """SELECT s.raw_ocr_text, o.codec, o.data
+                   FROM scan_snapshots s
+                   LEFT JOIN scan_ocr_text o ON o.snapshot_id = s.id
+                   WHERE s.id = ?""",
+                (snapshot_id,),
+            )
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        text, codec, blob = row
+        return decompress_text(codec, blob) if blob is not None else text
 
     async def get_task_logs(self, limit=100) -> list[dict]:
         """Get task execution history."""
@@ -786,16 +1048,10 @@ class Database:
         """Insert or update a macro definition. Returns macro id."""
         async with self._get_conn() as db:
             await db.execute(
-                """INSERT INTO macros (filename, display_name, resolution, duration_ms, file_path)
-                   VALUES (?, ?, ?, ?, ?)
-                   ON CONFLICT(filename) DO UPDATE SET
-                     display_name = CASE WHEN excluded.display_name != '' THEN excluded.display_name ELSE macros.display_name END,
-                     resolution = CASE WHEN excluded.resolution != '' THEN excluded.resolution ELSE macros.resolution END,
-                     duration_ms = CASE WHEN excluded.duration_ms > 0 THEN excluded.duration_ms ELSE macros.duration_ms END,
-                     file_path = CASE WHEN excluded.file_path != '' THEN excluded.file_path ELSE macros.file_path END""",
+                UPSERT_MACRO_SQL,
                 (filename, display_name, resolution, duration_ms, file_path),
             )
-            await db.commit()
+            await self._commit(db)
 
             cursor = await db.execute(
                 "SELECT id FROM macros WHERE filename = ?", (filename,)
@@ -810,12 +1066,10 @@ class Database:
         """Create a new macro run record. Returns run id."""
         async with self._get_conn() as db:
             cursor = await db.execute(
-                """INSERT INTO macro_runs
-                   (macro_id, emulator_id, status, ops_total)
-                   VALUES (?, ?, ?, ?)""",
+                INSERT_MACRO_RUN_SQL,
                 (macro_id, emulator_id, status, ops_total),
             )
-            await db.commit()
+            await self._commit(db)
             return cursor.lastrowid
 
     async def update_macro_run(
@@ -824,58 +1078,42 @@ class Database:
         finished_at: str = None
     ):
         """Update a macro run record."""
-        updates = []
-        params = []
-        if status is not None:
-            updates.append("status = ?")
-            params.append(status)
-        if ops_completed is not None:
-            updates.append("ops_completed = ?")
-            params.append(ops_completed)
-        if error is not None:
-            updates.append("error = ?")
-            params.append(error)
-        if finished_at is not None:
-            updates.append("finished_at = ?")
-            params.append(finished_at)
-
-        if not updates:
+        set_clause, params = update_clause(
+            status=status, ops_completed=ops_completed,
+            error=error, finished_at=finished_at,
+        )
+        if not set_clause:
             return
 
         params.append(run_id)
         async with self._get_conn() as db:
             await db.execute(
-                f"UPDATE macro_runs SET {', '.join(updates)} WHERE id = ?",
+                f"UPDATE macro_runs SET {set_clause} WHERE id = ?",
                 params,
             )
-            await db.commit()
+            await self._commit(db)
 
     async def get_macro_runs(self, emulator_index: int = None,
-                              limit: int = 50) -> list[dict]:
-        """Get macro execution history."""
+                              limit: int = 50, before_id: int = None,
+                              status: str = None, filename: str = None,
+                              since: str = None, until: str = None) -> list[dict]:
+        """Get macro execution history, newest first (keyset-paginated on id)."""
+        where, params = history_where(
+            "macro_runs", "mr", "started_at", before_id=before_id, since=since, until=until,
+            **{"e.emu_index": emulator_index, "mr.status": status, "m.filename": filename},
+        )
         async with self._get_conn() as db:
             db.row_factory = aiosqlite.Row
-            if emulator_index is not None:
-                cursor = await db.execute(
-                    """SELECT mr.*, m.filename, m.display_name,
-                              e.emu_index, e.serial, e.name as emulator_name
-                       FROM macro_runs mr
-                       JOIN macros m ON mr.macro_id = m.id
-                       JOIN emulators e ON mr.emulator_id = e.id
-                       WHERE e.emu_index = ?
-                       ORDER BY mr.started_at DESC LIMIT ?""",
-                    (emulator_index, limit),
-                )
-            else:
-                cursor = await db.execute(
-                    """SELECT mr.*, m.filename, m.display_name,
-                              e.emu_index, e.serial, e.name as emulator_name
-                       FROM macro_runs mr
-                       JOIN macros m ON mr.macro_id = m.id
-                       JOIN emulators e ON mr.emulator_id = e.id
-                       ORDER BY mr.started_at DESC LIMIT ?""",
-                    (limit,),
-                )
+            cursor = await db.execute(
+                f"""SELECT mr.*, m.filename, m.display_name,
+                           e.emu_index, e.serial, e.name as emulator_name
+                    FROM macro_runs mr
+                    JOIN macros m ON mr.macro_id = m.id
+                    JOIN emulators e ON mr.emulator_id = e.id
+                    {where}
+                    ORDER BY mr.id DESC LIMIT ?""",
+                (*params, limit),
+            )
             return [dict(row) for row in await cursor.fetchall()]
 
     # ──────────────────────────────────────────
@@ -889,11 +1127,10 @@ class Database:
         """Create a new task run record. Returns run id."""
         async with self._get_conn() as db:
             cursor = await db.execute(
-                """INSERT INTO task_runs (emulator_id, task_type, status)
-                   VALUES (?, ?, ?)""",
+                INSERT_TASK_RUN_SQL,
                 (emulator_id, task_type, status),
             )
-            await db.commit()
+            await self._commit(db)
             return cursor.lastrowid
 
     async def update_task_run(
@@ -902,57 +1139,40 @@ class Database:
         result_json: str = None, finished_at: str = None
     ):
         """Update a task run record."""
-        updates = []
-        params = []
-        if status is not None:
-            updates.append("status = ?")
-            params.append(status)
-        if error is not None:
-            updates.append("error = ?")
-            params.append(error)
-        if duration_ms is not None:
-            updates.append("duration_ms = ?")
-            params.append(duration_ms)
-        if result_json is not None:
-            updates.append("result_json = ?")
-            params.append(result_json)
-        if finished_at is not None:
-            updates.append("finished_at = ?")
-            params.append(finished_at)
-
-        if not updates:
+        set_clause, params = update_clause(
+            status=status, error=error, duration_ms=duration_ms,
+            result_json=result_json, finished_at=finished_at,
+        )
+        if not set_clause:
             return
 
         params.append(run_id)
         async with self._get_conn() as db:
             await db.execute(
-                f"UPDATE task_runs SET {', '.join(updates)} WHERE id = ?",
+                f"UPDATE task_runs SET {set_clause} WHERE id = ?",
                 params,
             )
-            await db.commit()
+            await self._commit(db)
 
     async def get_task_runs(self, emulator_index: int = None,
-                             limit: int = 50) -> list[dict]:
-        """Get task execution history."""
+                             limit: int = 50, before_id: int = None,
+                             status: str = None, task_type: str = None,
+                             since: str = None, until: str = None) -> list[dict]:
+        """Get task execution history, newest first (keyset-paginated on id)."""
+        where, params = history_where(
+            "task_runs", "t", "started_at", before_id=before_id, since=since, until=until,
+            **{"e.emu_index": emulator_index, "t.status": status, "t.task_type": task_type},
+        )
         async with self._get_conn() as db:
             db.row_factory = aiosqlite.Row
-            if emulator_index is not None:
-                cursor = await db.execute(
-                    """SELECT t.*, e.serial, e.emu_index, e.name as emulator_name
-                       FROM task_runs t
-                       JOIN emulators e ON t.emulator_id = e.id
-                       WHERE e.emu_index = ?
-                       ORDER BY t.started_at DESC LIMIT ?""",
-                    (emulator_index, limit),
-                )
-            else:
-                cursor = await db.execute(
-                    """SELECT t.*, e.serial, e.emu_index, e.name as emulator_name
-                       FROM task_runs t
-                       JOIN emulators e ON t.emulator_id = e.id
-                       ORDER BY t.started_at DESC LIMIT ?""",
-                    (limit,),
-                )
+            cursor = await db.execute(
+                f"""SELECT t.*, e.serial, e.emu_index, e.name as emulator_name
+                    FROM task_runs t
+                    JOIN emulators e ON t.emulator_id = e.id
+                    {where}
+                    ORDER BY t.id DESC LIMIT ?""",
+                (*params, limit),
+            )
             return [dict(row) for row in await cursor.fetchall()]
 
     # ── Account CRUD ──────────────────────────────
@@ -968,22 +1188,10 @@ class Database:
         now = datetime.now().isoformat()
         async with self._get_conn() as db:
             cursor = await db.execute(
-                """INSERT INTO accounts
-                   (game_id, emulator_id, lord_name, login_method, email, provider, alliance, note, is_active, updated_at)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                   ON CONFLICT(game_id) DO UPDATE SET
-                       emulator_id = COALESCE(excluded.emulator_id, accounts.emulator_id),
-                       lord_name = CASE WHEN excluded.lord_name != '' THEN excluded.lord_name ELSE accounts.lord_name END,
-                       login_method = CASE WHEN excluded.login_method != '' THEN excluded.login_method ELSE accounts.login_method END,
-                       email = CASE WHEN excluded.email != '' THEN excluded.email ELSE accounts.email END,
-                       provider = excluded.provider,
-                       alliance = CASE WHEN excluded.alliance != '' THEN excluded.alliance ELSE accounts.alliance END,
-                       note = CASE WHEN excluded.note != '' THEN excluded.note ELSE accounts.note END,
-                       is_active = excluded.is_active,
-                       updated_at = excluded.updated_at""",
+                UPSERT_ACCOUNT_SQL,
                 (game_id, emulator_id, lord_name, login_method, email, provider, alliance, note, is_active, now),
             )
-            await db.commit()
+            await self._commit(db)
             # Get the actual id (lastrowid returns 0 on conflict update)
             id_cur = await db.execute("SELECT id FROM accounts WHERE game_id = ?", (game_id,))
             row = await id_cur.fetchone()
@@ -1034,6 +1242,111 @@ class Database:
 
         return acc_id
 
+    async def import_accounts(self, rows: list[dict], snapshots: bool = True) -> dict:
+        """Bulk upsert accounts (account_io.parse rows) in one transaction.
+
+        Same effect per row as upsert_account_full(): unknown emulators are
+        registered and newly created accounts with an emu_index get a manual
+        snapshot (unless snapshots=False), but every step is one executemany.
+        Existing accounts keep their latest scan: a snapshot carrying only
+        lord_name / power would hide their levels and resources. Returns counts
+        plus row errors for rows whose emulator could not be registered.
+        """
+        result = {"created": 0, "updated": 0, "snapshots": 0, "errors": []}
+        if not rows:
+            return result
+        now = datetime.now().isoformat()
+
+        async def select_in(db, sql, values):
+            found = []
+            for i in range(0, len(values), 500):
+                chunk = values[i:i + 500]
+                cursor = await db.execute(sql % ",".join("?" * len(chunk)), chunk)
+                found.extend(await cursor.fetchall())
+            return found
+
+        async with self._get_conn() as db:
+            await db.execute("PRAGMA foreign_keys = ON")
+            await db.execute("BEGIN IMMEDIATE")
+
+            indexes = sorted({r["emu_index"] for r in rows if r["emu_index"] is not None})
+            await db.executemany(
+                "INSERT OR IGNORE INTO emulators (emu_index, serial, name) VALUES (?, ?, ?)",
+                [(i, f"emulator-{5554 + i * 2}", f"LDPlayer-{i:02d}") for i in indexes],
+            )
+            emu_ids = dict(await select_in(
+                db, "SELECT emu_index, id FROM emulators WHERE emu_index IN (%s)", indexes))
+
+            linked = []
+            for row in rows:
+                index = row["emu_index"]
+                if index is not None and index not in emu_ids:
+                    result["errors"].append({
+                        "line": row["line"], "game_id": row["game_id"],
+                        "error": f"emulator {index} could not be registered "
+                                 f"(serial emulator-{5554 + index * 2} is taken)",
+                    })
+                    continue
+                linked.append((row, emu_ids.get(index)))
+
+            existing = {r[0] for r in await select_in(
+                db, "SELECT game_id FROM accounts WHERE game_id IN (%s)",
+                [row["game_id"] for row, _ in linked])}
+            result["updated"] = len(existing)
+            result["created"] = len(linked) - len(existing)
+
+            await db.executemany(UPSERT_ACCOUNT_SQL, [
+                (row["game_id"], emu_id, row["lord_name"], row["login_method"],
+                 row["email"], row["provider"], row["alliance"], row["note"],
+                 1 if emu_id else 0, now)
+                for row, emu_id in linked
+            ])
+
+            snap_rows = []
+            for row, emu_id in linked:
+                if not (snapshots and emu_id) or row["game_id"] in existing:
+                    continue
+                existing.add(row["game_id"])    # One snapshot per new account
+                snap_rows.append(snapshot_params(
+                    emu_id, {"lord_name": row["lord_name"], "power": row["power"]},
+                    "manual_account_creation", "completed", 0, "", row["game_id"]))
+            if snap_rows:
+                cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM scan_snapshots")
+                last_id = (await cursor.fetchone())[0]
+                await db.executemany(INSERT_SNAPSHOT_SQL, snap_rows)
+                for sql in ROLLUP_AFTER_SQL:
+                    await db.execute(sql, (last_id,))
+                result["snapshots"] = len(snap_rows)
+
+            await self._commit(db)
+        return result
+
+    async def iter_accounts_export(self, batch: int = 500):
+        """Async-iterate accounts as flat rows with account_io.FIELDS keys.
+
+        lord_name / power come from the account's latest scan, like the
+        Accounts page shows them.
+        """
+        async with self._get_conn() as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(
+                """SELECT a.game_id, e.emu_index,
+                          COALESCE(NULLIF(s.lord_name, ''), a.lord_name) AS lord_name,
+                          COALESCE(s.power, 0) AS power,
+                          a.login_method, a.email, a.provider, a.alliance, a.note
+                   FROM accounts a
+                   LEFT JOIN emulators e ON a.emulator_id = e.id
+                   LEFT JOIN scan_snapshots s ON s.id =
+                       (SELECT MAX(id) FROM scan_snapshots WHERE game_id = a.game_id)
+                   ORDER BY a.id"""
+            )
+            while True:
+                rows = await cursor.fetchmany(batch)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+
     async def auto_link_account(
         self, emulator_id: int, game_id: str,
         lord_name: str = "", snapshot_id: int = 0,
@@ -1066,7 +1379,7 @@ class Database:
                     "UPDATE accounts SET is_active = 0 WHERE emulator_id = ? AND game_id != ?",
                     (emulator_id, game_id),
                 )
-                await db.commit()
+                await self._commit(db)
                 return {"action": "linked", "account_id": existing["id"]}
             else:
                 # Unknown account — check pending (dismissed ones should reappear)
@@ -1085,7 +1398,7 @@ class Database:
                            status = 'pending'""",
                     (game_id, emulator_id, lord_name, snapshot_id),
                 )
-                await db.commit()
+                await self._commit(db)
                 pid_cur = await db.execute(
                     "SELECT id FROM pending_accounts WHERE game_id = ?", (game_id,)
                 )
@@ -1247,6 +1560,43 @@ class Database:
             acc.pop("acc_lord_name", None)
             return acc
 
+    async def get_account_trend(self, game_id: str, period: str = "day",
+                                since: str = None, until: str = None,
+                                limit: int = 400) -> list[dict]:
+        """Trend points for one account, oldest first (rollup tables only).
+
+        since / until are ISO dates or datetimes, both inclusive: each is
+        floored to the bucket containing it, and a date-only `until` keeps
+        every hourly bucket of that day.
+        """
+        table, fmt = ROLLUP_PERIODS[period]
+        hourly = "%H" in fmt
+
+        def floor(value: str) -> str:
+            value = value.replace("T", " ")
+            return value[:13] + ":00" if hourly and len(value) >= 13 else value[:10]
+
+        clauses, params = ["game_id = ?"], [game_id]
+        if since:
+            clauses.append("bucket >= ?")
+            params.append(floor(since))
+        if until:
+            date_only = len(until) <= len("YYYY-MM-DD")
+            clauses.append("substr(bucket, 1, 10) <= ?" if hourly and date_only
+                           else "bucket <= ?")
+            params.append(floor(until))
+        async with self._get_conn() as db:
+            db.row_factory = aiosqlite.Row
+            # Newest `limit` buckets, returned in chronological order
+            cursor = await db.execute(
+                f"""SELECT * FROM (
+                        SELECT * FROM {table} WHERE {" AND ".join(clauses)}
+                        ORDER BY bucket DESC LIMIT ?
+                    ) ORDER BY bucket""",
+                (*params, limit),
+            )
+            return [dict(row) for row in await cursor.fetchall()]
+
     async def get_account_by_emu_index(self, emu_index: int) -> list[dict]:
         """Get all accounts linked to an emulator index."""
         async with self._get_conn() as db:
@@ -1280,7 +1630,7 @@ class Database:
                 f"UPDATE accounts SET {set_clause} WHERE game_id = ?",
                 (*values, game_id),
             )
-            await db.commit()
+            await self._commit(db)
             return cursor.rowcount > 0
 
     async def delete_account(self, game_id: str) -> bool:
@@ -1289,7 +1639,7 @@ class Database:
             cursor = await db.execute(
                 "DELETE FROM accounts WHERE game_id = ?", (game_id,),
             )
-            await db.commit()
+            await self._commit(db)
             return cursor.rowcount > 0
 
     # ── Pending Account CRUD ────────────────────────
@@ -1343,7 +1693,7 @@ class Database:
                 "UPDATE pending_accounts SET status = 'confirmed' WHERE id = ?",
                 (pending_id,),
             )
-            await db.commit()
+            await self._commit(db)
 
         return acc_id
 
@@ -1354,7 +1704,7 @@ class Database:
                 "UPDATE pending_accounts SET status = 'dismissed' WHERE id = ?",
                 (pending_id,),
             )
-            await db.commit()
+            await self._commit(db)
             return cursor.rowcount > 0
 
 
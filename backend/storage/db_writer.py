@@ -0,0 +1,331 @@
+"""
+DB Writer — Write-behind queue for task, macro and snapshot persistence.
+
+Worker threads (TaskQueue, macro replay, full scan) enqueue write intents
+instead of driving aiosqlite through an event loop per call. A single
+background thread drains the queue and applies intents in batched
+transactions on its own sqlite3 connection.
+
+Usage:
+    run_id = db_writer.submit("start_task_run", serial=..., task_type=...)
+    db_writer.submit("update_task_run", run_id=run_id, status="success")
+
+`submit()` returns a Future (fire-and-forget). Futures may be passed as
+parameters of later intents — they are resolved in queue order, so an
+update never has to wait for the insert that produced its id.
+`write()` is the acked mode: it blocks until the intent is committed and
+returns its result (e.g. a new row id).
+"""
+import asyncio
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from backend.config import config
+from backend.metrics import stage_metrics
+from backend.storage.data_version import data_version
+from backend.storage.database import (
+    UPSERT_EMULATOR_SQL, INSERT_SNAPSHOT_SQL, INSERT_RESOURCE_SQL,
+    UPSERT_MACRO_SQL, INSERT_MACRO_RUN_SQL, INSERT_TASK_RUN_SQL,
+    ROLLUP_SNAPSHOT_SQL, snapshot_params, resource_rows, update_clause,
+)
+
+
+BATCH_MAX = 200          # Max intents applied in one transaction
+FLUSH_INTERVAL = 0.05    # Seconds to wait for more intents before committing
+
+_FLUSH = object()        # Queue marker: commit everything before this point
+_STOP = object()         # Queue marker: flush and exit the writer thread
+
+
+# ──────────────────────────────────────────────
+# Write operations (run on the writer thread)
+# ──────────────────────────────────────────────
+
+def _index_from_serial(serial: str) -> int:
+    """Derive the LDPlayer index from an adb serial (emulator-5556 -> 1)."""
+    try:
+        port = int(serial.split("-")[1])
+        return (port - 5554) // 2
+    except (IndexError, ValueError):
+        return -1
+
+
+def _emulator_id(conn: sqlite3.Connection, emu_index: int, serial: str,
+                 name: str = "", resolution: str = "960x540",
+                 status: str = "ONLINE") -> int:
+    """Upsert an emulator row and return its id.
+
+    Unknown indices (-1) are resolved by serial first so ad-hoc task runs
+    attach to the real emulator row instead of the shared -1 placeholder.
+    """
+    now = datetime.now().isoformat()
+    if emu_index < 0:
+        row = conn.execute(
+            "SELECT id FROM emulators WHERE serial = ?", (serial,)
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE emulators SET status = ?, last_seen_at = ? WHERE id = ?",
+                (status, now, row[0]),
+            )
+            return row[0]
+        emu_index = _index_from_serial(serial)
+    else:
+        # Promote a placeholder row registered before the index was known
+        conn.execute(
+            "UPDATE emulators SET emu_index = ? WHERE serial = ? AND emu_index < 0",
+            (emu_index, serial),
+        )
+
+    conn.execute(
+        UPSERT_EMULATOR_SQL,
+        (emu_index, serial, name, resolution, status, now),
+    )
+    row = conn.execute(
+        "SELECT id FROM emulators WHERE emu_index = ?", (emu_index,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _op_upsert_emulator(conn, emu_index: int, serial: str, name: str = "",
+                        resolution: str = "960x540", status: str = "ONLINE") -> int:
+    return _emulator_id(conn, emu_index, serial, name, resolution, status)
+
+
+def _op_start_task_run(conn, serial: str, task_type: str,
+                       emu_index: int = -1, status: str = "running") -> int:
+    """Register the emulator and open a task_runs row. Returns run id."""
+    emu_id = _emulator_id(conn, emu_index, serial)
+    cursor = conn.execute(INSERT_TASK_RUN_SQL, (emu_id, task_type, status))
+    return cursor.lastrowid
+
+
+def _op_update_task_run(conn, run_id: int, **fields):
+    set_clause, params = update_clause(**fields)
+    if set_clause and run_id:
+        conn.execute(f"UPDATE task_runs SET {set_clause} WHERE id = ?",
+                     (*params, run_id))
+
+
+def _op_start_macro_run(conn, filename: str, serial: str, emu_index: int = -1,
+                        resolution: str = "", duration_ms: int = 0,
+                        file_path: str = "", ops_total: int = 0,
+                        status: str = "running") -> int:
+    """Register macro + emulator and open a macro_runs row. Returns run id."""
+    conn.execute(
+        UPSERT_MACRO_SQL,
+        (filename, "", resolution, duration_ms, file_path),
+    )
+    macro_id = conn.execute(
+        "SELECT id FROM macros WHERE filename = ?", (filename,)
+    ).fetchone()[0]
+    emu_id = _emulator_id(conn, emu_index, serial)
+    cursor = conn.execute(
+        INSERT_MACRO_RUN_SQL, (macro_id, emu_id, status, ops_total)
+    )
+    return cursor.lastrowid
+
+
+def _op_update_macro_run(conn, run_id: int, **fields):
+    set_clause, params = update_clause(**fields)
+    if set_clause and run_id:
+        conn.execute(f"UPDATE macro_runs SET {set_clause} WHERE id = ?",
+                     (*params, run_id))
+
+
+def _op_save_scan_snapshot(conn, emulator_index: int, serial: str,
+                           emulator_name: str, parsed_data: dict,
+                           scan_type: str = "full_scan",
+                           scan_status: str = "completed",
+                           scan_duration_ms: int = 0,
+                           raw_ocr_text: str = "", game_id: str = "") -> int:
+    """Insert a scan snapshot + resources. Returns snapshot id."""
+    emu_id = _emulator_id(conn, emulator_index, serial, emulator_name)
+    cursor = conn.execute(
+        INSERT_SNAPSHOT_SQL,
+        snapshot_params(emu_id, parsed_data, scan_type, scan_status,
+                        scan_duration_ms, raw_ocr_text, game_id),
+    )
+    snap_id = cursor.lastrowid
+    conn.executemany(
+        INSERT_RESOURCE_SQL,
+        resource_rows(snap_id, parsed_data.get("resources", {})),
+    )
+    for sql in ROLLUP_SNAPSHOT_SQL:
+        conn.execute(sql, (snap_id,))
+    return snap_id
+
+
+OPERATIONS = {
+    "upsert_emulator": _op_upsert_emulator,
+    "start_task_run": _op_start_task_run,
+    "update_task_run": _op_update_task_run,
+    "start_macro_run": _op_start_macro_run,
+    "update_macro_run": _op_update_macro_run,
+    "save_scan_snapshot": _op_save_scan_snapshot,
+}
+
+
+def _resolve(value, batch_results: dict):
+    """Replace a Future parameter with its result (raises if it failed).
+
+    Futures produced earlier in the same batch are not resolved until the
+    batch commits, so their results are looked up in `batch_results` first.
+    """
+    if isinstance(value, Future):
+        if value in batch_results:
+            return batch_results[value]
+        return value.result()
+    return value
+
+
+# ──────────────────────────────────────────────
+# Writer
+# ──────────────────────────────────────────────
+
+class DBWriter:
+    """Single-thread write-behind queue with batched transactions."""
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the writer thread (idempotent)."""
+        with self._lock:
+            if self.is_running:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="db-writer", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def submit(self, op: str, **params) -> Future:
+        """Enqueue a write intent. Returns a Future resolving to its result."""
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown write operation: {op}")
+        if not self.is_running:
+            self.start()
+        fut = Future()
+        self._queue.put((op, params, fut, time.perf_counter()))
+        return fut
+
+    def write(self, op: str, timeout: float = 10, **params):
+        """Acked write: block until the intent is committed, return result."""
+        return self.submit(op, **params).result(timeout=timeout)
+
+    async def write_async(self, op: str, **params):
+        """Awaitable acked write for coroutines."""
+        return await asyncio.wrap_future(self.submit(op, **params))
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Block until every intent enqueued so far is committed."""
+        if not self.is_running:
+            return True
+        fut = Future()
+        self._queue.put((_FLUSH, None, fut, 0.0))
+        try:
+            fut.result(timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    def stop(self, timeout: float = 10):
+        """Flush pending intents and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            self._queue.put((_STOP, None, None, 0.0))
+        thread.join(timeout=timeout)
+
+    # ── Writer thread ──
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(config.db_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        stopping = False
+        try:
+            while not stopping:
+                batch = [self._queue.get()]
+                # Coalesce whatever arrives within the flush window
+                while len(batch) < BATCH_MAX:
+                    try:
+                        batch.append(self._queue.get(timeout=FLUSH_INTERVAL))
+                    except queue.Empty:
+                        break
+                stopping = self._apply(conn, batch)
+        finally:
+            conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, batch: list) -> bool:
+        """Apply a batch in one transaction. Returns True on stop marker."""
+        done = {}       # future -> result, resolved only after COMMIT
+        markers = []
+        stopping = False
+
+        started = time.perf_counter()
+        conn.execute("BEGIN")
+        for op, params, fut, _ in batch:
+            if op is _STOP:
+                stopping = True
+                continue
+            if op is _FLUSH:
+                markers.append(fut)
+                continue
+            # Savepoint per intent: one bad write never rolls back the batch
+            conn.execute("SAVEPOINT intent")
+            try:
+                kwargs = {k: _resolve(v, done) for k, v in params.items()}
+                result = OPERATIONS[op](conn, **kwargs)
+                conn.execute("RELEASE intent")
+                done[fut] = result
+            except Exception as e:
+                conn.execute("ROLLBACK TO intent")
+                conn.execute("RELEASE intent")
+                print(f"[DBWriter] {op} failed: {e}")
+                fut.set_exception(e)
+
+        try:
+            conn.execute("COMMIT")
+            data_version.bump("db")
+        except sqlite3.Error as e:
+            print(f"[DBWriter] Batch commit failed: {e}")
+            conn.execute("ROLLBACK")
+            for fut in done:
+                fut.set_exception(e)
+            done = {}
+
+        # Per intent: enqueue -> commit (queueing + batching + write)
+        committed = time.perf_counter()
+        stage_metrics.record("db.commit", committed - started)
+        for op, _, fut, enqueued in batch:
+            if fut in done:
+                stage_metrics.record(f"db.{op}", committed - enqueued)
+
+        for fut, result in done.items():
+            fut.set_result(result)
+        for fut in markers:
+            fut.set_result(True)
+        return stopping
+
+
+# Global singleton
+db_writer = DBWriter()
@@ -0,0 +1,237 @@
+"""
+Retention — Bounded growth for scan history, OCR text and capture files.
+
+A background thread runs one pass every `retention_interval_hours`:
+    1. Downsample: per (emulator, game_id) keep the newest
+       `retention_keep_last` snapshots, then only the newest one per day.
+       Snapshots still referenced by pending accounts are kept. Trends
+       are unaffected (account rollups are maintained on insert).
+    2. Archive: raw_ocr_text of snapshots outside the newest
+       `retention_keep_last` moves to scan_ocr_text, compressed with zlib
+       or zstd (`retention_ocr_codec`, zstd needs the zstandard package).
+    3. Prune: files older than `retention_capture_days` under
+       data/scan_captures and work_dir/debug are deleted.
+    4. Vacuum: the database runs in auto_vacuum=INCREMENTAL mode and
+       returns freed pages with `PRAGMA incremental_vacuum`.
+
+Deletes and moves run in small transactions so the DB writer and API
+requests are never blocked for long.
+"""
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Optional: the zstd codec falls back to zlib
+    zstandard = None
+
+from backend.config import config, PROJECT_ROOT
+from backend.storage.data_version import data_version
+
+
+CHUNK = 500              # Rows per transaction
+FIRST_RUN_DELAY = 120    # Seconds after startup before the first pass
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Snapshot rank per (emulator, game_id): rn = overall, day_rn = within its day
+_RANKED_SQL = """
+    SELECT id, raw_ocr_text,
+           ROW_NUMBER() OVER (PARTITION BY emulator_id, game_id ORDER BY id DESC) AS rn,
+           ROW_NUMBER() OVER (PARTITION BY emulator_id, game_id, date(created_at)
+                              ORDER BY id DESC) AS day_rn
+    FROM scan_snapshots
+"""
+
+
+# ──────────────────────────────────────────────
+# OCR text codecs
+# ──────────────────────────────────────────────
+
+def compress_text(text: str, codec: str = "zlib") -> tuple[str, bytes]:
+    """Compress OCR text; returns (codec actually used, blob)."""
+    data = text.encode("utf-8")
+    if codec == "zstd" and zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def decompress_text(codec: str, blob: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed OCR text needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8")
+    return zlib.decompress(blob).decode("utf-8")
+
+
+# ──────────────────────────────────────────────
+# Passes
+# ──────────────────────────────────────────────
+
+def _chunks(ids: list, size: int = CHUNK):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def downsample_snapshots(conn: sqlite3.Connection, keep_last: int) -> int:
+    """Delete snapshots beyond the newest `keep_last` except one per day."""
+    ids = [row[0] for row in conn.execute(
+        f"""SELECT id FROM ({_RANKED_SQL})
+            WHERE rn > ? AND day_rn > 1
+              AND id NOT IN (SELECT snapshot_id FROM pending_accounts
+                             WHERE snapshot_id IS NOT NULL)""",
+        (keep_last,),
+    )]
+    for chunk in _chunks(ids):
+        marks = ",".join("?" * len(chunk))
+        with conn:
+            conn.execute(f"DELETE FROM scan_resources WHERE snapshot_id IN ({marks})", chunk)
+            conn.execute(f"DELETE FROM scan_ocr_text WHERE snapshot_id IN ({marks})", chunk)
+            conn.execute(f"DELETE FROM scan_snapshots WHERE id IN ({marks})", chunk)
+        data_version.bump("db")
+    return len(ids)
+
+
+def archive_ocr_text(conn: sqlite3.Connection, keep_last: int, codec: str) -> int:
+    """Move raw_ocr_text of older snapshots into compressed scan_ocr_text rows."""
+    ids = [row[0] for row in conn.execute(
+        f"SELECT id FROM ({_RANKED_SQL}) WHERE rn > ? AND raw_ocr_text != ''",
+        (keep_last,),
+    )]
+    for chunk in _chunks(ids):
+        marks = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT id, raw_ocr_text FROM scan_snapshots WHERE id IN ({marks})", chunk,
+        ).fetchall()
+        packed = [(snap_id, *compress_text(text, codec)) for snap_id, text in rows]
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO scan_ocr_text (snapshot_id, codec, data) VALUES (?, ?, ?)",
+                packed,
+            )
+            conn.execute(f"UPDATE scan_snapshots SET raw_ocr_text = '' WHERE id IN ({marks})", chunk)
+        data_version.bump("db")
+    return len(ids)
+
+
+def prune_files(directories: list[str], max_age_days: float) -> tuple[int, int]:
+    """Delete files older than max_age_days below the given directories.
+
+    Returns (files removed, bytes freed). Emptied subdirectories go too.
+    """
+    cutoff = time.time() - max_age_days * 86400
+    removed = freed = 0
+    for root_dir in directories:
+        if not os.path.isdir(root_dir):
+            continue
+        for dirpath, dirnames, filenames in os.walk(root_dir, topdown=False):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                    if st.st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                        freed += st.st_size
+                except OSError:
+                    pass  # In use (Windows) or already gone
+            if dirpath != root_dir and not os.listdir(dirpath):
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+    return removed, freed
+
+
+def incremental_vacuum(conn: sqlite3.Connection) -> int:
+    """Return free pages to the OS; switches the DB to incremental mode once."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        # Takes effect only after a full VACUUM (one-time, rewrites the file)
+        print("[Retention] Enabling incremental auto-vacuum (one-time VACUUM)...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return 0
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if not free:
+        return 0
+    # sqlite frees one page per step of this statement, and execute() steps
+    # a statement without result columns only once; executescript() runs it
+    # to completion (it commits any open transaction first)
+    conn.executescript("PRAGMA incremental_vacuum")
+    return free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+# ──────────────────────────────────────────────
+# Engine
+# ──────────────────────────────────────────────
+
+class RetentionEngine:
+    """Runs retention passes on a background thread."""
+
+    def __init__(self):
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self.last_result: dict | None = None
+
+    def start(self):
+        if not config.retention_enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        delay = FIRST_RUN_DELAY
+        while not self._stop.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[Retention] Pass failed: {e}")
+            delay = max(0.1, config.retention_interval_hours) * 3600
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(config.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def run_once(self) -> dict:
+        """One full pass (blocking). Concurrent calls wait for the running one."""
+        with self._run_lock:
+            start = time.monotonic()
+            keep = max(1, config.retention_keep_last)
+            conn = self._connect()
+            try:
+                deleted = downsample_snapshots(conn, keep)
+                archived = archive_ocr_text(conn, keep, config.retention_ocr_codec)
+                freed_pages = incremental_vacuum(conn)
+            finally:
+                conn.close()
+
+            capture_dir = str(PROJECT_ROOT / "data" / "scan_captures")
+            debug_dir = os.path.join(config.work_dir, "debug")
+            files, freed_bytes = prune_files([capture_dir, debug_dir],
+                                             config.retention_capture_days)
+
+            self.last_result = {
+                "snapshots_deleted": deleted,
+                "ocr_texts_archived": archived,
+                "pages_vacuumed": freed_pages,
+                "files_removed": files,
+                "bytes_freed": freed_bytes,
+                "elapsed_ms": int((time.monotonic() - start) * 1000),
+                "finished_at": time.time(),
+            }
+            print(f"[Retention] {deleted} snapshots downsampled, {archived} OCR texts archived, "
+                  f"{freed_pages} pages vacuumed, {files} files pruned "
+                  f"({freed_bytes // 1024} KB) in {self.last_result['elapsed_ms']}ms")
+            return self.last_result
+
+
+# Global singleton
+retention = RetentionEngine()
@@ -1,44 +1,71 @@
 """
 Task Queue — Async task execution with emulator locking.
 Core requirement from LOGIC_BUSSINESS.txt Section 8.
+
+Scheduling model:
+    - One FIFO queue per emulator serial, ordered by priority then arrival.
+    - A bounded pool of worker threads; each worker picks the best queued
+      task on a serial that is not already running something.
+    - Busy devices are waited on, not failed.
+    - Queued tasks can be cancelled outright; running tasks are flagged
+      and stop at the next step boundary. Once every unfinished task of a
+      session is cancelled, the session's CancelToken interrupts the
+      navigation in progress and the device is released right away.
+    - A worker takes every queued task of its serial (up to task_batch_max)
+      as one session: each distinct screen is navigated to and captured
+      once, and all tasks reading that screen share the capture.
 """
-import asyncio
+import heapq
+import itertools
+import json
 import uuid
 import time
 import threading
 from datetime import datetime
 from typing import Callable
 
+from backend.config import config
+from backend.core.cancel import CancelToken, Cancelled
 from backend.core.emulator import emulator_manager, EmulatorStatus
 from backend.core.ocr_engine import ocr_engine
 from backend.core.navigator import navigator
 from backend.core import validator
+from backend.metrics import stage_timer
+from backend.storage.db_writer import db_writer
 from backend.models.scan_result import (
     TaskStatus, TaskType, TaskResult, TaskQueueItem,
 )
 
 
-def _run_db_async(coro):
-    """Run an async DB coroutine from a background thread."""
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=10)
-        else:
-            return loop.run_until_complete(coro)
-    except RuntimeError:
-        return asyncio.run(coro)
+_FINISHED = (TaskStatus.SUCCESS, TaskStatus.FAILED, TaskStatus.TIMEOUT,
+             TaskStatus.CANCELLED)
+
+# Game screen each task type reads from (None = current screen, no navigation)
+SCREEN_MAP = {
+    TaskType.PROFILE: "profile",
+    TaskType.RESOURCES: "resources",
+    TaskType.BUILDING: "hall",
+    TaskType.HALL: "hall",
+    TaskType.MARKET: "market",
+    TaskType.PET: "pet",
+}
 
 
 class TaskQueue:
     """Manages task execution with emulator locking and progress tracking."""
 
-    def __init__(self):
-        self._queue: list[TaskQueueItem] = []
+    def __init__(self, max_workers: int = None):
+        self._pending: dict[str, list] = {}     # serial -> heap of (-priority, seq, item)
+        self._running: dict[str, list[TaskQueueItem]] = {}  # serial -> running session
+        self._cancel_requested: set[str] = set()      # running task_ids to stop
+        self._tokens: dict[str, CancelToken] = {}    # serial -> running session's token
+        self._seq = itertools.count()
         self._history: list[TaskResult] = []
         self._max_history = 200
         self._ws_callback: Callable | None = None
-        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._workers: list[threading.Thread] = []
+        self._max_workers = max_workers
 
     def set_ws_callback(self, callback: Callable):
         """Set callback for WebSocket progress updates."""
@@ -53,152 +80,339 @@ class TaskQueue:
                 pass
 
     def get_queue(self) -> list[dict]:
-        """Get current queue state."""
-        return [item.model_dump() for item in self._queue]
+        """Get current queue state: running tasks first, then queued in run order.
+
+        `position` is 0 for running tasks and 1..N for the place of a queued
+        task within its emulator's queue.
+        """
+        with self._cond:
+            result = []
+            for session in self._running.values():
+                for item in session:
+                    entry = item.model_dump()
+                    entry["position"] = 0
+                    result.append(entry)
+            for serial, heap in self._pending.items():
+                for pos, (_, _, item) in enumerate(sorted(heap), start=1):
+                    entry = item.model_dump()
+                    entry["position"] = pos
+                    result.append(entry)
+            return result
 
     def get_history(self, limit: int = 50) -> list[dict]:
         """Get task execution history."""
         return [r.model_dump() for r in self._history[-limit:]]
 
-    def submit_task(self, serial: str, task_type: TaskType) -> str:
-        """Submit a task for execution. Returns task_id."""
+    def submit_task(self, serial: str, task_type: TaskType, priority: int = 0) -> str:
+        """Queue a task for execution. Returns task_id.
+
+        Higher `priority` runs first; equal priorities run in arrival order.
+        """
         task_id = str(uuid.uuid4())[:8]
         item = TaskQueueItem(
             task_id=task_id,
             task_type=task_type,
             serial=serial,
+            priority=priority,
         )
-        with self._lock:
-            self._queue.append(item)
-
-        self._emit("task_queued", {"task_id": task_id, "serial": serial, "type": task_type.value})
-
-        # Execute in background thread
-        thread = threading.Thread(
-            target=self._execute_task, args=(item,), daemon=True
-        )
-        thread.start()
+        with self._cond:
+            heap = self._pending.setdefault(serial, [])
+            heapq.heappush(heap, (-priority, next(self._seq), item))
+            position = len(heap)
+            self._ensure_workers()
+            self._cond.notify()
+
+        self._emit("task_queued", {
+            "task_id": task_id, "serial": serial,
+            "type": task_type.value, "position": position,
+        })
         return task_id
 
-    def _execute_task(self, item: TaskQueueItem):
-        """Execute a single task (runs in background thread)."""
+    def cancel_task(self, task_id: str) -> dict:
+        """Cancel a queued task, or flag a running one to stop."""
+        with self._cond:
+            item = self._remove_pending(task_id)
+            if item is None:
+                for serial, session in self._running.items():
+                    if any(r.task_id == task_id for r in session):
+                        self._cancel_requested.add(task_id)
+                        self._cancel_session_if_idle(serial, session)
+                        return {"success": True, "status": "cancelling"}
+                return {"success": False, "error": "Task not found"}
+
         result = TaskResult(
             task_id=item.task_id,
             task_type=item.task_type,
             serial=item.serial,
-            status=TaskStatus.QUEUED,
-            started_at=datetime.now(),
+            status=TaskStatus.CANCELLED,
+            error="Cancelled before start",
         )
-
-        emu = emulator_manager.get(item.serial)
-        db_run_id = None
-
-        # ── Persist task start to DB ──
-        try:
-            from backend.storage.database import database
-            emu_id = _run_db_async(
-                database.upsert_emulator(-1, item.serial)
-            )
-            db_run_id = _run_db_async(
-                database.save_task_run(
-                    emulator_id=emu_id,
-                    task_type=item.task_type.value,
-                    status="running",
-                )
+        self._finalize(item, result)
+        return {"success": True, "status": "cancelled"}
+
+    def _remove_pending(self, task_id: str) -> TaskQueueItem | None:
+        """Remove a queued task from its serial's heap (caller holds _cond)."""
+        for serial, heap in self._pending.items():
+            for entry in heap:
+                if entry[2].task_id == task_id:
+                    heap.remove(entry)
+                    heapq.heapify(heap)
+                    if not heap:
+                        del self._pending[serial]
+                    return entry[2]
+        return None
+
+    def _is_cancelled(self, item: TaskQueueItem) -> bool:
+        """True if a running task was asked to stop."""
+        return item.task_id in self._cancel_requested
+
+    def _cancel_session_if_idle(self, serial: str, session: list[TaskQueueItem]):
+        """Interrupt a session once none of its unfinished tasks is wanted (caller holds _cond)."""
+        unfinished = [r for r in session if r.status not in _FINISHED]
+        if all(self._is_cancelled(r) for r in unfinished):
+            token = self._tokens.get(serial)
+            if token is not None:
+                token.cancel()
+
+    # ──────────────────────────────────────────
+    # Worker pool
+    # ──────────────────────────────────────────
+
+    def _ensure_workers(self):
+        """Start worker threads up to the pool size (caller holds _cond)."""
+        limit = self._max_workers or config.task_workers
+        while len(self._workers) < limit:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"task-worker-{len(self._workers)}",
+                daemon=True,
             )
-        except Exception as db_err:
-            print(f"[TaskQueue] DB save warning: {db_err}")
-
-        item._db_run_id = db_run_id
-
-        try:
-            # Step 1: Acquire emulator lock
-            item.status = TaskStatus.NAVIGATING
-            self._emit("task_started", {
-                "task_id": item.task_id, "serial": item.serial,
-                "step": "Acquiring lock..."
-            })
-
-            if not emu.acquire(task_name=item.task_type.value):
-                result.status = TaskStatus.FAILED
-                result.error = "Device busy — could not acquire lock"
-                self._finalize(item, result)
-                return
-
-            # Step 2: Navigate to the correct screen
-            item.progress_step = "Navigating..."
-            self._emit("task_progress", {
-                "task_id": item.task_id, "serial": item.serial,
-                "step": "Navigating to game screen..."
-            })
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_serial(self) -> str | None:
+        """Pick the idle serial whose head task should run next (caller holds _cond)."""
+        best = None
+        for serial, heap in self._pending.items():
+            if serial in self._running or not heap:
+                continue
+            if best is None or heap[0][:2] < self._pending[best][0][:2]:
+                best = serial
+        return best
+
+    def _worker_loop(self):
+        """Worker thread: run one session at a time, one session per serial."""
+        while True:
+            with self._cond:
+                serial = self._next_serial()
+                while serial is None:
+                    self._cond.wait()
+                    serial = self._next_serial()
+                heap = self._pending[serial]
+                session = []
+                while heap and len(session) < config.task_batch_max:
+                    session.append(heapq.heappop(heap)[2])
+                if not heap:
+                    del self._pending[serial]
+                self._running[serial] = session
+                self._tokens[serial] = CancelToken()
 
-            screen_map = {
-                TaskType.PROFILE: "profile",
-                TaskType.RESOURCES: "resources",
-                TaskType.BUILDING: "hall",
-                TaskType.HALL: "hall",
-                TaskType.MARKET: "market",
-                TaskType.PET: "pet",
-            }
-            screen = screen_map.get(item.task_type)
-            if screen:
-                navigator.navigate_to(item.serial, screen)
-
-            # Step 3: Capture screenshot
-            item.status = TaskStatus.CAPTURING
-            item.progress_step = "Capturing..."
+            try:
+                self._execute_session(serial, session)
+            except Exception as e:
+                print(f"[TaskQueue] Worker error on {serial}: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(serial, None)
+                    self._tokens.pop(serial, None)
+                    for item in session:
+                        self._cancel_requested.discard(item.task_id)
+                    self._cond.notify_all()
+
+    # ──────────────────────────────────────────
+    # Session execution
+    # ──────────────────────────────────────────
+
+    def _step(self, items: list[TaskQueueItem], status: TaskStatus,
+              progress: str, message: str):
+        """Advance every task of a group to the next step and emit progress."""
+        for item in items:
+            item.status = status
+            item.progress_step = progress
             self._emit("task_progress", {
                 "task_id": item.task_id, "serial": item.serial,
-                "step": "Capturing screenshot..."
+                "step": message,
             })
 
-            img_path = emu.capture()
-            if not img_path:
-                result.status = TaskStatus.FAILED
-                result.error = "Screenshot capture failed"
-                self._finalize(item, result)
-                return
+    def _execute_session(self, serial: str, items: list[TaskQueueItem]):
+        """Execute a batch of tasks for one emulator (runs on a worker thread).
+
+        Tasks are grouped by the screen they read; screens are visited once
+        each in navigator.plan_route() order and captured once, so queuing
+        PROFILE + RESOURCES + PET costs one trip per screen instead of a
+        lobby round-trip and capture per task. Each task still gets its own
+        TaskResult, DB row and events.
+        """
+        emu = emulator_manager.get(serial)
+        cancel = self._tokens.get(serial)
+        results: dict[str, TaskResult] = {}
+        done: set[str] = set()
+
+        def finish(item: TaskQueueItem, status: TaskStatus = None, error: str = None):
+            result = results[item.task_id]
+            if status is not None:
+                result.status = status
+            if error is not None:
+                result.error = error
+            done.add(item.task_id)
+            self._finalize(item, result)
 
-            # Step 4: Load and process image
-            item.status = TaskStatus.PROCESSING
-            item.progress_step = "OCR Processing..."
-            self._emit("task_progress", {
+        def live(group: list[TaskQueueItem]) -> list[TaskQueueItem]:
+            """Finish cancelled tasks, return the ones still to run."""
+            remaining = []
+            for item in group:
+                if item.task_id in done:
+                    continue
+                if self._is_cancelled(item):
+                    finish(item, TaskStatus.CANCELLED, "Cancelled by user")
+                else:
+                    remaining.append(item)
+            return remaining
+
+        for item in items:
+            results[item.task_id] = TaskResult(
+                task_id=item.task_id,
+                task_type=item.task_type,
+                serial=item.serial,
+                status=TaskStatus.QUEUED,
+                started_at=datetime.now(),
+            )
+            # ── Persist task start to DB (write-behind, run id resolved later) ──
+            item._db_run_id = db_writer.submit(
+                "start_task_run",
+                serial=item.serial,
+                task_type=item.task_type.value,
+                status="running",
+            )
+            item.status = TaskStatus.NAVIGATING
+            self._emit("task_started", {
                 "task_id": item.task_id, "serial": item.serial,
-                "step": "Processing OCR..."
+                "task_type": item.task_type.value,
+                "step": "Acquiring lock..."
             })
 
-            img = ocr_engine.load_image(img_path)
-            if img is None:
-                result.status = TaskStatus.FAILED
-                result.error = "Failed to load screenshot"
-                self._finalize(item, result)
-                return
-
-            # Step 5: Run OCR + Validate based on task type
-            item.status = TaskStatus.VALIDATING
+        acquired = False
+        current = None  # Screen the device is on (None = lobby)
+        try:
+            # Step 1: Acquire emulator lock (wait while another job holds it)
+            task_name = ",".join(item.task_type.value for item in items)
+            deadline = time.monotonic() + config.device_wait_timeout
+            while not emu.acquire(task_name=task_name, timeout=1.0):
+                if not live(items):
+                    return
+                if time.monotonic() > deadline:
+                    for item in live(items):
+                        finish(item, TaskStatus.FAILED,
+                               "Device busy — timed out waiting for lock")
+                    return
+            acquired = True
+
+            groups: dict[str | None, list[TaskQueueItem]] = {}
+            for item in items:
+                groups.setdefault(SCREEN_MAP.get(item.task_type), []).append(item)
+
+            # Screen-less tasks read the current frame before we move away
+            route = [None] if None in groups else []
+            route += navigator.plan_route([s for s in groups if s])
+
+            for screen in route:
+                emu.touch()  # A batched session can outlast the health check's timeout
+                group = live(groups[screen])
+                if not group:
+                    continue
+
+                # Step 2: Navigate to the correct screen
+                self._step(group, TaskStatus.NAVIGATING, "Navigating...",
+                           "Navigating to game screen...")
+                # Target counts as current even if the move is interrupted,
+                # so the session still backs out of it at the end
+                previous, current = current, screen
+                with stage_timer("task.navigation"):
+                    navigator.move(serial, previous, screen, cancel)
+                group = live(group)
+                if not group:
+                    continue
+
+                # Step 3: Capture screenshot (shared by the whole group)
+                self._step(group, TaskStatus.CAPTURING, "Capturing...",
+                           "Capturing screenshot...")
+                # In memory; reused if nothing touched the screen since the
+                # last capture (e.g. back-to-back FULL_SCANs on the lobby)
+                with stage_timer("task.capture"):
+                    frame = emu.capture_frame()
+                if frame is None:
+                    for item in group:
+                        finish(item, TaskStatus.FAILED, "Screenshot capture failed")
+                    continue
+
+                # Step 4: Load and process image
+                self._step(group, TaskStatus.PROCESSING, "OCR Processing...",
+                           "Processing OCR...")
+                img = ocr_engine.load_image(frame)
+                if img is None:
+                    for item in group:
+                        finish(item, TaskStatus.FAILED, "Failed to load screenshot")
+                    continue
+
+                # Step 5: Run OCR + Validate per task
+                for item in group:
+                    item.status = TaskStatus.VALIDATING
+                    with stage_timer("task.ocr"):
+                        self._apply_scan(item, results[item.task_id], img)
+                    finish(item)
+                    emu.touch()
+
+        except Cancelled:
+            for item in items:
+                if item.task_id not in done:
+                    finish(item, TaskStatus.CANCELLED, "Cancelled by user")
+        except Exception as e:
+            for item in items:
+                if item.task_id not in done:
+                    finish(item, TaskStatus.FAILED, str(e))
+        finally:
+            # Step 6: Navigate back to the lobby once for the whole session
+            if acquired:
+                if current:
+                    try:
+                        with stage_timer("task.navigation"):
+                            navigator.go_back(serial, current)
+                    except Exception as e:
+                        print(f"[TaskQueue] go_back failed on {serial}: {e}")
+                emu.release()
+            for item in items:
+                if item.task_id not in done:
+                    finish(item, TaskStatus.FAILED, "Session aborted")
+
+    def _apply_scan(self, item: TaskQueueItem, result: TaskResult, img):
+        """Run OCR + validation for one task and fill in its result."""
+        try:
             data, val_result = self._process_scan(item.task_type, img)
-
-            result.data = data
-            result.validation_errors = val_result.errors if val_result else []
-            result.is_reliable = val_result.is_reliable if val_result else False
-
-            if val_result and val_result.is_valid:
-                result.status = TaskStatus.SUCCESS
-            else:
-                result.status = TaskStatus.SUCCESS  # Still success, but flagged unreliable
-                if not val_result or not val_result.is_valid:
-                    result.is_reliable = False
-
-            # Step 6: Navigate back
-            if screen:
-                navigator.go_back(item.serial, screen)
-
         except Exception as e:
             result.status = TaskStatus.FAILED
             result.error = str(e)
-        finally:
-            emu.release()
-            self._finalize(item, result)
+            return
+
+        result.data = data
+        result.validation_errors = val_result.errors if val_result else []
+        result.is_reliable = val_result.is_reliable if val_result else False
+
+        if val_result and val_result.is_valid:
+            result.status = TaskStatus.SUCCESS
+        else:
+            result.status = TaskStatus.SUCCESS  # Still success, but flagged unreliable
+            if not val_result or not val_result.is_valid:
+                result.is_reliable = False
 
     def _process_scan(self, task_type: TaskType, img):
         """Run OCR and validation for a specific task type."""
@@ -263,43 +477,41 @@ class TaskQueue:
 
     def _finalize(self, item: TaskQueueItem, result: TaskResult):
         """Finalize task: update timing, store history, persist to DB, emit event."""
+        item.status = result.status
         result.finished_at = datetime.now()
         if result.started_at:
             result.duration_ms = int(
                 (result.finished_at - result.started_at).total_seconds() * 1000
             )
 
-        # Remove from queue
-        with self._lock:
-            self._queue = [q for q in self._queue if q.task_id != item.task_id]
-
         # Add to history
-        self._history.append(result)
-        if len(self._history) > self._max_history:
-            self._history = self._history[-self._max_history:]
+        with self._cond:
+            self._history.append(result)
+            if len(self._history) > self._max_history:
+                self._history = self._history[-self._max_history:]
 
         # ── Persist to DB ──
         db_run_id = getattr(item, '_db_run_id', None)
-        if db_run_id:
-            try:
-                import json
-                from backend.storage.database import database
-                db_status = "success" if result.status == TaskStatus.SUCCESS else "failed"
-                _run_db_async(
-                    database.update_task_run(
-                        run_id=db_run_id,
-                        status=db_status,
-                        error=result.error or "",
-                        duration_ms=result.duration_ms,
-                        result_json=json.dumps(result.data, default=str) if result.data else "",
-                        finished_at=result.finished_at.isoformat(),
-                    )
-                )
-            except Exception as db_err:
-                print(f"[TaskQueue] DB update warning: {db_err}")
+        if db_run_id is not None:
+            db_status = {
+                TaskStatus.SUCCESS: "success",
+                TaskStatus.CANCELLED: "cancelled",
+            }.get(result.status, "failed")
+            db_writer.submit(
+                "update_task_run",
+                run_id=db_run_id,
+                status=db_status,
+                error=result.error or "",
+                duration_ms=result.duration_ms,
+                result_json=json.dumps(result.data, default=str) if result.data else "",
+                finished_at=result.finished_at.isoformat(),
+            )
 
         # Emit completion event
-        event = "task_completed" if result.status == TaskStatus.SUCCESS else "task_failed"
+        event = {
+            TaskStatus.SUCCESS: "task_completed",
+            TaskStatus.CANCELLED: "task_cancelled",
+        }.get(result.status, "task_failed")
         self._emit(event, result.model_dump(mode="json"))
 
 
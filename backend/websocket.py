@@ -1,49 +1,230 @@
 """
 WebSocket Manager — Real-time event broadcasting.
+
+Every connection gets a topic filter and a bounded outbound queue drained
+by its own sender task. broadcast() serializes an event once and only
+enqueues it for matching clients, so a slow client backs up its own queue
+and never the producers or the other clients.
+
+Topics:
+    - event family: the event name's prefix ("scan", "macro", "task", ...)
+    - serial: events carrying data["serial"] can be limited to some emulators
+Clients narrow them with {"action": "subscribe", "families": [...],
+"serials": [...]}; a missing / null list means "all", which is also what a
+new connection starts with.
+
+Backlog handling: progress events replace their still-queued predecessor
+for the same (event, serial). If the queue is still full, the oldest
+progress message is dropped, then the oldest message of any kind.
+
+Before any of that, every event passes through the EventBus, which
+throttles progress events per (event, emulator) to one per
+ws_coalesce_window. Completion / failure events are never held back.
 """
-import json
 import asyncio
+import itertools
+import json
+from collections import OrderedDict
 from fastapi import WebSocket
-from typing import Set
+
+from backend import runtime
+from backend.config import config
+
+# Events where only the latest message per (event, serial) matters
+COALESCE = {"task_progress", "scan_progress", "macro_progress", "launch_progress"}
+
+
+def _family(event: str) -> str:
+    return event.split("_", 1)[0]
+
+
+def _key(data) -> str | int | None:
+    """Emulator an event is about (serial, else LDPlayer index)."""
+    if not isinstance(data, dict):
+        return None
+    return data.get("serial") or data.get("index")
+
+
+class EventBus:
+    """Coalesces progress events on the server loop before publishing.
+
+    The first progress event for an (event, emulator) key goes out at once;
+    later ones within the window only replace the held value, which is
+    published when the window ends (so the latest state always arrives).
+    Any other event is published immediately and discards held progress of
+    its family for the same emulator, since it supersedes it.
+    """
+
+    def __init__(self, publish):
+        self._publish = publish
+        self._held: dict[tuple, dict] = {}          # (event, key) -> latest data
+        self._timers: dict[tuple, asyncio.TimerHandle] = {}
+
+    def emit(self, event: str, data: dict):
+        """Thread-safe entry point for every outgoing event."""
+        loop = runtime.get_loop()
+        if loop is None:
+            return  # Server not running
+        if runtime.in_loop_thread():
+            self._route(event, data)
+        else:
+            loop.call_soon_threadsafe(self._route, event, data)
+
+    def _route(self, event: str, data: dict):
+        key = (event, _key(data))
+        if event not in COALESCE or config.ws_coalesce_window <= 0:
+            if key[1] is not None:
+                family = _family(event)
+                for held in [k for k in self._held
+                             if k[1] == key[1] and _family(k[0]) == family]:
+                    del self._held[held]
+            self._publish(event, data)
+            return
+        if key in self._timers:
+            self._held[key] = data      # replaces any older held value
+            return
+        self._publish(event, data)
+        self._arm(key)
+
+    def _arm(self, key: tuple):
+        loop = asyncio.get_running_loop()
+        self._timers[key] = loop.call_later(config.ws_coalesce_window, self._flush, key)
+
+    def _flush(self, key: tuple):
+        self._timers.pop(key, None)
+        data = self._held.pop(key, None)
+        if data is not None:
+            self._publish(key[0], data)
+            self._arm(key)              # keep throttling while updates continue
+
+
+class _Client:
+    """One connection: topic filter + bounded queue + sender task."""
+
+    def __init__(self, ws: WebSocket, maxsize: int):
+        self.ws = ws
+        self.families: set[str] | None = None
+        self.serials: set[str] | None = None
+        self.maxsize = max(1, maxsize)     # ws_queue_size <= 0 would drop everything
+        self.dropped = 0
+        self._queue: OrderedDict = OrderedDict()    # key -> message text
+        self._ids = itertools.count()
+        self._wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def wants(self, family: str, serial: str | None) -> bool:
+        if self.families is not None and family not in self.families:
+            return False
+        if serial and self.serials is not None and serial not in self.serials:
+            return False
+        return True
+
+    def put(self, message: str, key: tuple = None):
+        """Enqueue without blocking; coalesce by key, drop on overflow."""
+        if key is not None and key in self._queue:
+            self._queue[key] = message      # keep its place, newest content
+            return
+        if self._queue and len(self._queue) >= self.maxsize:
+            # Oldest coalescable (keyed) message first, else the oldest one
+            victim = next((k for k in self._queue if isinstance(k, tuple)), None)
+            if victim is None:
+                victim = next(iter(self._queue))
+            del self._queue[victim]
+            self.dropped += 1
+        self._queue[key if key is not None else next(self._ids)] = message
+        self._wake.set()
+
+    async def run(self):
+        """Sender task: drain the queue in order."""
+        while True:
+            await self._wake.wait()
+            while self._queue:
+                _, message = self._queue.popitem(last=False)
+                await self.ws.send_text(message)
+            self._wake.clear()
 
 
 class WebSocketManager:
-    """Manages WebSocket connections and broadcasts events to all clients."""
+    """Manages WebSocket connections and broadcasts events to subscribed clients."""
 
     def __init__(self):
-        self._connections: Set[WebSocket] = set()
+        self._clients: dict[WebSocket, _Client] = {}
+        self._listeners = []    # fn(event, data), called on the server loop
+        self.bus = EventBus(self.publish)
+
+    def add_listener(self, fn):
+        """Observe every broadcast event (even with no clients connected)."""
+        self._listeners.append(fn)
+
+    def _notify(self, event: str, data: dict):
+        for fn in self._listeners:
+            try:
+                fn(event, data)
+            except Exception as e:
+                print(f"[WS] Listener error on {event}: {e}")
 
     async def connect(self, ws: WebSocket):
         await ws.accept()
-        self._connections.add(ws)
+        client = _Client(ws, config.ws_queue_size)
+        client.task = asyncio.get_running_loop().create_task(self._sender(client))
+        self._clients[ws] = client
 
     def disconnect(self, ws: WebSocket):
-        self._connections.discard(ws)
+        client = self._clients.pop(ws, None)
+        if client and client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    async def _sender(self, client: _Client):
+        try:
+            await client.run()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.disconnect(client.ws)  # Send failed: client is gone
+
+    def subscribe(self, ws: WebSocket, families=None, serials=None):
+        """Limit which broadcasts a connection receives (None = all)."""
+        client = self._clients.get(ws)
+        if client:
+            client.families = set(families) if families is not None else None
+            client.serials = set(serials) if serials is not None else None
+
+    def send_to(self, ws: WebSocket, event: str, data: dict):
+        """Queue a message for one connection (bypasses topic filters)."""
+        client = self._clients.get(ws)
+        if client:
+            client.put(json.dumps({"event": event, "data": data}, default=str))
+
+    def publish(self, event: str, data: dict):
+        """Serialize once and enqueue for every subscribed client (loop thread).
+
+        Bypasses the EventBus; producers should use broadcast / broadcast_sync.
+        """
+        self._notify(event, data)
+        if not self._clients:
+            return
+        serial = data.get("serial") if isinstance(data, dict) else None
+        family = _family(event)
+        key = (event, serial) if event in COALESCE else None
+        message = None
+        for client in list(self._clients.values()):
+            if not client.wants(family, serial):
+                continue
+            if message is None:
+                message = json.dumps({"event": event, "data": data}, default=str)
+            client.put(message, key)
 
     async def broadcast(self, event: str, data: dict):
-        """Broadcast an event to all connected clients."""
-        message = json.dumps({"event": event, "data": data}, default=str)
-        dead = set()
-        for ws in self._connections:
-            try:
-                await ws.send_text(message)
-            except Exception:
-                dead.add(ws)
-        self._connections -= dead
+        """Broadcast an event to all subscribed clients (never waits on sends)."""
+        self.bus.emit(event, data)
 
     def broadcast_sync(self, event: str, data: dict):
-        """Synchronous wrapper for broadcasting (for use from threads)."""
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                asyncio.run_coroutine_threadsafe(
-                    self.broadcast(event, data), loop
-                )
-            else:
-                loop.run_until_complete(self.broadcast(event, data))
-        except RuntimeError:
-            # No event loop available — skip broadcast
-            pass
+        """Synchronous wrapper for broadcasting (for use from threads).
+
+        Fire-and-forget: the event is handed to the server loop's EventBus
+        and the calling worker thread never waits for slow clients.
+        """
+        self.bus.emit(event, data)
 
 
 # Global singleton
@@ -14,6 +14,15 @@ const API = {
         return res.json();
     },
 
+    /** GET one page of a history endpoint: {items, nextCursor} (nextCursor null on the last page). */
+    async getPage(path, params = {}) {
+        const qs = new URLSearchParams();
+        Object.entries(params).forEach(([k, v]) => { if (v !== undefined && v !== null && v !== '') qs.set(k, v); });
+        const res = await fetch(`${this.BASE}${path}?${qs}`);
+        if (!res.ok) throw new Error(`HTTP Error ${res.status}: ${res.statusText}`);
+        return { items: await res.json(), nextCursor: res.headers.get('X-Next-Cursor') };
+    },
+
     async post(path, body = {}) {
         const res = await fetch(`${this.BASE}${path}`, {
             method: 'POST',
@@ -40,6 +49,7 @@ const API = {
         return this.post(`/api/tasks/run-all?task_type=${taskType}`);
     },
     getQueue() { return this.get('/api/tasks/queue'); },
+    cancelTask(taskId) { return this.post(`/api/tasks/cancel?task_id=${taskId}`); },
     getHistory(limit) { return this.get(`/api/tasks/history?limit=${limit || 50}`); },
 
     // ── Reports ──
@@ -49,6 +59,25 @@ const API = {
         return this.get(url);
     },
     getLatestReport(serial) { return this.get(`/api/reports/latest/${serial}`); },
+    // params: {limit, cursor, status, since, until, ...endpoint filters}
+    getReportsPage(params) { return this.getPage('/api/reports/history', params); },
+    getTaskRunsPage(params) { return this.getPage('/api/task-runs/history', params); },
+    getMacroRunsPage(params) { return this.getPage('/api/macro-runs/history', params); },
+    getAccountTrend(gameId, period = 'day') {
+        return this.get(`/api/accounts/${encodeURIComponent(gameId)}/trend?period=${period}`);
+    },
+    /** Upload a CSV / JSONL file as-is: {created, updated, error_count, errors[{line, game_id, error}]} */
+    async importAccounts(file, dryRun = false) {
+        const format = /\.jsonl?$/i.test(file.name) ? 'jsonl' : 'csv';
+        const res = await fetch(`${this.BASE}/api/accounts/import?format=${format}&dry_run=${dryRun}`, {
+            method: 'POST',
+            headers: { 'Content-Type': format === 'csv' ? 'text/csv' : 'application/x-ndjson' },
+            body: file,
+        });
+        if (!res.ok) throw new Error(`HTTP Error ${res.status}: ${res.statusText}`);
+        return res.json();
+    },
+    accountsExportUrl(format = 'csv') { return `${this.BASE}/api/accounts/export?format=${format}`; },
 
     // ── Config ──
     getConfig() { return this.get('/api/config'); },
@@ -57,6 +86,9 @@ const API = {
     getAllEmulators() { return this.get('/api/emulators/all'); },
     launchEmulator(index) { return this.post(`/api/emulators/launch?index=${index}`); },
     quitEmulator(index) { return this.post(`/api/emulators/quit?index=${index}`); },
+    launchBulk(indices) { return this.post(`/api/emulators/launch-bulk?indices=${indices.join(',')}`); },
+    getLaunchStatus() { return this.get('/api/emulators/launch-status'); },
+    cancelLaunch() { return this.post('/api/emulators/launch-cancel'); },
 
     // ── Macros ──
     getMacros() { return this.get('/api/macros/list'); },
@@ -66,6 +98,9 @@ const API = {
     runMacro(index, filename) {
         return this.post(`/api/macros/run?index=${index}&filename=${encodeURIComponent(filename)}`);
     },
+    runMacroGroup(indices, filename) {
+        return this.post(`/api/macros/run-group?indices=${indices.join(',')}&filename=${encodeURIComponent(filename)}`);
+    },
 };
 
 
@@ -78,6 +113,7 @@ class WSClient {
         this.listeners = {};
         this.reconnectDelay = 2000;
         this._reconnectTimer = null;
+        this._topics = null;   // {families, serials}; null = everything
     }
 
     connect() {
@@ -93,6 +129,7 @@ class WSClient {
 
         this.ws.onopen = () => {
             this._updateStatus(true);
+            if (this._topics) this.send(JSON.stringify({ action: 'subscribe', ...this._topics }));
             // Start ping interval
             this._pingInterval = setInterval(() => {
                 if (this.ws && this.ws.readyState === WebSocket.OPEN) {
@@ -132,6 +169,18 @@ class WSClient {
         this.listeners[event].push(callback);
     }
 
+    /** Only receive these event families / emulator serials (null = all). */
+    subscribe(families = null, serials = null) {
+        this._topics = { families, serials };
+        this.send(JSON.stringify({ action: 'subscribe', families, serials }));
+    }
+
+    send(text) {
+        if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+            this.ws.send(text);
+        }
+    }
+
     off(event, callback) {
         if (this.listeners[event]) {
             this.listeners[event] = this.listeners[event].filter(fn => fn !== callback);
@@ -2,6 +2,9 @@
  * App Router — SPA navigation + WebSocket event wiring.
  * Updated for 5-page layout matching SAMPLE.
  */
+// Event families every page needs; pages may add more via `wsFamilies`
+const WS_FAMILIES = ['state', 'task', 'scan', 'device', 'launch'];
+
 const router = {
     _currentPage: null,
     _pages: {
@@ -50,6 +53,9 @@ const router = {
 
         this._currentPage = pageName;
 
+        // Skip event families no visible page consumes (e.g. macro_progress)
+        wsClient.subscribe([...WS_FAMILIES, ...(page.wsFamilies || [])]);
+
         if (page.init) page.init();
     },
 };
@@ -58,6 +64,18 @@ const router = {
  * Wire up WebSocket events to UI + notification bell.
  */
 function setupWSEvents() {
+    // ──────────────────────────────────────────────
+    // Versioned State Sync (replaces polling)
+    // ──────────────────────────────────────────────
+    wsClient.on('state_snapshot', (data) => DeviceStore.applySnapshot(data));
+
+    wsClient.on('state_delta', (data) => {
+        if (!DeviceStore.applyDelta(data)) {
+            DeviceStore.reset();
+            wsClient.send('resync');
+        }
+    });
+
     wsClient.on('task_started', (data) => {
         DeviceCard.updateStatus(data.serial, 'BUSY');
         DeviceCard.showProgress(data.serial, data.step || 'Starting...', 15);
@@ -110,6 +128,65 @@ function setupWSEvents() {
         }
     });
 
+    ['macro_started', 'macro_progress', 'macro_completed', 'macro_failed', 'macro_stopped'].forEach(event => {
+        wsClient.on(event, (data) => {
+            if (router._currentPage === 'runner') {
+                TaskRunnerPage.updateFromWS(event, data);
+            }
+        });
+    });
+
+    wsClient.on('task_cancelled', (data) => {
+        DeviceCard.updateStatus(data.serial, 'ONLINE');
+        DeviceCard.hideProgress(data.serial);
+        NotificationManager.add('info', 'Task Cancelled', `${data.task_type} on ${data.serial}`);
+
+        if (router._currentPage === 'runner') {
+            TaskRunnerPage.updateFromWS('task_failed', data);
+        }
+    });
+
+    // ──────────────────────────────────────────────
+    // Device Discovery Events
+    // ──────────────────────────────────────────────
+    wsClient.on('device_online', (data) => {
+        if (document.getElementById(`card-${data.serial}`)) {
+            DeviceCard.updateStatus(data.serial, data.status);
+        } else if (router._currentPage === 'dashboard') {
+            DashboardPage.refresh();
+        }
+        NotificationManager.add('info', 'Device Online', data.serial);
+    });
+
+    wsClient.on('device_offline', (data) => {
+        DeviceCard.updateStatus(data.serial, 'OFFLINE');
+        DeviceCard.hideProgress(data.serial);
+        NotificationManager.add('error', 'Device Offline', data.serial);
+    });
+
+    // ──────────────────────────────────────────────
+    // Bulk Launch Events
+    // ──────────────────────────────────────────────
+    wsClient.on('launch_ready', (data) => {
+        NotificationManager.add('success', 'Emulator Ready', `#${data.index} (${data.serial})`);
+    });
+
+    wsClient.on('launch_failed', (data) => {
+        NotificationManager.add('error', 'Launch Failed', `#${data.index}: ${data.error || data.detail}`);
+    });
+
+    wsClient.on('launch_cancelled', (data) => {
+        NotificationManager.add('info', 'Launch Cancelled', `#${data.index} (${data.serial})`);
+    });
+
+    wsClient.on('launch_completed', (data) => {
+        const ready = data.ready || 0;
+        const failed = data.failed || 0;
+        const cancelled = data.cancelled ? `, ${data.cancelled} cancelled` : '';
+        Toast.success('Bulk Launch Done', `${ready} ready, ${failed} failed${cancelled}`);
+        if (router._currentPage === 'emulators') EmulatorsPage.refresh(true);
+    });
+
     // ──────────────────────────────────────────────
     // Full Scan Events
     // ──────────────────────────────────────────────
@@ -152,6 +229,12 @@ function setupWSEvents() {
         NotificationManager.add('error', 'Scan Failed', `${data.serial}: ${data.error || 'Unknown'}`);
         Toast.error('Scan Failed', `${data.serial}: ${data.error || 'Unknown error'}`);
     });
+
+    wsClient.on('scan_cancelled', (data) => {
+        DeviceCard.updateStatus(data.serial, 'ONLINE');
+        DeviceCard.hideProgress(data.serial);
+        Toast.info('Scan Stopped', `Device ${data.serial} is free again.`);
+    });
 }
 
 /**
@@ -319,10 +319,15 @@ const AccountsPage = {
                         </div>
                     </div>
                     <div class="page-actions" style="display:flex; gap: 8px;">
-                        <button class="btn btn-outline btn-sm" style="display:flex;align-items:center;gap:6px;">
+                        <input type="file" id="acc-import-file" accept=".csv,.jsonl,.json" style="display:none" onchange="AccountsPage.importFile(this)">
+                        <button class="btn btn-outline btn-sm" style="display:flex;align-items:center;gap:6px;" onclick="document.getElementById('acc-import-file').click()">
+                            <svg style="width:13px;height:13px" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"/><polyline points="17 8 12 3 7 8"/><line x1="12" y1="3" x2="12" y2="15"/></svg>
+                            Import
+                        </button>
+                        <a class="btn btn-outline btn-sm" style="display:flex;align-items:center;gap:6px;text-decoration:none;" href="${API.accountsExportUrl('csv')}" download>
                             <svg style="width:13px;height:13px" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"/><polyline points="7 10 12 15 17 10"/><line x1="12" y1="15" x2="12" y2="3"/></svg>
                             Export CSV
-                        </button>
+                        </a>
                         <button class="btn btn-outline btn-sm" style="display:flex;align-items:center;gap:6px;" onclick="AccountsPage.fetchData()">
                             <svg style="width:13px;height:13px" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2"><polyline points="23 4 23 10 17 10"/><polyline points="1 20 1 14 7 14"/><path d="M3.51 9a9 9 0 0 1 14.85-3.36L23 10M1 14l4.64 4.36A9 9 0 0 0 20.49 15"/></svg>
                             Sync All
@@ -1237,6 +1242,28 @@ const AccountsPage = {
         }
     },
 
+    async importFile(input) {
+        const file = input.files && input.files[0];
+        input.value = '';
+        if (!file) return;
+        try {
+            const res = await API.importAccounts(file);
+            if (res.error) {
+                Toast.error('Import failed', res.error);
+                return;
+            }
+            Toast.success('Accounts imported', `${res.created} new, ${res.updated} updated`);
+            if (res.error_count) {
+                const lines = res.errors.slice(0, 5).map(e => `line ${e.line}: ${e.error}`).join('; ');
+                Toast.warning(`${res.error_count} row(s) skipped`, lines);
+                console.warn('Account import errors:', res.errors);
+            }
+            this.fetchData();
+        } catch (e) {
+            Toast.error('Import failed', e.message);
+        }
+    },
+
     async fetchData() {
         this._isLoading = true;
 
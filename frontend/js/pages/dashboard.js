@@ -3,7 +3,7 @@
  * Inspired by SAMPLE EmulatorDashboard.
  */
 const DashboardPage = {
-    _pollInterval: null,
+    _unsubscribe: null,
 
     render() {
         return `
@@ -83,13 +83,14 @@ const DashboardPage = {
 
     async init() {
         await this.refresh();
-        this._pollInterval = setInterval(() => this.pollDevices(), 3000);
+        // Live updates come from /ws state deltas; no polling
+        this._unsubscribe = DeviceStore.subscribe((change) => this.applyChange(change));
     },
 
     destroy() {
-        if (this._pollInterval) {
-            clearInterval(this._pollInterval);
-            this._pollInterval = null;
+        if (this._unsubscribe) {
+            this._unsubscribe();
+            this._unsubscribe = null;
         }
     },
 
@@ -103,17 +104,24 @@ const DashboardPage = {
         }
     },
 
-    async pollDevices() {
-        try {
-            const devices = await API.getDevices();
+    /** Apply a DeviceStore change (snapshot or delta) to the rendered cards. */
+    applyChange(change) {
+        const devices = DeviceStore.deviceList();
+        const known = Object.keys(change.devices).every(s => document.getElementById(`card-${s}`));
+        if (change.snapshot || change.removed.length || !known) {
+            // Device set changed: re-render the list
+            this.renderDevices(devices);
             this.updateStats(devices);
-            devices.forEach(d => {
-                DeviceCard.updateStatus(d.serial, d.status);
-                if (d.data) {
-                    DeviceCard.updateData(d.serial, d.task_type || 'full_scan', d.data);
-                }
-            });
-        } catch (e) { /* silent */ }
+            return;
+        }
+        this.updateStats(devices);
+        Object.entries(change.devices).forEach(([serial, fields]) => {
+            const d = DeviceStore.devices[serial];
+            if ('status' in fields) DeviceCard.updateStatus(serial, d.status);
+            if ('data' in fields && d.data) {
+                DeviceCard.updateData(serial, d.task_type || 'full_scan', d.data);
+            }
+        });
     },
 
     renderDevices(devices) {
@@ -22,13 +22,14 @@ const TAB_COLORS = ['#4f9eff', '#22c55e', '#f59e0b', '#a78bfa', '#f472b6', '#34d
 const EmulatorsPage = {
     _pollInterval: null,
     _countdownInterval: null,
+    _unsubscribe: null,
     _instances: [],
     _selectedInstances: new Set(),
     _filter: 'all',        // 'all' | 'running' | 'stopped'
     _searchQuery: '',
     _autoRefresh: true,
     _lastRefresh: null,
-    _refreshSeconds: 5,    // polling interval in seconds
+    _refreshSeconds: 60,   // consistency re-fetch; live changes arrive as /ws deltas
     _contextMenu: null,    // active context menu element
     _renamingIndex: null,  // index currently being renamed
 
@@ -261,11 +262,16 @@ const EmulatorsPage = {
 
         this.renderTabs();
         await this.refresh();
+        this._unsubscribe = DeviceStore.subscribe((change) => this.applyChange(change));
         this._setupPolling();
         this._startCountdown();
     },
 
     destroy() {
+        if (this._unsubscribe) {
+            this._unsubscribe();
+            this._unsubscribe = null;
+        }
         if (this._pollInterval) {
             clearInterval(this._pollInterval);
             this._pollInterval = null;
@@ -340,6 +346,19 @@ const EmulatorsPage = {
         }
     },
 
+    /** Instance list changed on the server (DeviceStore snapshot/delta). */
+    applyChange(change) {
+        if (!this._autoRefresh) return;
+        if (!change.snapshot && !Object.keys(change.instances).length
+            && !(change.instancesRemoved || []).length) return;
+        if (change.snapshot && !Object.keys(change.instances).length) return;  // list2 not loaded yet
+        this._instances = DeviceStore.instanceList();
+        this._lastRefresh = new Date();
+        this._updateLastRefreshLabel();
+        this.updateStats();
+        this.renderList();
+    },
+
     _updateLastRefreshLabel() {
         const el = document.getElementById('emu-last-refresh');
         if (!el || !this._lastRefresh) return;
@@ -1014,9 +1033,7 @@ const EmulatorsPage = {
         const stopped = this._instances.filter(i => !i.running);
         if (stopped.length === 0) { Toast.info('Start All', 'No stopped instances to start.'); return; }
         Toast.info('Start All', `Starting ${stopped.length} stopped instance(s)…`);
-        for (const inst of stopped) {
-            try { API.launchEmulator(inst.index); } catch { }
-        }
+        try { await API.launchBulk(stopped.map(i => i.index)); } catch { }
         setTimeout(() => this.refresh(true), 2000);
     },
 
@@ -1041,9 +1058,7 @@ const EmulatorsPage = {
         Toast.info('Batch Start', `Starting ${indices.length} emulator(s)…`);
         this._selectedInstances.clear();
         this.updateSelectionUI();
-        for (const index of indices) {
-            try { API.launchEmulator(index); } catch { }
-        }
+        try { await API.launchBulk(indices); } catch { }
         setTimeout(() => this.refresh(true), 1500);
     },
 
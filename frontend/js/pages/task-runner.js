@@ -12,6 +12,7 @@
  */
 const TaskRunnerPage = {
 
+    wsFamilies: ['macro'],   // macro_* events are only shown on this page
     _macros: [],
     _currentTab: 'emulators',
     _apkLibrary: [
@@ -326,10 +327,24 @@ const TaskRunnerPage = {
         // Set state in the serializable GlobalStore
         GlobalStore.setMacroRunning(filename, indices.length, 0);
 
-        // Execute on all selected emulators
+        // Execute on all selected emulators (one lockstep group for 2+)
         let successCount = 0;
         let totalDuration = 0;
-        for (const idx of indices) {
+        if (indices.length > 1) {
+            try {
+                const result = await API.runMacroGroup(indices, filename);
+                if (result.success) {
+                    successCount = result.serials.length;
+                    totalDuration = result.duration_ms || 0;
+                    this.addFeed('active', `▶ Macro "${name}" → ${successCount} emulators (group ${result.group_id})`);
+                } else {
+                    this.addFeed('fail', `✗ Group failed: ${result.error}`);
+                }
+            } catch (e) {
+                this.addFeed('fail', `✗ Network error: ${e.message}`);
+            }
+        }
+        for (const idx of (indices.length > 1 ? [] : indices)) {
             try {
                 const result = await API.runMacro(idx, filename);
                 if (result.success) {
@@ -539,7 +554,8 @@ const TaskRunnerPage = {
     updateFromWS(event, data) {
         const dotMap = {
             task_started: 'active', task_progress: 'active', task_completed: 'done', task_failed: 'fail',
-            macro_started: 'active', macro_progress: 'active', macro_completed: 'done', macro_failed: 'fail'
+            macro_started: 'active', macro_progress: 'active', macro_completed: 'done', macro_failed: 'fail',
+            macro_stopped: 'done'
         };
 
         let msg = `[${data.serial || '?'}] `;
@@ -549,6 +565,7 @@ const TaskRunnerPage = {
             else if (event === 'macro_progress') msg += `Progress ${data.completed}/${data.total}`;
             else if (event === 'macro_completed') msg += `Completed in ${data.elapsed_ms}ms`;
             else if (event === 'macro_failed') msg += `Failed: ${data.error}`;
+            else if (event === 'macro_stopped') msg += `Stopped after ${data.completed} op(s)`;
         } else {
             msg += (data.step || data.status || event);
         }
@@ -12,12 +12,9 @@ window.GlobalStore = {
     },
 
     listeners: [],
-    _pollingTimer: null,
 
     init() {
         this._load();
-        if (this._pollingTimer) clearInterval(this._pollingTimer);
-        this._pollingTimer = setInterval(() => this._pollBackend(), 2000);
         if (this.state.activityLogs.length === 0) {
             this.addActivityLog('Select emulators → run actions to see progress here', 'active');
         }
@@ -80,9 +77,70 @@ window.GlobalStore = {
 
     // ── Tab ──
     setCurrentTab(tab) { this.state.currentTab = tab; this.notify(); },
-
-    // ── Backend Poll (stub) ──
-    async _pollBackend() { }
 };
 
 window.GlobalStore.init();
+
+/**
+ * Device Store — live device/instance state pushed by the backend over /ws.
+ * A `state_snapshot` replaces everything; each `state_delta` carries seq + 1
+ * and only the changed fields. A seq gap means a delta was missed, so the
+ * store asks the server for a fresh snapshot instead of guessing.
+ */
+window.DeviceStore = {
+    seq: 0,
+    synced: false,
+    devices: {},      // serial -> device view (same shape as /api/devices)
+    instances: {},    // index -> LDPlayer instance (same shape as /api/emulators/all)
+    listeners: [],
+
+    subscribe(cb) {
+        this.listeners.push(cb);
+        return () => { this.listeners = this.listeners.filter(l => l !== cb); };
+    },
+
+    _notify(change) {
+        this.listeners.forEach(cb => { try { cb(change); } catch (e) { console.error('DeviceStore listener error:', e); } });
+    },
+
+    deviceList() { return Object.values(this.devices); },
+    instanceList() { return Object.values(this.instances).sort((a, b) => a.index - b.index); },
+
+    applySnapshot(data) {
+        this.seq = data.seq;
+        this.synced = true;
+        this.devices = {};
+        (data.devices || []).forEach(d => { this.devices[d.serial] = d; });
+        this.instances = {};
+        (data.instances || []).forEach(i => { this.instances[i.index] = i; });
+        this._notify({ snapshot: true, devices: this.devices, instances: this.instances, removed: [] });
+    },
+
+    /** Returns false when the delta can't be applied (caller should resync). */
+    applyDelta(data) {
+        if (!this.synced || data.seq <= this.seq) return true;   // stale or pre-snapshot
+        if (data.seq !== this.seq + 1) return false;
+        this.seq = data.seq;
+
+        const merge = (target, changes) => {
+            Object.entries(changes || {}).forEach(([key, fields]) => {
+                target[key] = Object.assign(target[key] || {}, fields);
+            });
+        };
+        merge(this.devices, data.devices);
+        merge(this.instances, data.instances);
+        (data.removed || []).forEach(serial => delete this.devices[serial]);
+        (data.instances_removed || []).forEach(index => delete this.instances[index]);
+
+        this._notify({
+            snapshot: false,
+            devices: data.devices || {},
+            instances: data.instances || {},
+            removed: data.removed || [],
+            instancesRemoved: data.instances_removed || [],
+        });
+        return true;
+    },
+
+    reset() { this.synced = false; },
+};
@@ -0,0 +1,12 @@
+"""
+Simulator — Fake LDPlayer farm for running the backend without emulators.
+
+    python -m sim --devices 20 --dir .sim
+    COD_CONFIG=.sim/config.yaml python main.py
+
+Serves N devices behind a fake adb server (sim/adb_server.py) and
+ldconsole, with screens that follow the taps the backend sends
+(sim/screens.py), plus a stub of the OCR API (sim/ocr_stub.py).
+Latency and failure rates are SimOptions (sim/farm.py).
+Throughput benchmark on top of it: `python -m sim.bench` (sim/bench.py).
+"""
@@ -0,0 +1,58 @@
+"""
+Run the emulator farm simulator until Ctrl+C.
+
+    python -m sim [--devices N] [--dir DIR] [--options sim.yaml] [--set key=value ...]
+"""
+import argparse
+import time
+
+import yaml
+
+from sim.farm import SimOptions
+from sim.runner import SimFarm, write_environment
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog="python -m sim",
+                                     description="Fake LDPlayer farm + OCR API for the backend")
+    parser.add_argument("--devices", type=int, help="number of instances (default 4)")
+    parser.add_argument("--running", type=int, help="instances running at start (default all)")
+    parser.add_argument("--adb-port", type=int, help="fake adb server port (default 15037)")
+    parser.add_argument("--ocr-port", type=int, help="stub OCR API port (default 18080)")
+    parser.add_argument("--seed", type=int, help="seed for profiles and failure injection")
+    parser.add_argument("--dir", default=".sim",
+                        help="where to write wrappers and config.yaml (default .sim)")
+    parser.add_argument("--options", help="YAML file with SimOptions values")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="any SimOptions value, e.g. --set fail_rate=0.05")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    options = SimOptions()
+    if args.options:
+        with open(args.options, "r", encoding="utf-8") as f:
+            options.update(yaml.safe_load(f) or {})
+    for item in args.set:
+        key, _, value = item.partition("=")
+        options.update({key.strip(): value.strip()})
+    options.update({"devices": args.devices, "running": args.running,
+                    "adb_port": args.adb_port, "ocr_port": args.ocr_port, "seed": args.seed})
+
+    sim = SimFarm(options).start()
+    config_path = write_environment(args.dir, sim)
+    print(f"[Sim] {options.devices} devices, adb :{sim.adb_port}, OCR {sim.ocr_url}")
+    print(f"[Sim] Backend config: {config_path}")
+    print(f"[Sim] Run the app with:  COD_CONFIG={config_path} python main.py")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n[Sim] Stopping")
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+ADB Server — Fake adb server speaking the adb host protocol for a Farm.
+
+Requests are framed like the real server (4 hex digits length + payload,
+answered with OKAY / FAIL + frame), so both the sim client (sim/client.py,
+the `adb` the backend spawns) and DeviceWatcher's raw socket work:
+    host:version, host:kill, host:devices, host:devices-l
+    host:track-devices      pushes the device list on every change
+    host:transport:<serial> then one of
+        shell:<cmd>         run and stream output, close
+        shell:              interactive: one command line per input line
+        exec:<cmd>          same as shell:<cmd> (binary-safe anyway)
+    sim:ldconsole:<json argv>   ldconsole command, raw output
+    sim:stats               farm counters as JSON
+
+Latency and failure injection from SimOptions are applied per request.
+"""
+import asyncio
+import json
+import time
+
+ADB_VERSION = "0029"
+TRACK_INTERVAL = 0.2        # seconds between device list checks for trackers
+
+
+def _frame(text: str | bytes) -> bytes:
+    data = text.encode() if isinstance(text, str) else text
+    return b"%04x" % len(data) + data
+
+
+def _device_list(listed: dict, long: bool = False) -> str:
+    extra = " product:sim model:SimPad device:sim" if long else ""
+    return "".join(f"{serial}\t{state}{extra}\n" for serial, state in listed.items())
+
+
+class AdbServer:
+    """asyncio TCP server answering adb host requests from one Farm."""
+
+    def __init__(self, farm, host: str = "127.0.0.1", port: int = 5037):
+        self.farm = farm
+        self.host = host
+        self.port = port
+        self._server: asyncio.AbstractServer | None = None
+        self.requests = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        sock = self._server.sockets[0]
+        self.port = sock.getsockname()[1]
+        print(f"[SimADB] Listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _sleep(self, base: float):
+        delay = self.farm.latency(base)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # ── Connection handling ──
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await self._read_request(reader)
+            self.requests += 1
+            await self._dispatch(request, reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> str:
+        length = int(await reader.readexactly(4), 16)
+        return (await reader.readexactly(length)).decode("utf-8", errors="replace")
+
+    @staticmethod
+    async def _fail(writer: asyncio.StreamWriter, message: str):
+        writer.write(b"FAIL" + _frame(message))
+        await writer.drain()
+
+    async def _dispatch(self, request: str, reader, writer):
+        farm = self.farm
+        if request == "host:version":
+            writer.write(b"OKAY" + _frame(ADB_VERSION))
+        elif request == "host:kill":
+            writer.write(b"OKAY")
+        elif request in ("host:devices", "host:devices-l"):
+            await self._sleep(farm.options.latency)
+            listed = farm.device_list()
+            writer.write(b"OKAY" + _frame(_device_list(listed, request.endswith("-l"))))
+        elif request == "host:track-devices":
+            await self._track(writer)
+        elif request.startswith("host:transport:"):
+            await self._transport(request[len("host:transport:"):], reader, writer)
+        elif request == "host:transport-any":
+            online = [s for s, state in farm.device_list().items() if state == "device"]
+            await self._transport(online[0] if online else "", reader, writer)
+        elif request.startswith("sim:ldconsole:"):
+            await self._sleep(farm.options.ldconsole_latency)
+            output = farm.ldconsole(json.loads(request[len("sim:ldconsole:"):]))
+            writer.write(b"OKAY" + output.encode())
+        elif request == "sim:stats":
+            stats = {**farm.stats(), "adb_requests": self.requests}
+            writer.write(b"OKAY" + json.dumps(stats).encode())
+        else:
+            await self._fail(writer, f"unknown host service: {request}")
+        await writer.drain()
+
+    async def _track(self, writer: asyncio.StreamWriter):
+        writer.write(b"OKAY")
+        last = None
+        while True:
+            listed = self.farm.device_list()
+            if listed != last:
+                writer.write(_frame(_device_list(listed)))
+                await writer.drain()
+                last = listed
+            await asyncio.sleep(TRACK_INTERVAL)
+
+    async def _transport(self, serial: str, reader, writer):
+        farm = self.farm
+        device = farm.by_serial.get(serial)
+        await self._sleep(farm.options.latency)
+        if device is None or device.adb_state(time.monotonic()) is None:
+            return await self._fail(writer, f"device '{serial}' not found")
+        if device.adb_state(time.monotonic()) != "device" or farm.fails(farm.options.fail_rate):
+            device.stats["failures"] += 1
+            return await self._fail(writer, "device offline")
+        writer.write(b"OKAY")
+        await writer.drain()
+
+        service = await self._read_request(reader)
+        if service.startswith("shell:") and not service[len("shell:"):].strip():
+            writer.write(b"OKAY")
+            await writer.drain()
+            return await self._interactive(device, reader, writer)
+        for prefix in ("shell:", "exec:"):
+            if service.startswith(prefix):
+                command = service[len(prefix):]
+                break
+        else:
+            return await self._fail(writer, f"unsupported service: {service}")
+
+        writer.write(b"OKAY")
+        if "screencap" in command:
+            await self._sleep(farm.options.screencap_latency)
+            if farm.fails(farm.options.screencap_fail_rate):
+                device.stats["failures"] += 1
+                return
+        writer.write(device.shell(command, time.monotonic()))
+
+    async def _interactive(self, device, reader, writer):
+        """Long-lived `adb shell`: run each input line as it arrives."""
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", errors="replace").strip()
+            if command in ("exit", "logout"):
+                return
+            if command:
+                await self._sleep(self.farm.options.input_latency)
+                if device.adb_state(time.monotonic()) != "device":
+                    return  # dropped: the shell dies like on a real disconnect
+                writer.write(device.shell(command, time.monotonic()))
+                await writer.drain()
@@ -0,0 +1,457 @@
+"""
+Bench — Throughput benchmark of full scans and TaskQueue sweeps on the simulator.
+
+    python -m sim.bench run [--emulators 1,5,20,50] [--workload full_scan,task_queue]
+                            [--duration 60] [--wait-scale 0.05] [--set key=value ...]
+    python -m sim.bench compare bench_reports/old.json bench_reports/new.json
+
+For every (workload, emulator count) level a fresh simulated farm is started
+in this process (fake adb server + ldconsole, OCR API stub, Tesseract
+stand-in if Tesseract is missing) and the backend runs in a worker
+subprocess against it, so its CPU and memory are measured on their own:
+    full_scan    every emulator runs full_scan back to back
+    task_queue   every emulator keeps a PROFILE/RESOURCES/HALL/MARKET/PET
+                 sweep queued on the shared TaskQueue
+Each level reports throughput, per-stage latency percentiles
+(backend/metrics.py: navigation, capture, OCR, DB), backend and adb
+CPU time, memory, and the farm's counters. The JSON report carries the
+git commit and all settings, so two reports can be compared.
+
+--wait-scale multiplies the backend's fixed UI waits (config.wait_scale)
+and the OCR stub's job latency; adb latencies stay real. Compare only
+reports taken with the same settings.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import yaml
+
+try:
+    import psutil
+except ImportError:  # Optional: without it only CPU time / max RSS are reported
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage
+    resource = None
+
+from backend.config import PROJECT_ROOT
+
+WORKLOADS = ("full_scan", "task_queue")
+DEFAULT_LEVELS = "1,5,20,50"
+SAMPLE_INTERVAL = 0.5           # psutil sampling of the worker process
+DRAIN_TIMEOUT = 600             # seconds allowed after --duration for in-flight work
+REPORT_SCHEMA = 1
+
+# Stage keys (backend/metrics.py) reported as navigation / capture / ocr / db
+KEY_STAGES = {
+    "full_scan": {"navigation": "full_scan.navigation", "capture": "full_scan.capture",
+                  "ocr": "full_scan.ocr", "db": "full_scan.db"},
+    "task_queue": {"navigation": "task.navigation", "capture": "task.capture",
+                   "ocr": "task.ocr", "db": "db.update_task_run"},
+}
+
+
+# ──────────────────────────────────────────────
+# Worker (backend side, runs in a subprocess)
+# ──────────────────────────────────────────────
+
+def _rusage() -> dict | None:
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "backend_cpu_s": round(own.ru_utime + own.ru_stime, 2),
+        "backend_rss_max_mb": round(own.ru_maxrss * unit / 2**20, 1),
+        # adb / ldconsole / tesseract processes the backend spawned
+        "adb_cpu_s": round(children.ru_utime + children.ru_stime, 2),
+    }
+
+
+def _wait_devices(count: int, timeout: float = 30) -> list[str]:
+    from backend.core.emulator import emulator_manager
+    deadline = time.monotonic() + timeout
+    while True:
+        serials = [emu.serial for emu in emulator_manager.discover()]
+        if len(serials) >= count or time.monotonic() > deadline:
+            return serials
+        time.sleep(0.5)
+
+
+def _run_full_scans(count: int, duration: float) -> dict:
+    from backend.core import full_scan
+    deadline = time.monotonic() + duration
+    counts = {"completed": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def loop(index: int):
+        while time.monotonic() < deadline:
+            full_scan._scan_worker(index, f"LDPlayer-{index:02d}")
+            status = full_scan._running_scans.get(f"scan-{index}", {}).get("status")
+            with lock:
+                counts["completed" if status == "completed" else "failed"] += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + DRAIN_TIMEOUT)
+    elapsed = time.monotonic() - started
+    return {**counts, "elapsed_s": round(elapsed, 2),
+            "scans_per_hour": round(counts["completed"] / elapsed * 3600, 1)}
+
+
+def _run_task_queue(serials: list[str], duration: float) -> dict:
+    from backend.models.scan_result import TaskType
+    from backend.tasks.task_queue import task_queue
+    sweep = [TaskType.PROFILE, TaskType.RESOURCES, TaskType.HALL, TaskType.MARKET, TaskType.PET]
+    outstanding = {serial: 0 for serial in serials}
+    counts = {"completed": 0, "failed": 0, "sweeps": 0}
+    cond = threading.Condition()
+
+    def on_event(event: str, data: dict):
+        if event not in ("task_completed", "task_failed", "task_cancelled"):
+            return
+        with cond:
+            counts["completed" if event == "task_completed" else "failed"] += 1
+            outstanding[data["serial"]] -= 1
+            if outstanding[data["serial"]] == 0:
+                counts["sweeps"] += 1
+            cond.notify_all()
+
+    def submit(serial: str):
+        with cond:
+            outstanding[serial] += len(sweep)
+        for task_type in sweep:
+            task_queue.submit_task(serial, task_type)
+
+    task_queue.set_ws_callback(on_event)
+    started = time.monotonic()
+    deadline = started + duration
+    for serial in serials:
+        submit(serial)
+    while True:
+        with cond:
+            cond.wait(0.2)
+            idle = [s for s, n in outstanding.items() if n == 0]
+            now = time.monotonic()
+            if now >= deadline and len(idle) == len(serials):
+                break
+            if now > deadline + DRAIN_TIMEOUT:
+                break
+        if now < deadline:
+            for serial in idle:
+                submit(serial)
+    elapsed = time.monotonic() - started
+    return {**counts, "elapsed_s": round(elapsed, 2),
+            "tasks_per_hour": round(counts["completed"] / elapsed * 3600, 1),
+            "sweeps_per_hour": round(counts["sweeps"] / elapsed * 3600, 1)}
+
+
+def worker_main(args):
+    from backend.config import config
+    config.load(args.config)
+    from backend.core import full_scan
+    from backend.metrics import stage_metrics
+    from backend.storage.database import database
+    from backend.storage.db_writer import db_writer
+
+    database.init_sync()
+    db_writer.start()
+    # Keep scan captures in the run directory, not the project's data/
+    full_scan.WORK_DIR = os.path.join(config.work_dir, "scan_captures")
+    serials = _wait_devices(args.emulators)
+    stage_metrics.reset()
+
+    if args.workload == "full_scan":
+        result = _run_full_scans(len(serials), args.duration)
+    else:
+        result = _run_task_queue(serials, args.duration)
+    db_writer.flush()
+
+    result.update({"devices": len(serials), "stages": stage_metrics.snapshot(),
+                   "rusage": _rusage()})
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ──────────────────────────────────────────────
+# Orchestrator
+# ──────────────────────────────────────────────
+
+def _git(*args: str) -> str | None:
+    try:
+        out = subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True,
+                             text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def _environment() -> dict:
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    env = {
+        "git_commit": _git("rev-parse", "HEAD"),
+        "git_branch": _git("rev-parse", "--abbrev-ref", "HEAD"),
+        "git_dirty": bool(status) if status is not None else None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    if psutil is not None:
+        env["memory_total_mb"] = round(psutil.virtual_memory().total / 2**20)
+    return env
+
+
+def _sample(proc: subprocess.Popen) -> dict:
+    """CPU / RSS of the worker process tree and the host until it exits."""
+    if psutil is None:
+        proc.wait()
+        return {}
+    try:
+        worker = psutil.Process(proc.pid)
+        worker.cpu_percent(None)
+    except psutil.Error:
+        proc.wait()
+        return {}
+    psutil.cpu_percent(None)
+    cpu, rss, host_cpu, host_mem = [], [], [], []
+    while proc.poll() is None:
+        time.sleep(SAMPLE_INTERVAL)
+        try:
+            tree = [worker] + worker.children(recursive=True)
+            cpu.append(worker.cpu_percent(None))
+            rss.append(sum(p.memory_info().rss for p in tree if p.is_running()))
+        except psutil.Error:
+            continue
+        host_cpu.append(psutil.cpu_percent(None))
+        host_mem.append(psutil.virtual_memory().percent)
+    if not cpu:
+        return {}
+    return {
+        "backend_cpu_pct_mean": round(sum(cpu) / len(cpu), 1),
+        "backend_cpu_pct_max": round(max(cpu), 1),
+        "backend_tree_rss_max_mb": round(max(rss) / 2**20, 1),
+        "host_cpu_pct_mean": round(sum(host_cpu) / len(host_cpu), 1),
+        "host_cpu_pct_max": round(max(host_cpu), 1),
+        "host_mem_pct_max": round(max(host_mem), 1),
+    }
+
+
+def run_level(workload: str, emulators: int, args, sim_values: dict) -> dict:
+    from sim.farm import SimOptions
+    from sim.runner import SimFarm, write_environment
+
+    options = SimOptions()
+    options.update(sim_values)
+    if "ocr_latency" not in sim_values:
+        options.ocr_latency *= args.wait_scale
+    options.update({"devices": emulators, "adb_port": 0, "ocr_port": 0})
+
+    print(f"[Bench] {workload} x {emulators} emulators ({args.duration:g}s)...")
+    sim = SimFarm(options).start()
+    level = {"workload": workload, "emulators": emulators}
+    try:
+        with tempfile.TemporaryDirectory(prefix="cod-bench-") as tmp:
+            overrides = {"wait_scale": args.wait_scale, "retention_enabled": False}
+            overrides.update(args.backend)
+            config_path = write_environment(tmp, sim, overrides)
+            result_path = os.path.join(tmp, "result.json")
+            log_path = os.path.join(tmp, "worker.log")
+            cmd = [sys.executable, "-m", "sim.bench", "worker", workload,
+                   "--config", config_path, "--emulators", str(emulators),
+                   "--duration", str(args.duration), "--result", result_path]
+
+            farm_cpu = sum(os.times()[:2])
+            with open(log_path, "w", encoding="utf-8") as log:
+                proc = subprocess.Popen(cmd, cwd=PROJECT_ROOT, stdout=log,
+                                        stderr=subprocess.STDOUT,
+                                        env={**os.environ, "COD_CONFIG": config_path})
+                samples = _sample(proc)
+            farm_cpu = sum(os.times()[:2]) - farm_cpu
+
+            if proc.returncode != 0 or not os.path.exists(result_path):
+                with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+                    tail = f.readlines()[-20:]
+                level["error"] = f"worker exited with {proc.returncode}"
+                level["log_tail"] = [line.rstrip() for line in tail]
+                print(f"[Bench]   failed: {level['error']}")
+                return level
+            with open(result_path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+    finally:
+        farm_stats = sim.stats()
+        sim.stop()
+
+    stages = result.pop("stages")
+    rusage = result.pop("rusage", None) or {}
+    level.update(result)
+    level["key_stages"] = {name: stages.get(stage, {})
+                           for name, stage in KEY_STAGES[workload].items()}
+    level["stages"] = stages
+    level["resources"] = {**rusage, **samples, "farm_cpu_s": round(farm_cpu, 2)}
+    level["farm"] = {
+        "adb_requests": farm_stats["adb_requests"],
+        "ocr": farm_stats["ocr"],
+        **{key: sum(d[key] for d in farm_stats["devices"])
+           for key in ("commands", "taps", "screencaps", "failures")},
+    }
+    rate = level.get("scans_per_hour", level.get("sweeps_per_hour"))
+    print(f"[Bench]   {rate}/h  completed={level['completed']} failed={level['failed']}")
+    return level
+
+
+def _parse_sets(items: list[str]) -> dict:
+    values = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"expected key=value, got {item!r}")
+        values[key.strip()] = value.strip()
+    return values
+
+
+def run_main(args):
+    levels = [int(n) for n in args.emulators.split(",") if n.strip()]
+    workloads = [w.strip() for w in args.workload.split(",") if w.strip()]
+    for workload in workloads:
+        if workload not in WORKLOADS:
+            raise SystemExit(f"unknown workload {workload!r} (choose from {', '.join(WORKLOADS)})")
+    sim_values = _parse_sets(args.set)
+    # YAML scalars, as in config.yaml (8 -> int, true -> bool)
+    args.backend = {k: yaml.safe_load(v) for k, v in _parse_sets(args.backend_set).items()}
+
+    report = {
+        "schema": REPORT_SCHEMA,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "label": args.label,
+        "environment": _environment(),
+        "settings": {"duration_s": args.duration, "wait_scale": args.wait_scale,
+                     "sim": sim_values, "backend": args.backend},
+        "runs": [],
+    }
+    for workload in workloads:
+        for emulators in levels:
+            report["runs"].append(run_level(workload, emulators, args, sim_values))
+
+    os.makedirs(args.out, exist_ok=True)
+    commit = (report["environment"]["git_commit"] or "nogit")[:8]
+    name = f"bench-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path = os.path.join(args.out, name)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[Bench] Report: {path}")
+    _print_table(report)
+
+
+# ──────────────────────────────────────────────
+# Reporting
+# ──────────────────────────────────────────────
+
+def _throughput(run: dict) -> float | None:
+    return run.get("scans_per_hour", run.get("sweeps_per_hour"))
+
+
+def _print_table(report: dict):
+    print(f"\n{'workload':<11} {'emus':>4} {'per hour':>9} {'fail':>5} "
+          f"{'nav p95':>8} {'cap p95':>8} {'ocr p95':>8} {'db p95':>8} {'cpu s':>7} {'rss MB':>7}")
+    for run in report["runs"]:
+        if "error" in run:
+            print(f"{run['workload']:<11} {run['emulators']:>4}   {run['error']}")
+            continue
+        stages = run["key_stages"]
+        res = run["resources"]
+        print(f"{run['workload']:<11} {run['emulators']:>4} {_throughput(run):>9} "
+              f"{run['failed']:>5} "
+              + " ".join(f"{stages[s].get('p95_ms', 0):>8}" for s in ("navigation", "capture", "ocr", "db"))
+              + f" {res.get('backend_cpu_s', ''):>7} {res.get('backend_rss_max_mb', ''):>7}")
+
+
+def _pct(old, new) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare_main(args):
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    if base.get("settings") != new.get("settings"):
+        print("[Bench] Warning: reports were taken with different settings")
+    print(f"base {(base['environment']['git_commit'] or '?')[:8]}  ->  "
+          f"new {(new['environment']['git_commit'] or '?')[:8]}\n")
+
+    base_runs = {(r["workload"], r["emulators"]): r for r in base["runs"] if "error" not in r}
+    print(f"{'workload':<11} {'emus':>4} {'per hour':>20} {'nav p95':>9} {'cap p95':>9} "
+          f"{'ocr p95':>9} {'db p95':>9} {'cpu s':>9}")
+    for run in new["runs"]:
+        old = base_runs.get((run["workload"], run["emulators"]))
+        if old is None or "error" in run:
+            continue
+        cols = [f"{_throughput(old)} -> {_throughput(run)}"]
+        for stage in ("navigation", "capture", "ocr", "db"):
+            cols.append(_pct(old["key_stages"][stage].get("p95_ms"),
+                             run["key_stages"][stage].get("p95_ms", 0)))
+        cols.append(_pct(old["resources"].get("backend_cpu_s"),
+                         run["resources"].get("backend_cpu_s", 0)))
+        print(f"{run['workload']:<11} {run['emulators']:>4} {cols[0]:>20} "
+              + " ".join(f"{c:>9}" for c in cols[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m sim.bench",
+                                     description="Scan / TaskQueue throughput on the simulator")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the benchmark and write a JSON report")
+    run.add_argument("--emulators", default=DEFAULT_LEVELS,
+                     help=f"comma-separated emulator counts (default {DEFAULT_LEVELS})")
+    run.add_argument("--workload", default=",".join(WORKLOADS),
+                     help="full_scan, task_queue or both (default both)")
+    run.add_argument("--duration", type=float, default=60,
+                     help="seconds of new work per level (default 60)")
+    run.add_argument("--wait-scale", type=float, default=0.05,
+                     help="multiplier on fixed UI waits and OCR latency (default 0.05)")
+    run.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                     help="SimOptions value, e.g. --set latency=0.05")
+    run.add_argument("--backend-set", action="append", default=[], metavar="KEY=VALUE",
+                     help="backend config value, e.g. --backend-set task_workers=8")
+    run.add_argument("--out", default="bench_reports", help="report directory")
+    run.add_argument("--label", default="", help="free text stored in the report")
+
+    cmp = sub.add_parser("compare", help="compare two reports")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+
+    worker = sub.add_parser("worker")  # internal: one level, backend side
+    worker.add_argument("workload", choices=WORKLOADS)
+    worker.add_argument("--config", required=True)
+    worker.add_argument("--emulators", type=int, required=True)
+    worker.add_argument("--duration", type=float, required=True)
+    worker.add_argument("--result", required=True)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_main(args)
+    elif args.command == "compare":
+        compare_main(args)
+    else:
+        worker_main(args)
+
+
+if __name__ == "__main__":
+    main()
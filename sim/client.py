@@ -0,0 +1,205 @@
+"""
+Sim Client — `adb`, `ldconsole` and `tesseract` command lines for the simulator.
+
+The wrappers written by `python -m sim` call this script, so the backend
+runs it exactly where it would run adb.exe / ldconsole.exe / tesseract:
+    client.py --port 15037 adb [-s serial] <command> ...
+    client.py --port 15037 ldconsole <command> ...
+    client.py tesseract <image> <output base> [options] [txt]
+The tesseract stand-in (used when Tesseract is not installed) does no
+recognition: it writes a fixed number, so only the process cost remains.
+
+Standard library only and no package imports: it is started for every
+adb call, so startup time counts.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+
+
+def _connect(port: int) -> socket.socket:
+    try:
+        return socket.create_connection(("127.0.0.1", port), timeout=30)
+    except OSError:
+        sys.stderr.write("* cannot connect to the simulated adb server "
+                         f"on port {port} (is `python -m sim` running?)\n")
+        sys.exit(1)
+
+
+def _read_exact(sock: socket.socket, n: int) -> bytes:
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed by the adb server")
+        data += chunk
+    return data
+
+
+def _request(sock: socket.socket, request: str):
+    """Send one request; exits like adb on FAIL."""
+    data = request.encode()
+    sock.sendall(b"%04x" % len(data) + data)
+    status = _read_exact(sock, 4)
+    if status != b"OKAY":
+        message = _read_exact(sock, int(_read_exact(sock, 4), 16)).decode()
+        sys.stderr.write(f"error: {message}\n")
+        sys.exit(1)
+
+
+def _read_frame(sock: socket.socket) -> str:
+    return _read_exact(sock, int(_read_exact(sock, 4), 16)).decode()
+
+
+def _stream(sock: socket.socket, out):
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        out.write(chunk)
+    out.flush()
+
+
+def _host(port: int, request: str, framed: bool = True) -> str:
+    sock = _connect(port)
+    _request(sock, request)
+    if framed:
+        return _read_frame(sock)
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks).decode("utf-8", errors="replace")
+
+
+def _transport(port: int, serial: str | None) -> socket.socket:
+    sock = _connect(port)
+    _request(sock, f"host:transport:{serial}" if serial else "host:transport-any")
+    return sock
+
+
+def _interactive(sock: socket.socket):
+    """Forward stdin lines to an interactive device shell."""
+    def pump():
+        try:
+            for line in sys.stdin.buffer:
+                sock.sendall(line)
+        except OSError:
+            pass
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    threading.Thread(target=pump, daemon=True).start()
+    sock.settimeout(None)
+    _stream(sock, sys.stdout.buffer)
+
+
+def adb(port: int, args: list[str]) -> int:
+    serial = os.environ.get("ANDROID_SERIAL")
+    while args and args[0].startswith("-"):
+        flag = args.pop(0)
+        if flag in ("-s", "-P", "-H") and args:
+            value = args.pop(0)
+            if flag == "-s":
+                serial = value
+    if not args:
+        sys.stderr.write("usage: adb [-s serial] <command>\n")
+        return 1
+    cmd, rest = args[0], args[1:]
+
+    if cmd == "devices":
+        long = "-l" in rest
+        body = _host(port, "host:devices-l" if long else "host:devices")
+        sys.stdout.write("List of devices attached\n" + body + "\n")
+        return 0
+    if cmd == "start-server":
+        _host(port, "host:version")
+        return 0
+    if cmd == "kill-server":
+        return 0  # the simulator owns the server
+    if cmd == "version":
+        version = int(_host(port, "host:version"), 16)
+        sys.stdout.write(f"Android Debug Bridge version 1.0.{version}\n"
+                         "Version sim\n")
+        return 0
+    if cmd in ("get-state", "wait-for-device"):
+        sock = _transport(port, serial)
+        sock.close()
+        if cmd == "get-state":
+            sys.stdout.write("device\n")
+        return 0
+    if cmd in ("shell", "exec-out"):
+        sock = _transport(port, serial)
+        command = " ".join(rest)
+        if cmd == "shell" and not command:
+            _request(sock, "shell:")
+            _interactive(sock)
+            return 0
+        _request(sock, f"{'shell' if cmd == 'shell' else 'exec'}:{command}")
+        sock.settimeout(None)
+        _stream(sock, sys.stdout.buffer)
+        return 0
+    if cmd == "pull" and len(rest) >= 2:
+        sock = _transport(port, serial)
+        _request(sock, f"exec:cat {rest[0]}")
+        sock.settimeout(None)
+        with open(rest[1], "wb") as f:
+            _stream(sock, f)
+        if os.path.getsize(rest[1]) == 0:
+            os.remove(rest[1])
+            sys.stderr.write(f"adb: error: failed to stat remote object '{rest[0]}': "
+                             "No such file or directory\n")
+            return 1
+        sys.stdout.write(f"{rest[0]}: 1 file pulled.\n")
+        return 0
+    sys.stderr.write(f"adb: unsupported command in simulator: {cmd}\n")
+    return 1
+
+
+def ldconsole(port: int, args: list[str]) -> int:
+    output = _host(port, "sim:ldconsole:" + json.dumps(args), framed=False)
+    if output:
+        sys.stdout.write(output if output.endswith("\n") else output + "\n")
+    return 0
+
+
+def tesseract(args: list[str]) -> int:
+    if args[:1] == ["--version"]:
+        sys.stdout.write("tesseract 5.3.0 (simulator stand-in)\n")
+        return 0
+    if len(args) < 2:
+        sys.stderr.write("usage: tesseract imagename outputbase [options...]\n")
+        return 1
+    if args[1] in ("stdout", "-"):
+        sys.stdout.write("12345\n")
+        return 0
+    with open(args[1] + ".txt", "w", encoding="utf-8") as f:
+        f.write("12345\n")
+    return 0
+
+
+def main(argv: list[str]) -> int:
+    port = 5037
+    if argv[:1] == ["--port"]:
+        port, argv = int(argv[1]), argv[2:]
+    if not argv or argv[0] not in ("adb", "ldconsole", "tesseract"):
+        sys.stderr.write("usage: client.py [--port N] adb|ldconsole|tesseract <args>\n")
+        return 2
+    tool, args = argv[0], argv[1:]
+    if tool == "tesseract":
+        return tesseract(args)
+    try:
+        return adb(port, args) if tool == "adb" else ldconsole(port, args)
+    except ConnectionError as e:
+        sys.stderr.write(f"error: {e}\n")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
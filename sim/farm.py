@@ -0,0 +1,395 @@
+"""
+Farm — Simulated LDPlayer instances and their Android shells.
+
+A Farm owns N SimDevice objects (index i <-> serial emulator-<5554+2i>)
+and answers everything the backend asks adb / ldconsole:
+    - lifecycle: launch -> adb online after `boot_time` -> game loading
+      for `load_time` -> lobby; quit; random disconnects
+    - shell: input tap/swipe/keyevent, screencap, getevent/sendevent,
+      wm size/density, getprop, dumpsys, clipper broadcasts, monkey
+    - ldconsole: list2, launch, quit, operatelist/info/record
+
+All state lives on the farm's event loop thread; latency and failure
+injection are applied by the adb server (sim/adb_server.py) around calls.
+"""
+import json
+import random
+import shlex
+import time
+
+from sim.screens import (
+    COPY_ID_TAP, REFERENCE_SIZE, ScreenRenderer, build_graph, load_coordinate_map,
+)
+
+GAME_PACKAGE = "com.sim.cod"
+TOUCH_DEVICE = "/dev/input/event2"
+TOUCH_MAX = (32767, 32767)      # ABS_MT_POSITION_X/Y max reported by getevent
+
+# Linux input event codes (see backend/core/touch_injector.py)
+EV_KEY, EV_ABS = 1, 3
+BTN_TOUCH = 330
+ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TRACKING_ID = 53, 54, 57
+KEYCODE_BACK = {"4", "KEYCODE_BACK"}
+
+
+class SimOptions:
+    """Farm knobs; every value can be overridden from the CLI or a YAML file."""
+
+    DEFAULTS = {
+        "devices": 4,               # instances in the farm
+        "running": None,            # instances running at start (None = all)
+        "resolution": "960x540",
+        "coordinate_map": "960x540_v1",
+        "seed": 1,
+        "host": "127.0.0.1",
+        "adb_port": 15037,          # fake adb server (set as adb_server_port)
+        "ocr_port": 18080,          # stub OCR API
+        # Timing (seconds)
+        "boot_time": 6.0,           # ldconsole launch -> adb "device"
+        "load_time": 4.0,           # game start -> lobby
+        "latency": 0.02,            # per adb request
+        "jitter": 0.01,             # +/- uniform on every latency
+        "screencap_latency": 0.08,  # extra per screencap
+        "input_latency": 0.004,     # per command on an interactive shell
+        "ldconsole_latency": 0.05,
+        "ocr_latency": 2.0,         # OCR job submit -> completed
+        # Failure injection (probabilities)
+        "fail_rate": 0.0,           # adb request fails ("device offline")
+        "screencap_fail_rate": 0.0, # screencap returns nothing
+        "disconnect_rate": 0.0,     # per device per minute: drops off adb
+        "disconnect_time": 5.0,     # seconds offline after a drop
+        "ocr_fail_rate": 0.0,       # OCR job ends "failed"
+        "ocr_429_rate": 0.0,        # OCR request rejected with 429
+    }
+
+    def __init__(self, **overrides):
+        for key, value in self.DEFAULTS.items():
+            setattr(self, key, value)
+        self.update(overrides)
+
+    def update(self, values: dict):
+        for key, value in values.items():
+            if key not in self.DEFAULTS:
+                raise KeyError(f"Unknown simulator option: {key}")
+            if value is not None:
+                default = self.DEFAULTS[key]
+                setattr(self, key, type(default)(value) if default is not None else int(value))
+
+    @property
+    def size(self) -> tuple[int, int]:
+        w, h = self.resolution.lower().split("x")
+        return int(w), int(h)
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.DEFAULTS}
+
+
+def _profile(rng: random.Random, index: int) -> dict:
+    """Deterministic account data for one device."""
+    def res():
+        total = rng.randint(5, 900) * 1_000_000 + rng.randint(0, 999_999)
+        return [rng.randint(total // 4, total // 2), total]
+
+    return {
+        "game_id": str(rng.randint(10_000_000, 99_999_999)),
+        "lord_name": f"SimLord{index:03d}",
+        "power": rng.randint(1_000_000, 60_000_000),
+        "hall_level": rng.randint(8, 25),
+        "market_level": rng.randint(8, 25),
+        "pet_token": rng.randint(10, 20_000),
+        "resources": {name: res() for name in ("gold", "wood", "ore", "mana")},
+    }
+
+
+class SimDevice:
+    """One simulated LDPlayer instance."""
+
+    def __init__(self, farm, index: int, profile: dict):
+        self.farm = farm
+        self.index = index
+        self.name = f"LDPlayer-{index:02d}" if index else "LDPlayer"
+        self.serial = f"emulator-{5554 + index * 2}"
+        self.profile = profile
+        self.profile_version = 0
+        self.lobby_variant = index % 3 == 2     # OUT_CITY lobby for every third
+        self.running = False
+        self.online_at = 0.0        # time.monotonic() adb sees the device
+        self.game_at = None         # game start (None = not running)
+        self.package = GAME_PACKAGE
+        self.offline_until = 0.0
+        self.node = farm.graph
+        self.clipboard = ""
+        self.files: dict[str, bytes] = {}
+        self.touch = {"x": 0, "y": 0, "down": False, "start": None}
+        self.stats = {"commands": 0, "taps": 0, "swipes": 0, "backs": 0,
+                      "screencaps": 0, "failures": 0}
+
+    # ── Lifecycle ──
+
+    def launch(self, now: float, boot_time: float):
+        if self.running:
+            return
+        self.running = True
+        self.online_at = now + boot_time
+        self.start_game(self.online_at)
+
+    def quit(self):
+        self.running = False
+        self.game_at = None
+        self.node = self.farm.graph
+        self.touch["down"] = False
+
+    def start_game(self, at: float, package: str = GAME_PACKAGE):
+        self.package = package
+        self.game_at = at
+        self.node = self.farm.graph
+
+    def adb_state(self, now: float) -> str | None:
+        """State in `adb devices` (None = not listed)."""
+        if not self.running or now < self.online_at:
+            return None
+        if now < self.offline_until:
+            return "offline"
+        return "device"
+
+    def screen(self, now: float) -> str:
+        if self.game_at is None or now < self.game_at:
+            return "home"
+        if now < self.game_at + self.farm.options.load_time:
+            return "loading"
+        return self.node.screen
+
+    # ── Input ──
+
+    def _in_game(self, now: float) -> bool:
+        return self.screen(now) not in ("home", "loading")
+
+    def tap(self, x: int, y: int, now: float):
+        self.stats["taps"] += 1
+        if not self._in_game(now):
+            return
+        w, h = self.farm.options.size
+        rx, ry = x * REFERENCE_SIZE[0] / w, y * REFERENCE_SIZE[1] / h
+        if self.node.screen == "profile_menu" and \
+                abs(rx - COPY_ID_TAP[0]) <= 12 and abs(ry - COPY_ID_TAP[1]) <= 12:
+            self.clipboard = self.profile["game_id"]
+            return
+        child = self.node.child_at(rx, ry)
+        if child is not None:
+            self.node = child
+
+    def back(self, now: float):
+        self.stats["backs"] += 1
+        if self._in_game(now):
+            self.node = self.node.back(self.farm.graph)
+
+    def sendevent(self, ev_type: int, code: int, value: int, now: float):
+        """Follow raw touch frames; a short press with little travel is a tap."""
+        w, h = self.farm.options.size
+        t = self.touch
+        if ev_type == EV_ABS and code == ABS_MT_POSITION_X:
+            t["x"] = value * (w - 1) // TOUCH_MAX[0]
+        elif ev_type == EV_ABS and code == ABS_MT_POSITION_Y:
+            t["y"] = value * (h - 1) // TOUCH_MAX[1]
+        elif ev_type == EV_KEY and code == BTN_TOUCH:
+            if value and not t["down"]:
+                t["down"], t["start"] = True, (t["x"], t["y"])
+            elif not value and t["down"]:
+                t["down"] = False
+                sx, sy = t["start"]
+                if abs(t["x"] - sx) <= 10 and abs(t["y"] - sy) <= 10:
+                    self.tap(t["x"], t["y"], now)
+                else:
+                    self.stats["swipes"] += 1
+
+    # ── Shell ──
+
+    def shell(self, command: str, now: float) -> bytes:
+        """Run a `sh -c`-style line (commands separated by ';')."""
+        out = []
+        for part in command.split(";"):
+            part = part.split("|", 1)[0].strip()     # "dumpsys x | grep y": output is pre-filtered
+            if not part:
+                continue
+            try:
+                args = shlex.split(part)
+            except ValueError:
+                args = part.split()
+            self.stats["commands"] += 1
+            out.append(self._run(args, now))
+        return b"".join(out)
+
+    def _run(self, args: list[str], now: float) -> bytes:
+        cmd, rest = args[0], args[1:]
+        w, h = self.farm.options.size
+        if cmd == "echo":
+            return (" ".join(rest) + "\n").encode()
+        if cmd == "input" and rest:
+            if rest[0] == "tap" and len(rest) >= 3:
+                self.tap(int(float(rest[1])), int(float(rest[2])), now)
+            elif rest[0] == "swipe":
+                self.stats["swipes"] += 1
+            elif rest[0] == "keyevent" and rest[1:2] and rest[1] in KEYCODE_BACK:
+                self.back(now)
+            return b""
+        if cmd == "sendevent" and len(rest) == 4:
+            self.sendevent(int(rest[1]), int(rest[2]), int(rest[3]), now)
+            return b""
+        if cmd == "screencap":
+            self.stats["screencaps"] += 1
+            png = self.farm.renderer.render(self.screen(now), self)
+            paths = [a for a in rest if not a.startswith("-")]
+            if paths:
+                self.files[paths[0]] = png
+                return b""
+            return png
+        if cmd == "cat" and rest:
+            return self.files.get(rest[0], b"")
+        if cmd == "rm":
+            for path in rest:
+                self.files.pop(path, None)
+            return b""
+        if cmd == "getprop":
+            props = {"sys.boot_completed": "1", "ro.product.model": "SimPad",
+                     "ro.build.version.sdk": "28"}
+            return (props.get(rest[0], "") + "\n").encode() if rest else b""
+        if cmd == "wm" and rest:
+            if rest[0] == "size":
+                return f"Physical size: {w}x{h}\n".encode()
+            if rest[0] == "density":
+                return b"Physical density: 240\n"
+        if cmd == "dumpsys" and rest:
+            if rest[0] == "input":
+                return b"      SurfaceOrientation: 0\n"
+            if rest[0] == "window":
+                focus = self.package if self._in_game(now) or self.screen(now) == "loading" \
+                    else "com.android.launcher3"
+                return f"  mCurrentFocus=Window{{1 u0 {focus}/.MainActivity}}\n".encode()
+        if cmd == "getevent" and "-pl" in rest:
+            return (
+                f"add device 1: {TOUCH_DEVICE}\n"
+                f'  name:     "sim-touchscreen"\n'
+                f"  events:\n"
+                f"    ABS (0003): ABS_MT_SLOT           : value 0, min 0, max 9, fuzz 0, flat 0, resolution 0\n"
+                f"                ABS_MT_POSITION_X     : value 0, min 0, max {TOUCH_MAX[0]}, fuzz 0, flat 0, resolution 0\n"
+                f"                ABS_MT_POSITION_Y     : value 0, min 0, max {TOUCH_MAX[1]}, fuzz 0, flat 0, resolution 0\n"
+                f"                ABS_MT_TRACKING_ID    : value 0, min 0, max 65535, fuzz 0, flat 0, resolution 0\n"
+            ).encode()
+        if cmd == "am" and rest[:3] == ["broadcast", "-a", "clipper.get"]:
+            return (f"Broadcasting: Intent {{ act=clipper.get flg=0x400000 }}\n"
+                    f'Broadcast completed: result=-1, data="{self.clipboard}"\n').encode()
+        if cmd == "monkey" and "-p" in rest:
+            package = rest[rest.index("-p") + 1]
+            if self.game_at is None or package != self.package:
+                self.start_game(now, package)
+            return b"Events injected: 1\n"
+        if cmd == "am" and rest[:1] == ["force-stop"]:
+            self.game_at = None
+            return b""
+        return b""
+
+
+class Farm:
+    """All simulated devices plus the shared screen graph and renderer."""
+
+    def __init__(self, options: SimOptions):
+        self.options = options
+        cmap = load_coordinate_map(options.coordinate_map)
+        self.graph = build_graph(cmap)
+        self.renderer = ScreenRenderer(cmap, options.size)
+        self.rng = random.Random(options.seed)
+        self.devices = [SimDevice(self, i, _profile(random.Random(options.seed * 100_003 + i), i))
+                        for i in range(options.devices)]
+        self.by_serial = {d.serial: d for d in self.devices}
+        running = options.devices if options.running is None else options.running
+        now = time.monotonic()
+        for device in self.devices[:running]:
+            # Already booted, game in the lobby
+            device.launch(now - 3600, 0)
+        self.started_at = now
+
+    # ── adb view ──
+
+    def device_list(self, now: float = None) -> dict[str, str]:
+        now = time.monotonic() if now is None else now
+        listed = {}
+        for device in self.devices:
+            state = device.adb_state(now)
+            if state:
+                listed[device.serial] = state
+        return listed
+
+    def tick(self, dt: float):
+        """Advance random disconnects by dt seconds."""
+        rate = self.options.disconnect_rate
+        if rate <= 0:
+            return
+        now = time.monotonic()
+        for device in self.devices:
+            if device.adb_state(now) == "device" and self.rng.random() < rate * dt / 60:
+                device.offline_until = now + self.options.disconnect_time
+                device.stats["failures"] += 1
+
+    def latency(self, base: float) -> float:
+        jitter = self.options.jitter
+        return max(0.0, base + (self.rng.uniform(-jitter, jitter) if jitter else 0.0))
+
+    def fails(self, rate: float) -> bool:
+        return rate > 0 and self.rng.random() < rate
+
+    # ── ldconsole ──
+
+    def ldconsole(self, args: list[str]) -> str:
+        now = time.monotonic()
+        cmd = args[0] if args else ""
+        opts = {args[i].lstrip("-"): args[i + 1] for i in range(1, len(args) - 1)
+                if args[i].startswith("--")}
+        device = None
+        if "index" in opts:
+            try:
+                device = self.devices[int(opts["index"])]
+            except (ValueError, IndexError):
+                return "player don't exist!"
+
+        if cmd == "list2":
+            w, h = self.options.size
+            lines = []
+            for d in self.devices:
+                on = d.running
+                lines.append(f"{d.index},{d.name},{1000 + d.index if on else 0},"
+                             f"{2000 + d.index if on else 0},{1 if on else 0},"
+                             f"{30000 + d.index if on else -1},{40000 + d.index if on else -1},"
+                             f"{w},{h},240")
+            return "\n".join(lines)
+        if cmd in ("launch", "reboot") and device:
+            if cmd == "reboot":
+                device.quit()
+            device.launch(now, self.options.boot_time)
+            return ""
+        if cmd == "quit" and device:
+            device.quit()
+            return ""
+        if cmd == "quitall":
+            for d in self.devices:
+                d.quit()
+            return ""
+        if cmd == "isrunning" and device:
+            return "running" if device.running else "stop"
+        if cmd == "operatelist":
+            return json.dumps([])
+        if cmd == "operateinfo":
+            return json.dumps({})
+        if cmd == "operaterecord" and device:
+            return json.dumps({"code": 0 if device.running else -1})
+        return ""
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "uptime": round(now - self.started_at, 1),
+            "devices": [
+                {"index": d.index, "serial": d.serial, "state": d.adb_state(now),
+                 "screen": d.screen(now), **d.stats}
+                for d in self.devices
+            ],
+        }
@@ -0,0 +1,224 @@
+"""
+OCR Stub — Local stand-in for the ocrapi.cloud job API.
+
+Implements the two calls backend/core/ocr_client.py makes:
+    POST {base}/jobs          multipart "file_upload" -> {"job_id", "status"}
+    GET  {base}/jobs/{id}     "processing" until `ocr_latency` has passed,
+                              then "completed" with pages[].results.text
+                              (or "failed" with probability ocr_fail_rate)
+Any request may be answered 429 with probability ocr_429_rate.
+
+The result is the markdown the real API returns for a full-scan PDF. The
+device is identified by the marker sim/screens.py draws on the resources
+screen (top crop of the PDF), so the text carries that device's values;
+PDFs without a readable marker get values derived from their hash.
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sim.screens import MARKER_BAR, MARKER_BITS, MARKER_HEIGHT, MARKER_ORIGIN, \
+    decode_marker, short_number
+
+# backend/core/screen_capture.py: resources_area crop, PDF canvas upscale
+RESOURCES_CROP_ORIGIN = (300, 150)
+PDF_SCALE = 4
+
+
+# ──────────────────────────────────────────────
+# PDF -> device
+# ──────────────────────────────────────────────
+
+def _pdf_image(pdf: bytes):
+    """First embedded JPEG of a Pillow-written PDF as a grayscale image."""
+    from PIL import Image
+    start = pdf.find(b"\xff\xd8")
+    end = pdf.rfind(b"\xff\xd9")
+    if start < 0 or end < start:
+        return None
+    try:
+        return Image.open(io.BytesIO(pdf[start:end + 2])).convert("L")
+    except OSError:
+        return None
+
+
+def read_marker(pdf: bytes) -> int | None:
+    """Device index encoded on the resources crop (None if unreadable)."""
+    img = _pdf_image(pdf)
+    if img is None:
+        return None
+    x0 = (MARKER_ORIGIN[0] - RESOURCES_CROP_ORIGIN[0]) * PDF_SCALE
+    y = (MARKER_ORIGIN[1] - RESOURCES_CROP_ORIGIN[1] + MARKER_HEIGHT // 2) * PDF_SCALE
+    if y >= img.height:
+        return None
+    bits = []
+    for i in range(MARKER_BITS):
+        x = x0 + int((i + 0.5) * MARKER_BAR * PDF_SCALE)
+        if x >= img.width:
+            return None
+        bits.append(1 if img.getpixel((x, y)) < 128 else 0)
+    return decode_marker(bits)
+
+
+def scan_markdown(profile: dict) -> str:
+    """Markdown in the layout ocr_client.parse_scan_markdown() expects."""
+    lines = []
+    for res in ("gold", "wood", "ore", "mana"):
+        bag, total = profile["resources"][res]
+        lines += [res.capitalize(), short_number(bag), short_number(total)]
+    lines += [
+        "Lord", profile["lord_name"],
+        "Power", f"{profile['power']:,}",
+        "HALLOFORDER", f"Level{profile['hall_level']}",
+        "BAZAAR", f"Level{profile['market_level']}",
+        f"{profile['pet_token']:,}",
+    ]
+    return "\n".join(lines)
+
+
+def _hash_profile(pdf: bytes) -> dict:
+    rng = random.Random(hashlib.sha1(pdf).hexdigest())
+    total = rng.randint(5, 900) * 1_000_000
+    return {
+        "lord_name": f"Unknown{rng.randint(0, 9999):04d}",
+        "power": rng.randint(1_000_000, 60_000_000),
+        "hall_level": rng.randint(8, 25),
+        "market_level": rng.randint(8, 25),
+        "pet_token": rng.randint(10, 20_000),
+        "resources": {r: [total // 2, total] for r in ("gold", "wood", "ore", "mana")},
+    }
+
+
+# ──────────────────────────────────────────────
+# HTTP server
+# ──────────────────────────────────────────────
+
+class OcrStub:
+    """Threaded HTTP server holding OCR jobs in memory."""
+
+    def __init__(self, farm, host: str = "127.0.0.1", port: int = 18080):
+        self.farm = farm
+        self.jobs: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.counts = {"submitted": 0, "completed": 0, "failed": 0,
+                       "rejected": 0, "unmarked": 0}
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="sim-ocr", daemon=True)
+        self._thread.start()
+        print(f"[SimOCR] Listening on http://{self.host}:{self.port}/api/v1")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _chance(self, rate: float) -> bool:
+        with self.lock:
+            return self.farm.fails(rate)
+
+    def submit(self, pdf: bytes) -> str:
+        index = read_marker(pdf)
+        if index is not None and index < len(self.farm.devices):
+            profile = self.farm.devices[index].profile
+        else:
+            profile = _hash_profile(pdf)
+            self.counts["unmarked"] += 1
+        options = self.farm.options
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.counts["submitted"] += 1
+            self.jobs[job_id] = {
+                "ready_at": time.monotonic() + self.farm.latency(options.ocr_latency),
+                "failed": self.farm.fails(options.ocr_fail_rate),
+                "text": scan_markdown(profile),
+            }
+        return job_id
+
+    def status(self, job_id: str) -> dict | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if time.monotonic() < job["ready_at"]:
+            return {"job_id": job_id, "status": "processing"}
+        with self.lock:
+            self.jobs.pop(job_id, None)
+            self.counts["failed" if job["failed"] else "completed"] += 1
+        if job["failed"]:
+            return {"job_id": job_id, "status": "failed", "error": "simulated OCR failure"}
+        return {"job_id": job_id, "status": "completed",
+                "pages": [{"page": 1, "results": {"text": job["text"]}}]}
+
+
+def _file_field(content_type: str, body: bytes) -> bytes | None:
+    """Content of the "file_upload" part of a multipart/form-data body."""
+    message = BytesParser().parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    if not message.is_multipart():
+        return None
+    for part in message.get_payload():
+        if part.get_param("name", header="content-disposition") == "file_upload":
+            return part.get_payload(decode=True)
+    return None
+
+
+def _make_handler(stub: OcrStub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, code: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _rejected(self) -> bool:
+            if stub._chance(stub.farm.options.ocr_429_rate):
+                stub.counts["rejected"] += 1
+                self._send(429, {"error": "rate limited"})
+                return True
+            return False
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            if not self.path.rstrip("/").endswith("/jobs"):
+                return self._send(404, {"error": "not found"})
+            if self._rejected():
+                return
+            pdf = _file_field(self.headers.get("Content-Type", ""), body)
+            if not pdf:
+                return self._send(400, {"error": "file_upload is required"})
+            self._send(202, {"job_id": stub.submit(pdf), "status": "queued"})
+
+        def do_GET(self):
+            match = re.search(r"/jobs/([0-9a-f]+)$", self.path.split("?", 1)[0])
+            if self.path.split("?", 1)[0].endswith("/stats"):
+                return self._send(200, stub.counts)
+            if not match:
+                return self._send(404, {"error": "not found"})
+            if self._rejected():
+                return
+            job = stub.status(match.group(1))
+            if job is None:
+                return self._send(404, {"error": "job not found"})
+            self._send(200, job)
+
+    return Handler
@@ -0,0 +1,177 @@
+"""
+Runner — Start a simulated farm in-process and point a backend config at it.
+
+SimFarm runs the Farm, its adb server (on a private event loop thread)
+and the OCR stub. write_environment() lays out what the backend needs to
+use them instead of LDPlayer:
+    <dir>/bin/adb, <dir>/bin/ldconsole   wrappers around sim/client.py
+    <dir>/bin/tesseract                  stand-in if Tesseract is missing
+    <dir>/bin/vms/operationRecords/      macro .record files
+    <dir>/api_keys.txt                   key for the OCR stub
+    <dir>/config.yaml                    the repo config with adb_path,
+                                         ldconsole_path, ports, OCR URL,
+                                         db and work dirs overridden
+Start the app with COD_CONFIG=<dir>/config.yaml to run against it.
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import yaml
+
+from backend.config import CONFIG_PATH, PROJECT_ROOT
+from sim.adb_server import AdbServer
+from sim.farm import Farm, SimOptions
+from sim.ocr_stub import OcrStub
+
+TICK_INTERVAL = 1.0
+CLIENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "client.py")
+
+# Sample macro: two taps on the lobby profile button (the first opens the
+# profile menu); .record coordinates are 20x the 960x540 pixel position
+_TAP = {"x": 25 * 20, "y": 25 * 20}
+SAMPLE_RECORD = {
+    "operations": [
+        {"timing": 500, "operationId": "PutMultiTouch", "points": [{"id": 1, **_TAP, "state": 1}]},
+        {"timing": 560, "operationId": "PutMultiTouch", "points": [{"id": 1, **_TAP, "state": 0}]},
+        {"timing": 2000, "operationId": "PutMultiTouch", "points": [{"id": 1, **_TAP, "state": 1}]},
+        {"timing": 2060, "operationId": "PutMultiTouch", "points": [{"id": 1, **_TAP, "state": 0}]},
+    ],
+    "recordInfo": {"loopType": 0, "loopTimes": 1, "circleDuration": 2060,
+                   "resolutionWidth": 960, "resolutionHeight": 540},
+}
+
+
+class SimFarm:
+    """A Farm served over adb + HTTP from background threads."""
+
+    def __init__(self, options: SimOptions = None):
+        self.options = options or SimOptions()
+        self.farm = Farm(self.options)
+        self.adb = AdbServer(self.farm, self.options.host, self.options.adb_port)
+        self.ocr = OcrStub(self.farm, self.options.host, self.options.ocr_port)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._ready = threading.Event()
+        self._error: BaseException | None = None
+
+    @property
+    def adb_port(self) -> int:
+        return self.adb.port
+
+    @property
+    def ocr_url(self) -> str:
+        return f"http://{self.ocr.host}:{self.ocr.port}/api/v1"
+
+    def start(self, timeout: float = 10) -> "SimFarm":
+        self._thread = threading.Thread(target=self._run, name="sim-farm", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("simulated adb server did not start")
+        if self._error:
+            raise self._error
+        self.ocr.start()
+        return self
+
+    def stop(self):
+        self.ocr.stop()
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {**self.farm.stats(), "adb_requests": self.adb.requests,
+                "ocr": dict(self.ocr.counts)}
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        self._loop = loop
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.adb.start())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        loop.create_task(self._ticker())
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            # Ticker and open connections (trackers, interactive shells)
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(self.adb.stop())
+            loop.close()
+
+    async def _ticker(self):
+        while True:
+            await asyncio.sleep(TICK_INTERVAL)
+            self.farm.tick(TICK_INTERVAL)
+
+
+# ──────────────────────────────────────────────
+# Backend environment
+# ──────────────────────────────────────────────
+
+def _write_wrapper(bin_dir: str, tool: str, port: int) -> str:
+    if os.name == "nt":
+        path = os.path.join(bin_dir, f"{tool}.cmd")
+        body = f'@"{sys.executable}" -S "{CLIENT_SCRIPT}" --port {port} {tool} %*\r\n'
+    else:
+        path = os.path.join(bin_dir, tool)
+        body = f'#!/bin/sh\nexec "{sys.executable}" -S "{CLIENT_SCRIPT}" --port {port} {tool} "$@"\n'
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+    os.chmod(path, 0o755)
+    return path
+
+
+def write_environment(directory: str, sim: SimFarm, overrides: dict = None) -> str:
+    """Write wrappers, keys and a backend config for `sim`; returns the config path."""
+    directory = os.path.abspath(directory)
+    bin_dir = os.path.join(directory, "bin")
+    records_dir = os.path.join(bin_dir, "vms", "operationRecords")
+    work_dir = os.path.join(directory, "work")
+    for path in (records_dir, work_dir, os.path.join(directory, "data")):
+        os.makedirs(path, exist_ok=True)
+
+    adb_path = _write_wrapper(bin_dir, "adb", sim.adb_port)
+    ldconsole_path = _write_wrapper(bin_dir, "ldconsole", sim.adb_port)
+    tesseract_path = shutil.which("tesseract") or _write_wrapper(bin_dir, "tesseract", sim.adb_port)
+    with open(os.path.join(records_dir, "sim_profile_tap.record"), "w", encoding="utf-8") as f:
+        json.dump(SAMPLE_RECORD, f)
+    keys_file = os.path.join(directory, "api_keys.txt")
+    with open(keys_file, "w", encoding="utf-8") as f:
+        f.write("# Simulated OCR API\nsim-key-0000000001\n")
+
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    data.update({
+        "adb_path": adb_path,
+        "ldconsole_path": ldconsole_path,
+        "adb_server_host": sim.options.host,
+        "adb_server_port": sim.adb_port,
+        "ocr_api_url": sim.ocr_url,
+        "api_keys_file": keys_file,
+        "resolution": sim.options.resolution,
+        "coordinate_map": sim.options.coordinate_map,
+        "db_path": os.path.join(directory, "data", "cod_manager.db"),
+        "work_dir": work_dir,
+        "tesseract_path": tesseract_path,
+    })
+    data.update(overrides or {})
+    config_path = os.path.join(directory, "config.yaml")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write(f"# Generated by `python -m sim` at {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"# Project: {PROJECT_ROOT}\n")
+        yaml.safe_dump(data, f, sort_keys=False)
+    return config_path
@@ -0,0 +1,281 @@
+"""
+Screens — Tap-driven screen graph and canned screenshots for simulated devices.
+
+The graph is built from the same navigation data the backend drives the
+game with, so every route the app taps through leads somewhere sensible:
+    - data/coordinate_maps/<map>.json "navigation" (TaskQueue / Navigator)
+    - backend.core.screen_capture.NAVIGATION (full scan capture phases)
+    - the workflow profile route (core_actions: tap 25,25 -> profile menu)
+
+Each route is a chain of tap nodes hanging off the lobby. The last
+`exit_backs` taps of a route each open one level, so pressing BACK that
+many times returns to the lobby exactly like the app expects; unknown
+taps and swipes leave the screen unchanged.
+
+Screenshots are rendered with Pillow: lobby / loading / profile-menu
+screens embed the workflow templates (so GameStateDetector matches them),
+data screens draw the device's values into the coordinate-map regions
+(light text on dark panels, like the game) for the Tesseract path.
+"""
+import io
+import json
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+from backend.config import PROJECT_ROOT
+
+TEMPLATES_DIR = PROJECT_ROOT / "backend" / "core" / "workflow" / "templates"
+REFERENCE_SIZE = (960, 540)     # Coordinate maps and routes use this resolution
+TAP_SLOP = 12                   # px (reference resolution) a tap may miss a target by
+
+# Workflow actions (backend/core/workflow/core_actions.py)
+PROFILE_MENU_TAP = (25, 25)
+COPY_ID_TAP = (425, 200)
+
+# Device id barcode on the resources screen, read back by the OCR stub
+# (resources is the first and widest crop of the full-scan PDF)
+MARKER_BITS = 16                # 12-bit device index + 4-bit check
+MARKER_ORIGIN = (304, 384)      # screen px, left of every resource region
+MARKER_BAR = 3                  # px per bit
+MARKER_HEIGHT = 14
+
+
+# ──────────────────────────────────────────────
+# Screen graph
+# ──────────────────────────────────────────────
+
+class Node:
+    """One screen reachable by a chain of taps from the lobby."""
+
+    def __init__(self, screen: str, depth: int, parent=None, tap=None):
+        self.screen = screen
+        self.depth = depth          # BACK presses needed to return to the lobby
+        self.parent = parent
+        self.tap = tap              # (x, y) that leads here from the parent
+        self.children: list[Node] = []
+
+    def child_at(self, x: int, y: int):
+        """Child whose tap target is nearest to (x, y), within TAP_SLOP."""
+        best, best_d = None, TAP_SLOP ** 2 + 1
+        for child in self.children:
+            d = (child.tap[0] - x) ** 2 + (child.tap[1] - y) ** 2
+            if d < best_d:
+                best, best_d = child, d
+        return best
+
+    def back(self, root):
+        """Screen shown after one BACK press."""
+        if self.depth <= 1:
+            return root
+        node = self.parent
+        while node is not root and node.depth >= self.depth:
+            node = node.parent
+        return node
+
+    def __repr__(self):
+        return f"<Node {self.screen} depth={self.depth}>"
+
+
+def _route_taps(steps) -> list[tuple[int, int]]:
+    """Tap points of a route (swipes do not change the screen)."""
+    taps = []
+    for step in steps:
+        if isinstance(step, dict):
+            if step.get("action") == "tap":
+                taps.append((int(step["x"]), int(step["y"])))
+        elif step and step[0] == "tap":
+            taps.append((int(step[1]), int(step[2])))
+    return taps
+
+
+def _add_route(root: Node, screen: str, taps: list, exit_backs: int):
+    node = root
+    opening = len(taps) - exit_backs     # taps that only dismiss / scroll
+    for k, (x, y) in enumerate(taps, 1):
+        child = next((c for c in node.children
+                      if abs(c.tap[0] - x) <= 3 and abs(c.tap[1] - y) <= 3), None)
+        if child is None:
+            child = Node("menu", max(0, k - opening), node, (x, y))
+            node.children.append(child)
+        node = child
+    node.screen = screen
+
+
+def load_coordinate_map(name: str) -> dict:
+    path = PROJECT_ROOT / "data" / "coordinate_maps" / f"{name}.json"
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_graph(coordinate_map: dict) -> Node:
+    """Lobby node with every known route attached."""
+    root = Node("lobby", 0)
+    _add_route(root, "profile_menu", [PROFILE_MENU_TAP], 1)
+
+    for screen, nav in coordinate_map.get("navigation", {}).items():
+        _add_route(root, screen, _route_taps(nav.get("steps", [])),
+                   int(nav.get("exit_backs", 1)))
+
+    try:
+        from backend.core.screen_capture import NAVIGATION, EXIT_BACKS
+    except ImportError:  # cv2 missing: full-scan routes match the map anyway
+        NAVIGATION, EXIT_BACKS = {}, {}
+    for phase, steps in NAVIGATION.items():
+        screen = "pet" if phase == "pet_token" else phase
+        _add_route(root, screen, _route_taps(steps), EXIT_BACKS.get(phase, 1))
+    return root
+
+
+# ──────────────────────────────────────────────
+# Device marker
+# ──────────────────────────────────────────────
+
+def marker_bits(index: int) -> list[int]:
+    value = ((index & 0xFFF) << 4) | ((index * 7 + 3) & 0xF)
+    return [(value >> (MARKER_BITS - 1 - i)) & 1 for i in range(MARKER_BITS)]
+
+
+def decode_marker(bits: list[int]) -> int | None:
+    """Device index from marker bits (None if the check fails)."""
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bit
+    index = value >> 4
+    return index if (index * 7 + 3) & 0xF == value & 0xF else None
+
+
+# ──────────────────────────────────────────────
+# Rendering
+# ──────────────────────────────────────────────
+
+def _font(size: int):
+    for name in ("DejaVuSans-Bold.ttf", "DejaVuSans.ttf", "arialbd.ttf", "arial.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def short_number(value: int) -> str:
+    """589700000 -> "589.7M" (the game's resource notation)."""
+    for suffix, unit in (("B", 1_000_000_000), ("M", 1_000_000), ("K", 1_000)):
+        if value >= unit:
+            return f"{value / unit:.1f}{suffix}"
+    return str(value)
+
+
+class ScreenRenderer:
+    """Renders (and caches) PNG screenshots per device and screen."""
+
+    def __init__(self, coordinate_map: dict, size: tuple = REFERENCE_SIZE):
+        self.size = size
+        self.regions = coordinate_map.get("regions", {})
+        self._templates = {}
+        for name in ("lobby_hammer", "lobby_magnifier", "lobby_loading",
+                     "lobby_profile_menu", "lobby_profile"):
+            path = TEMPLATES_DIR / f"{name}.png"
+            if os.path.exists(path):
+                self._templates[name] = Image.open(path).convert("RGB")
+        self._backgrounds: dict[str, Image.Image] = {}
+        self._cache: dict[tuple, bytes] = {}
+
+    def _background(self, screen: str) -> Image.Image:
+        # Noise keeps template matching from scoring on flat areas
+        bg = self._backgrounds.get(screen)
+        if bg is None:
+            rng = random.Random(screen)
+            tint = Image.new("RGB", REFERENCE_SIZE,
+                             tuple(rng.randint(30, 90) for _ in range(3)))
+            noise = Image.effect_noise(REFERENCE_SIZE, 24).convert("RGB")
+            bg = Image.blend(tint, noise, 0.35)
+            self._backgrounds[screen] = bg
+        return bg.copy()
+
+    def _paste(self, img: Image.Image, name: str, xy: tuple):
+        template = self._templates.get(name)
+        if template is not None:
+            img.paste(template, xy)
+
+    def _text(self, draw: ImageDraw.ImageDraw, region: str | tuple, text: str):
+        box = self.regions.get(region) if isinstance(region, str) else region
+        if not box:
+            return
+        x1, y1, x2, y2 = box
+        draw.rectangle(box, fill=(12, 14, 20))
+        height = y2 - y1
+        font = _font(max(10, int(height * 0.7)))
+        # Shrink until the text fits the region
+        while font.size > 10 and draw.textlength(text, font=font) > (x2 - x1) - 4:
+            font = _font(font.size - 2)
+        draw.text((x1 + 2, y1 + (height - font.size) // 2 - 1), text,
+                  fill=(245, 245, 245), font=font)
+
+    def render(self, screen: str, device) -> bytes:
+        key = (device.index, screen, device.profile_version, device.lobby_variant)
+        png = self._cache.get(key)
+        if png is None:
+            png = self._encode(self._draw(screen, device))
+            if len(self._cache) > 4096:
+                self._cache.clear()
+            self._cache[key] = png
+        return png
+
+    def _encode(self, img: Image.Image) -> bytes:
+        if img.size != self.size:
+            img = img.resize(self.size, Image.Resampling.BILINEAR)
+        buf = io.BytesIO()
+        img.save(buf, "PNG", compress_level=1)
+        return buf.getvalue()
+
+    def _draw(self, screen: str, device) -> Image.Image:
+        img = self._background(screen)
+        draw = ImageDraw.Draw(img)
+        p = device.profile
+        title = _font(22)
+
+        if screen == "home":
+            draw.text((380, 250), "Android home", fill=(230, 230, 230), font=title)
+        elif screen == "loading":
+            self._paste(img, "lobby_loading", (380, 420))
+        elif screen == "lobby":
+            self._paste(img, "lobby_profile", (0, 0))
+            self._paste(img, "lobby_magnifier" if device.lobby_variant else "lobby_hammer",
+                        (860, 450))
+            self._text(draw, "pet_token", f"{p['pet_token']:,}")
+        elif screen == "profile_menu":
+            self._paste(img, "lobby_profile_menu", (380, 20))
+            self._text(draw, (300, 185, 410, 215), p["game_id"])
+            self._text(draw, (440, 188, 500, 212), "Copy")
+        elif screen == "profile":
+            self._text(draw, "profile_name", p["lord_name"])
+            self._text(draw, "profile_power", f"{p['power']:,}")
+        elif screen == "resources":
+            for res in ("gold", "wood", "ore", "mana"):
+                bag, total = p["resources"][res]
+                self._text(draw, f"res_{res}_item", short_number(bag))
+                self._text(draw, f"res_{res}_total", short_number(total))
+            x0, y0 = MARKER_ORIGIN
+            draw.rectangle((x0 - 4, y0 - 4, x0 + MARKER_BITS * MARKER_BAR + 4,
+                            y0 + MARKER_HEIGHT + 4), fill=(255, 255, 255))
+            for i, bit in enumerate(marker_bits(device.index)):
+                if bit:
+                    x = x0 + i * MARKER_BAR
+                    draw.rectangle((x, y0, x + MARKER_BAR - 1, y0 + MARKER_HEIGHT),
+                                   fill=(0, 0, 0))
+        elif screen in ("hall", "market"):
+            label = "HALL OF ORDER" if screen == "hall" else "BAZAAR"
+            level = p["hall_level"] if screen == "hall" else p["market_level"]
+            draw.text((505, 205), label, fill=(240, 220, 160), font=title)
+            self._text(draw, (500, 250, 548, 275), "Lv.")
+            self._text(draw, "building_level", str(level))
+        elif screen == "pet":
+            self._text(draw, "pet_token", f"{p['pet_token']:,}")
+        else:
+            draw.text((40, 30), screen.upper(), fill=(230, 230, 230), font=title)
+        return img